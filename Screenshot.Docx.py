@@ -11,13 +11,7 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
-import pyautogui
 from PIL import Image, ImageTk
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from docx.oxml.ns import qn
-import io
 import os
 import time
 import json
@@ -31,7 +25,20 @@ import socket
 import webbrowser
 import urllib.parse
 import platform
-import tempfile
+import queue
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from image_pipeline import (DEFAULT_EXPORT_DPI, MIN_EXPORT_DPI, PALETTE_MODES, DEFAULT_PALETTE_COLORS,
+                            FORMAT_MODES, DEFAULT_JPEG_QUALITY, PNG_PROFILES, DEFAULT_PNG_PROFILE)
+from screenshot_store import ScreenshotStore, DEFAULT_MEMORY_BUDGET_MB
+from duplicates import fingerprint
+import project_io
+from report_builder import build_report, document_filename, GenerationCancelled
+from render_daemon import RenderClient, runtime_dir
+from capture_backends import (BACKENDS, CAPTURE_AREAS, platform_backends, ranked_backends, cached_probe, probe_and_benchmark,
+                              active_window_title, capture_first)
+from x11_capture import XHotkey
 
 CURRENT_OS = platform.system().lower()
 is_windows = CURRENT_OS == "windows"
@@ -41,27 +48,9 @@ is_macos = CURRENT_OS == "darwin"
 if is_windows:
     try:
         import ctypes
-        import ctypes.wintypes as wt
-        user32 = ctypes.windll.user32
-        gdi32 = ctypes.windll.gdi32
-        dwmapi = ctypes.windll.dwmapi
-        try:
-            user32.SetProcessDPIAware()
-        except Exception:
-            pass
-        SRCCOPY = 0x00CC0020
-        CAPTUREBLT = 0x40000000
-        PW_RENDERFULLCONTENT = 0x00000002
-        DWMWA_EXTENDED_FRAME_BOUNDS = 9
-    except ImportError:
-        print("Warning: Windows ctypes modules not available")
-        is_windows = False
-
-if is_linux:
-    try:
-        subprocess.run(['which', 'scrot'], check=True, capture_output=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("Warning: scrot not found - install with: sudo apt install scrot")
+        ctypes.windll.user32.SetProcessDPIAware()
+    except Exception:
+        pass
 
 class LicenseDialog:
     def __init__(self, parent):
@@ -667,17 +656,322 @@ class UpdateChecker:
         ttk.Button(button_frame, text="Download Only", command=download_only).pack(side='right', padx=(5, 0))
         ttk.Button(button_frame, text="Later", command=dialog.destroy).pack(side='right')
 
+class BackgroundJob:
+    """Runs work() on a worker thread and reports back through a queue.
+
+    Progress is reported through self.events as tuples which the UI drains
+    with root.after: ('progress', percent, text), then exactly one of
+    ('done', result), ('cancelled',) or ('error', exception).
+    """
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise GenerationCancelled()
+
+    def report(self, percent, text):
+        self.events.put(('progress', percent, text))
+
+    def run(self):
+        try:
+            result = self.work()
+            self.events.put(('done', result))
+        except GenerationCancelled:
+            self.events.put(('cancelled',))
+        except Exception as e:
+            self.events.put(('error', e))
+
+    def work(self):
+        raise NotImplementedError
+
+class DocxGenerationJob(BackgroundJob):
+    """Builds a DOCX from a snapshot of the project; the result is its path."""
+
+    def __init__(self, screenshots, section_names, notes, options):
+        super().__init__()
+        self.records = list(screenshots)
+        self.section_names = list(section_names)
+        self.notes = list(notes)
+        self.options = dict(options)
+
+    def work(self):
+        return build_report(self.records, self.section_names, self.notes, self.options,
+                            self.report, self.check_cancelled)
+
+class RenderServiceJob(BackgroundJob):
+    """Hands the build to a running render daemon; the result is the same as DocxGenerationJob's.
+
+    The project is saved to `handoff_path` for the daemon to read, which
+    after the first time only adds new screenshots, then the daemon's job
+    is polled for progress.
+    """
+
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, client, handoff_path, project_data, screenshots, options):
+        super().__init__()
+        self.client = client
+        self.handoff_path = handoff_path
+        self.project_data = project_data
+        self.records = list(screenshots)
+        self.options = dict(options)
+
+    def work(self):
+        self.report(0, "Handing the project to the render service...")
+        project_io.save_project(self.handoff_path, self.project_data, self.records)
+        # Only the user's own daemon reads it; the runtime directory is
+        # private already, the file is kept so too.
+        os.chmod(self.handoff_path, 0o600)
+        self.check_cancelled()
+
+        options = dict(self.options)
+        options.pop('encode_workers', None)
+        options['output_path'] = os.path.join(options.pop('output_dir'), document_filename(options))
+        job = self.client.submit(self.handoff_path, options)
+        try:
+            while job['status'] in ('queued', 'running'):
+                self.check_cancelled()
+                time.sleep(self.POLL_INTERVAL)
+                job = self.client.status(job['id'])
+                if job['status'] == 'queued':
+                    self.report(0, f"Waiting for the render service ({job['position']} in queue)...")
+                else:
+                    self.report(job['progress'], job['text'])
+        except GenerationCancelled:
+            try:
+                self.client.cancel(job['id'])
+            except OSError:
+                pass
+            raise
+
+        if job['status'] == 'cancelled':
+            raise GenerationCancelled()
+        if job['status'] != 'done':
+            raise RuntimeError(f"Render service: {job['error']}")
+        return job['output'], job['report']
+
+class CaptureProbeJob(BackgroundJob):
+    """Probes the capture backends, timing them if `benchmark`; the result is cached in the settings as 'capture_probe'."""
+
+    def __init__(self, benchmark):
+        super().__init__()
+        self.benchmark = benchmark
+
+    def work(self):
+        if not self.benchmark:
+            self.report(0, "Checking screen capture backends...")
+            return probe_and_benchmark(count=0)
+        self.report(0, "Benchmarking screen capture backends...")
+        return probe_and_benchmark()
+
+class CaptureJob(BackgroundJob):
+    """Grabs a screenshot with the first backend that works; the result is (image, fingerprint) or None."""
+
+    def __init__(self, backends, area, region):
+        super().__init__()
+        self.backends = backends
+        self.area = area
+        self.region = region
+
+    def work(self):
+        img = capture_first(self.backends, self.area, self.region)
+        return (img, fingerprint(img)) if img is not None else None
+
+class HotkeyReleaseJob(BackgroundJob):
+    """Waits for a stopped XHotkey listener to release its grab, which takes up to its poll interval."""
+
+    def __init__(self, listener):
+        super().__init__()
+        self.listener = listener
+
+    def work(self):
+        self.listener.join()
+
+class ProjectSaveJob(BackgroundJob):
+    """Saves a snapshot of the project; the result is what project_io.save_project() returns."""
+
+    def __init__(self, file_path, project_data, screenshots):
+        super().__init__()
+        self.file_path = file_path
+        self.project_data = project_data
+        self.records = list(screenshots)
+
+    def work(self):
+        def progress(done, total):
+            self.report(done / total * 100, f"Saving screenshot {done} of {total}...")
+        return project_io.save_project(self.file_path, self.project_data, self.records, progress)
+
+class TemplateFields(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+def section_name_from_template(template, **fields):
+    """Fill in a section name template such as 'Step {n} - {window}'; unknown fields are left as written."""
+    try:
+        return template.format_map(TemplateFields(fields)).strip()
+    except (ValueError, IndexError, AttributeError, KeyError):
+        return template
+
+def preview_size(image_size, canvas_size):
+    img_width, img_height = image_size
+    canvas_width, canvas_height = canvas_size
+    img_ratio = img_width / img_height
+    canvas_ratio = canvas_width / canvas_height
+    
+    if img_ratio > canvas_ratio:
+        display_width = min(canvas_width - 20, img_width)
+        display_height = int(display_width / img_ratio)
+    else:
+        display_height = min(canvas_height - 20, img_height)
+        display_width = int(display_height * img_ratio)
+    
+    return max(1, display_width), max(1, display_height)
+
+# Modes Image.reduce() accepts; others go straight to a NEAREST resize.
+REDUCE_MODES = ('L', 'LA', 'La', 'RGB', 'RGBA', 'RGBa', 'I', 'F')
+
+class PreviewCache:
+    """LRU of resized previews keyed by screenshot id and canvas size.
+    
+    prefetch() resizes neighbouring screenshots on a background thread into
+    PIL images; get() turns them into PhotoImages on the Tk thread the first
+    time they are shown. On a miss, draft() gives a cheap preview to show at
+    once while refine() produces the LANCZOS version on its own thread.
+    """
+    
+    def __init__(self, capacity=24):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.refiner = ThreadPoolExecutor(max_workers=1)
+    
+    def key(self, record, canvas_size):
+        return (record.id, canvas_size)
+    
+    def get(self, record, canvas_size):
+        key = self.key(record, canvas_size)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+        
+        if isinstance(entry, Image.Image):
+            entry = ImageTk.PhotoImage(entry)
+            self.put(key, entry)
+        return entry
+    
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+    
+    def render(self, record, canvas_size):
+        img = record.image
+        return img.resize(preview_size(img.size, canvas_size), Image.Resampling.LANCZOS)
+    
+    def draft(self, record, canvas_size):
+        # Screenshots loaded from a project archive that have not been decoded
+        # yet are drafted from their stored thumbnail, or a blank placeholder
+        # when there is none (a spilled screenshot); decoding them here would
+        # stall the Tk thread, so that is left to refine(). Otherwise NEAREST
+        # sampling at twice the target size followed by a 2x2 box reduce costs
+        # a few ms on 4K captures and avoids the worst aliasing.
+        width, height = preview_size(record.size, canvas_size)
+        if not record.is_resident():
+            thumb = record.thumbnail()
+            if thumb is None:
+                return Image.new('RGB', (width, height), 'lightgrey')
+            return thumb.resize((width, height), Image.Resampling.BILINEAR)
+        
+        img = record.image
+        if img.width >= width * 2 and img.height >= height * 2 and img.mode in REDUCE_MODES:
+            return img.resize((width * 2, height * 2), Image.Resampling.NEAREST).reduce(2)
+        return img.resize((width, height), Image.Resampling.NEAREST)
+    
+    def refine(self, record, canvas_size):
+        key = self.key(record, canvas_size)
+        return self.refiner.submit(self._refine, record, canvas_size, key)
+    
+    def _refine(self, record, canvas_size, key):
+        with self.lock:
+            if key in self.entries:
+                return
+        self.put(key, self.render(record, canvas_size))
+    
+    def prefetch(self, records, canvas_size):
+        for record in records:
+            key = self.key(record, canvas_size)
+            with self.lock:
+                if key in self.entries or key in self.pending:
+                    continue
+                self.pending.add(key)
+            self.executor.submit(self._prefetch, record, canvas_size, key)
+    
+    def _prefetch(self, record, canvas_size, key):
+        try:
+            with self.lock:
+                if key in self.entries:
+                    return
+            self.put(key, self.render(record, canvas_size))
+        except Exception:
+            pass
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+    
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
 class DocxScreenshotApp:
+    CAPTURE_TICK_MS = 100
+    CAPTURE_HIDE_MS = 250
+    RAPID_POLL_MS = 100
+
     def __init__(self, root):
         self.root = root
         self.root.title("Screenshot to DOCX Generator")
         self.root.geometry("1200x800")
         self.root.minsize(1000, 700)
         
-        self.screenshots = []
+        self.screenshots = ScreenshotStore()
         self.section_names = []
         self.notes = []
         self.current_index = 0
+        self.generation_job = None
+        self.save_job = None
+        self.capture_backends = {}
+        self.capture_probe_job = None
+        self.pending_captures = []
+        self.capture_job = None
+        self.capture_tick_id = None
+        self.capture_overlay = None
+        self.rapid_hotkey_listener = None
+        self.hotkey_release_job = None
+        self.rapid_poll_id = None
+        self.rapid_backends = []
+        self.rapid_results = queue.Queue()
+        self.handoff_path = None
+        self.preview_cache = PreviewCache()
+        self.canvas_size = None
+        self.resize_after_id = None
+        self.displayed_preview = None
         
         self.setup_styles()
         
@@ -685,6 +979,8 @@ class DocxScreenshotApp:
             return
             
         self.load_settings()
+        self.screenshots.set_budget(self.memory_budget_mb)
+        self.screenshots.png_profile = self.project_png_profile
         self.create_menu()
         self.create_widgets()
         
@@ -693,6 +989,11 @@ class DocxScreenshotApp:
         if self.settings.get('auto_updates', True):
             self.root.after(2000, lambda: self.updater.check_for_updates(silent=True))
         
+        # Only check which backends are usable here; timing them grabs the
+        # screen with every tool, which some make visible or audible.
+        if cached_probe(self.settings) is None:
+            self.root.after(1000, self.start_capture_probe)
+        
     def check_license(self):
         license_file = 'license.json'
         
@@ -785,7 +1086,10 @@ A powerful tool for capturing screenshots and generating professional DOCX docum
 CAPTURE SCREENSHOTS:
 1. Enter module number and document title
 2. Set capture delay (1-10 seconds)
-3. Click 'Capture Screenshot' and follow platform-specific instructions
+3. Click 'Capture Screenshot' and follow the countdown in the corner of the screen;
+   click it again to queue more captures, click the countdown to cancel them
+   Or tick 'Rapid capture' and press the global hotkey (Linux/X11) to grab at once,
+   naming sections from the template in Settings
 4. Enter section name and optional notes for each screenshot
 5. Use 'Import Image' to add existing images
 
@@ -814,7 +1118,7 @@ GENERATE DOCX:
 
 CROSS-PLATFORM SUPPORT:
 - Windows: Advanced window capture
-- Linux: Interactive selection with scrot
+- Linux: xshm, maim, import or scrot, whichever works fastest
 - macOS: Built-in screencapture utility
 - All platforms: Fallback to general screenshot"""
 
@@ -952,6 +1256,23 @@ Registered: Student PenTester LLC"""
         self.last_name = self.settings.get('last_name', 'Last Name')
         self.course_code = self.settings.get('course_code', 'COURSE001')
         self.default_save_path = self.settings.get('save_path', os.path.join(os.path.expanduser("~"), "Documents"))
+        self.memory_budget_mb = self.settings.get('memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB)
+        self.export_dpi = self.settings.get('export_dpi', 0)
+        self.palette_mode = self.settings.get('palette_mode', 'off')
+        self.palette_max_colors = self.settings.get('palette_max_colors', DEFAULT_PALETTE_COLORS)
+        self.image_format = self.settings.get('image_format', 'png')
+        self.jpeg_quality = self.settings.get('jpeg_quality', DEFAULT_JPEG_QUALITY)
+        self.store_media = self.settings.get('store_media', True)
+        self.max_output_mb = self.settings.get('max_output_mb', 0)
+        self.use_render_service = self.settings.get('use_render_service', False)
+        self.settings.pop('linux_capture_backend', None)
+        self.capture_backend = self.settings.get('capture_backend', 'auto')
+        self.capture_area = self.settings.get('capture_area', 'window')
+        self.capture_region = self.settings.get('capture_region')
+        self.rapid_hotkey = self.settings.get('rapid_hotkey', 'ctrl+shift+F9')
+        self.section_template = self.settings.get('section_template', 'Screenshot {n}')
+        self.export_png_profile = self.settings.get('export_png_profile', DEFAULT_PNG_PROFILE)
+        self.project_png_profile = self.settings.get('project_png_profile', DEFAULT_PNG_PROFILE)
     
     def save_settings(self):
         try:
@@ -1009,6 +1330,25 @@ Registered: Student PenTester LLC"""
         ttk.Button(capture_frame, text="Capture Screenshot", style='Action.TButton', command=self.capture_screenshot).pack(side='left', padx=10)
         ttk.Button(capture_frame, text="Import Image", style='Small.TButton', command=self.import_image).pack(side='left')
         
+        area_frame = ttk.Frame(self.capture_frame)
+        area_frame.pack(fill='x', padx=20)
+        self.capture_area_var = tk.StringVar(value=self.capture_area)
+        ttk.Label(area_frame, text="Capture Area:").pack(side='left')
+        area_combo = ttk.Combobox(area_frame, values=CAPTURE_AREAS, textvariable=self.capture_area_var, state='readonly', width=10)
+        area_combo.pack(side='left', padx=(10, 10))
+        area_combo.bind('<<ComboboxSelected>>', self.on_capture_area_changed)
+        ttk.Button(area_frame, text="Set Region", style='Small.TButton', command=self.select_capture_region).pack(side='left')
+        self.capture_region_label = ttk.Label(area_frame, text="", font=('Segoe UI', 8, 'italic'))
+        self.capture_region_label.pack(side='left', padx=(10, 0))
+        self.update_capture_region_label()
+        
+        rapid_frame = ttk.Frame(self.capture_frame)
+        rapid_frame.pack(fill='x', padx=20, pady=(10, 0))
+        self.rapid_capture_var = tk.BooleanVar(value=False)
+        self.rapid_capture_check = ttk.Checkbutton(rapid_frame, text=f"Rapid capture: grab on {self.rapid_hotkey}, no dialogs", variable=self.rapid_capture_var, command=self.toggle_rapid_capture)
+        self.rapid_capture_check.pack(side='left')
+        ttk.Label(rapid_frame, text="Sections are named from the template in Settings", font=('Segoe UI', 8, 'italic')).pack(side='left', padx=(10, 0))
+        
         section_input_frame = ttk.LabelFrame(self.capture_frame, text="Section Name for Next Screenshot", padding=15)
         section_input_frame.pack(fill='x', padx=20, pady=10)
         
@@ -1040,7 +1380,9 @@ Registered: Student PenTester LLC"""
         action_frame = ttk.Frame(self.capture_frame)
         action_frame.pack(fill='x', padx=20, pady=20)
         
-        ttk.Button(action_frame, text="Generate DOCX", style='Action.TButton', command=self.generate_docx).pack(side='left', padx=(0, 10))
+        self.generate_button = ttk.Button(action_frame, text="Generate DOCX", style='Action.TButton', command=self.generate_docx)
+        self.generate_button.pack(side='left', padx=(0, 10))
+        self.cancel_button = ttk.Button(action_frame, text="Cancel", style='Small.TButton', command=self.cancel_generation)
         ttk.Button(action_frame, text="Save Project", style='Small.TButton', command=self.save_project).pack(side='left', padx=(0, 10))
         ttk.Button(action_frame, text="Load Project", style='Small.TButton', command=self.load_project).pack(side='left')
         
@@ -1068,7 +1410,7 @@ Registered: Student PenTester LLC"""
         list_scrollbar = ttk.Scrollbar(list_scroll_frame)
         list_scrollbar.pack(side='right', fill='y')
         
-        self.screenshots_listbox = tk.Listbox(list_scroll_frame, yscrollcommand=list_scrollbar.set, font=('Segoe UI', 10))
+        self.screenshots_listbox = tk.Listbox(list_scroll_frame, yscrollcommand=list_scrollbar.set, font=('Segoe UI', 10), selectmode='extended')
         self.screenshots_listbox.pack(side='left', fill='both', expand=True)
         self.screenshots_listbox.bind('<<ListboxSelect>>', self.on_screenshot_select)
         list_scrollbar.config(command=self.screenshots_listbox.yview)
@@ -1079,7 +1421,8 @@ Registered: Student PenTester LLC"""
         ttk.Button(list_buttons_frame, text="↑", command=self.move_up, width=3).pack(side='left', padx=(0, 5))
         ttk.Button(list_buttons_frame, text="↓", command=self.move_down, width=3).pack(side='left', padx=(0, 5))
         ttk.Button(list_buttons_frame, text="Del", command=self.delete_screenshot, width=3).pack(side='left', padx=(0, 5))
-        ttk.Button(list_buttons_frame, text="Edit", command=self.edit_section_name, width=3).pack(side='left')
+        ttk.Button(list_buttons_frame, text="Edit", command=self.edit_section_name, width=3).pack(side='left', padx=(0, 5))
+        ttk.Button(list_buttons_frame, text="Rename", command=self.batch_rename_sections, width=7).pack(side='left')
         
         preview_frame = ttk.LabelFrame(right_panel, text="Preview", padding=10)
         preview_frame.pack(fill='both', expand=True)
@@ -1095,6 +1438,7 @@ Registered: Student PenTester LLC"""
         canvas_h_scroll.pack(side='bottom', fill='x')
         canvas_v_scroll.pack(side='right', fill='y')
         self.canvas.pack(side='left', fill='both', expand=True)
+        self.canvas.bind('<Configure>', self.on_canvas_resize)
         
         preview_controls = ttk.Frame(preview_frame)
         preview_controls.pack(fill='x', pady=(10, 0))
@@ -1178,200 +1522,481 @@ Registered: Student PenTester LLC"""
         height_frame.pack(fill='x', pady=(5, 0))
         ttk.Spinbox(height_frame, from_=3.0, to=10.0, increment=0.5, textvariable=self.image_height_var, width=10).pack(side='left')
         
+        self.downscale_var = tk.BooleanVar(value=self.export_dpi > 0)
+        self.export_dpi_var = tk.IntVar(value=self.export_dpi or DEFAULT_EXPORT_DPI)
+        ttk.Label(format_frame, text="Image Resolution:").pack(anchor='w', pady=(10, 0))
+        dpi_frame = ttk.Frame(format_frame)
+        dpi_frame.pack(fill='x', pady=(5, 0))
+        ttk.Checkbutton(dpi_frame, text="Downscale images to", variable=self.downscale_var).pack(side='left')
+        ttk.Spinbox(dpi_frame, from_=MIN_EXPORT_DPI, to=600, increment=10, textvariable=self.export_dpi_var, width=6).pack(side='left', padx=(5, 5))
+        ttk.Label(dpi_frame, text="DPI at the printed image height", font=('Segoe UI', 8, 'italic')).pack(side='left')
+        
+        self.palette_mode_var = tk.StringVar(value=self.palette_mode)
+        self.palette_max_colors_var = tk.IntVar(value=self.palette_max_colors)
+        ttk.Label(format_frame, text="Palette Images:").pack(anchor='w', pady=(10, 0))
+        palette_frame = ttk.Frame(format_frame)
+        palette_frame.pack(fill='x', pady=(5, 0))
+        ttk.Combobox(palette_frame, values=PALETTE_MODES, textvariable=self.palette_mode_var, state='readonly', width=10).pack(side='left')
+        ttk.Label(palette_frame, text="up to").pack(side='left', padx=(10, 5))
+        ttk.Spinbox(palette_frame, from_=256, to=65536, increment=256, textvariable=self.palette_max_colors_var, width=7).pack(side='left')
+        ttk.Label(palette_frame, text="colours (auto); photo-like images stay truecolour", font=('Segoe UI', 8, 'italic')).pack(side='left', padx=(5, 0))
+        
+        self.image_format_var = tk.StringVar(value=self.image_format)
+        self.jpeg_quality_var = tk.IntVar(value=self.jpeg_quality)
+        ttk.Label(format_frame, text="Image Format:").pack(anchor='w', pady=(10, 0))
+        image_format_frame = ttk.Frame(format_frame)
+        image_format_frame.pack(fill='x', pady=(5, 0))
+        ttk.Combobox(image_format_frame, values=FORMAT_MODES, textvariable=self.image_format_var, state='readonly', width=10).pack(side='left')
+        ttk.Label(image_format_frame, text="JPEG quality").pack(side='left', padx=(10, 5))
+        ttk.Spinbox(image_format_frame, from_=50, to=95, increment=5, textvariable=self.jpeg_quality_var, width=5).pack(side='left')
+        ttk.Label(image_format_frame, text="auto embeds photo-like images as JPEG", font=('Segoe UI', 8, 'italic')).pack(side='left', padx=(5, 0))
+        
+        self.store_media_var = tk.BooleanVar(value=self.store_media)
+        ttk.Checkbutton(format_frame, text="Store images without recompressing (faster saves, same quality)", variable=self.store_media_var).pack(anchor='w', pady=(10, 0))
+        
+        self.size_limit_var = tk.BooleanVar(value=self.max_output_mb > 0)
+        self.max_output_mb_var = tk.IntVar(value=self.max_output_mb or 10)
+        ttk.Label(format_frame, text="Output Size:").pack(anchor='w', pady=(10, 0))
+        size_limit_frame = ttk.Frame(format_frame)
+        size_limit_frame.pack(fill='x', pady=(5, 0))
+        ttk.Checkbutton(size_limit_frame, text="Keep the document under", variable=self.size_limit_var).pack(side='left')
+        ttk.Spinbox(size_limit_frame, from_=1, to=1024, increment=1, textvariable=self.max_output_mb_var, width=6).pack(side='left', padx=(5, 5))
+        ttk.Label(size_limit_frame, text="MB, lowering image quality only as far as needed", font=('Segoe UI', 8, 'italic')).pack(side='left')
+        
+        performance_frame = ttk.LabelFrame(self.settings_frame, text="Performance", padding=20)
+        performance_frame.pack(fill='x', padx=20, pady=10)
+        
+        self.memory_budget_var = tk.IntVar(value=self.memory_budget_mb)
+        ttk.Label(performance_frame, text="Screenshot Memory Budget (MB):").pack(anchor='w')
+        budget_frame = ttk.Frame(performance_frame)
+        budget_frame.pack(fill='x', pady=(5, 0))
+        ttk.Spinbox(budget_frame, from_=128, to=65536, increment=128, textvariable=self.memory_budget_var, width=10).pack(side='left')
+        ttk.Label(budget_frame, text="Older screenshots beyond this are kept compressed on disk", font=('Segoe UI', 8, 'italic')).pack(side='left', padx=(10, 0))
+        
+        self.export_png_profile_var = tk.StringVar(value=self.export_png_profile)
+        self.project_png_profile_var = tk.StringVar(value=self.project_png_profile)
+        ttk.Label(performance_frame, text="PNG Compression:").pack(anchor='w', pady=(10, 0))
+        profile_frame = ttk.Frame(performance_frame)
+        profile_frame.pack(fill='x', pady=(5, 0))
+        ttk.Label(profile_frame, text="Export").pack(side='left')
+        ttk.Combobox(profile_frame, values=list(PNG_PROFILES), textvariable=self.export_png_profile_var, state='readonly', width=10).pack(side='left', padx=(5, 15))
+        ttk.Label(profile_frame, text="Project files").pack(side='left')
+        ttk.Combobox(profile_frame, values=list(PNG_PROFILES), textvariable=self.project_png_profile_var, state='readonly', width=10).pack(side='left', padx=(5, 0))
+        ttk.Label(profile_frame, text="fast, balanced or smallest; all lossless", font=('Segoe UI', 8, 'italic')).pack(side='left', padx=(10, 0))
+        
+        self.use_render_service_var = tk.BooleanVar(value=self.use_render_service)
+        ttk.Checkbutton(performance_frame, text="Generate documents in the render service (render_daemon.py) when it is running", variable=self.use_render_service_var).pack(anchor='w', pady=(10, 0))
+        
+        self.capture_backend_var = tk.StringVar(value=self.capture_backend)
+        ttk.Label(performance_frame, text="Capture Backend:").pack(anchor='w', pady=(10, 0))
+        backend_frame = ttk.Frame(performance_frame)
+        backend_frame.pack(fill='x', pady=(5, 0))
+        ttk.Combobox(backend_frame, values=['auto'] + platform_backends(), textvariable=self.capture_backend_var, state='readonly', width=16).pack(side='left')
+        ttk.Button(backend_frame, text="Benchmark", style='Small.TButton', command=self.benchmark_capture_backends).pack(side='left', padx=(10, 0))
+        self.capture_backend_label = ttk.Label(backend_frame, text="", font=('Segoe UI', 8, 'italic'))
+        self.capture_backend_label.pack(side='left', padx=(10, 0))
+        self.update_capture_backend_label()
+        
+        rapid_settings_frame = ttk.LabelFrame(self.settings_frame, text="Rapid Capture", padding=20)
+        rapid_settings_frame.pack(fill='x', padx=20, pady=10)
+        
+        ttk.Label(rapid_settings_frame, text="Global Hotkey (X11):").grid(row=0, column=0, sticky='w', pady=5)
+        self.rapid_hotkey_entry = ttk.Entry(rapid_settings_frame, width=25)
+        self.rapid_hotkey_entry.grid(row=0, column=1, sticky='w', padx=(10, 0), pady=5)
+        self.rapid_hotkey_entry.insert(0, self.rapid_hotkey)
+        ttk.Label(rapid_settings_frame, text="e.g. ctrl+shift+F9, alt+Print", font=('Segoe UI', 8, 'italic')).grid(row=0, column=2, sticky='w', padx=(10, 0))
+        
+        ttk.Label(rapid_settings_frame, text="Section Name Template:").grid(row=1, column=0, sticky='w', pady=5)
+        self.section_template_entry = ttk.Entry(rapid_settings_frame, width=25)
+        self.section_template_entry.grid(row=1, column=1, sticky='w', padx=(10, 0), pady=5)
+        self.section_template_entry.insert(0, self.section_template)
+        ttk.Label(rapid_settings_frame, text="{n} number, {time}, {date}, {window} active window title, {module}", font=('Segoe UI', 8, 'italic')).grid(row=1, column=2, sticky='w', padx=(10, 0))
+        
         buttons_frame = ttk.Frame(self.settings_frame)
         buttons_frame.pack(fill='x', padx=20, pady=20)
         
         ttk.Button(buttons_frame, text="Save Settings", style='Action.TButton', command=self.apply_settings).pack(side='left', padx=(0, 10))
         ttk.Button(buttons_frame, text="Reset to Default", style='Small.TButton', command=self.reset_settings).pack(side='left')
 
-    def _get_window_rect(self, hwnd):
-        if not is_windows:
-            return None
-        rect = wt.RECT()
-        ok = dwmapi.DwmGetWindowAttribute(wt.HWND(hwnd), wt.DWORD(DWMWA_EXTENDED_FRAME_BOUNDS), ctypes.byref(rect), ctypes.sizeof(rect))
-        if ok != 0:
-            user32.GetWindowRect(wt.HWND(hwnd), ctypes.byref(rect))
-        return rect.left, rect.top, rect.right, rect.bottom
-
-    def _pil_image_from_hbitmap(self, hdc, hbmp, width, height):
-        if not is_windows:
-            return None
-        bmi = ctypes.create_string_buffer(40 + 4 * 256)
-        ctypes.memset(bmi, 0, 40)
-        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint32))[0] = 40
-        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_int32))[1] = width
-        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_int32))[2] = -height
-        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint16))[6] = 1
-        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint16))[7] = 32
-        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint32))[5] = 0
-        buf_len = width * height * 4
-        pixel_data = ctypes.create_string_buffer(buf_len)
-        gdi32.GetDIBits(hdc, hbmp, 0, height, pixel_data, bmi, 0)
-        img = Image.frombuffer("RGBA", (width, height), pixel_data, "raw", "BGRA", 0, 1)
-        return img
-
-    def _capture_window_windows(self, timeout=3):
-        if not is_windows:
-            return None
-        try:
-            self.root.iconify()
-            messagebox.showinfo("Capture", f"Hover mouse over target window; capturing in {timeout}s.")
-            time.sleep(timeout)
-            pt = wt.POINT()
-            user32.GetCursorPos(ctypes.byref(pt))
-            hwnd = user32.WindowFromPoint(pt)
-            if not hwnd or user32.IsIconic(hwnd):
-                return None
-            l, t, r, b = self._get_window_rect(hwnd)
-            width, height = r - l, b - t
-            if width <= 0 or height <= 0:
-                return None
-            hdc_window = user32.GetWindowDC(hwnd)
-            memdc = gdi32.CreateCompatibleDC(hdc_window)
-            hbmp = gdi32.CreateCompatibleBitmap(hdc_window, width, height)
-            gdi32.SelectObject(memdc, hbmp)
-            ok = ctypes.windll.user32.PrintWindow(hwnd, memdc, PW_RENDERFULLCONTENT)
-            if ok == 0:
-                ok = gdi32.BitBlt(memdc, 0, 0, width, height, hdc_window, 0, 0, SRCCOPY | CAPTUREBLT)
-            img = None
-            if ok != 0:
-                img = self._pil_image_from_hbitmap(memdc, hbmp, width, height)
-            gdi32.DeleteObject(hbmp)
-            gdi32.DeleteDC(memdc)
-            user32.ReleaseDC(hwnd, hdc_window)
-            if img is None:
-                img = pyautogui.screenshot(region=(l, t, width, height))
-            return img
-        except Exception:
-            return None
-        finally:
-            try:
-                self.root.deiconify()
-            except Exception:
-                pass
+    def update_capture_backend_label(self):
+        probe = cached_probe(self.settings)
+        ranking = ranked_backends(probe)
+        if probe is None:
+            text = "auto tries each backend in turn until they have been checked"
+        elif not ranking:
+            text = "No working backend found"
+        elif not probe.get('timings'):
+            text = f"auto uses {ranking[0]} until the backends are benchmarked"
+        else:
+            text = f"auto uses {ranking[0]}, the fastest working backend here"
+        self.capture_backend_label.config(text=text)
 
-    def _capture_window_linux(self, timeout=3):
-        try:
-            self.root.iconify()
-            messagebox.showinfo("Capture", f"Click on target window to capture in {timeout}s.")
-            time.sleep(timeout)
-            
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                tmp_path = tmp.name
-            
+    def start_capture_probe(self, benchmark=False, show_results=False):
+        if self.capture_probe_job is not None:
+            return
+        self.capture_probe_job = CaptureProbeJob(benchmark)
+        self.capture_probe_job.start()
+        self.root.after(100, self.poll_capture_probe, show_results)
+
+    def benchmark_capture_backends(self):
+        if self.capture_probe_job is not None:
+            messagebox.showinfo("Capture Backends", "The capture backends are already being checked.")
+            return
+        self.start_capture_probe(benchmark=True, show_results=True)
+
+    def poll_capture_probe(self, show_results):
+        job = self.capture_probe_job
+        finished = None
+        while True:
             try:
-                result = subprocess.run(['scrot', '-s', tmp_path], 
-                                      capture_output=True, 
-                                      timeout=30)
-                
-                if result.returncode == 0 and os.path.exists(tmp_path):
-                    img = Image.open(tmp_path)
-                    os.unlink(tmp_path)
-                    return img
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] != 'progress':
+                finished = event
+        
+        if finished is None:
+            self.root.after(100, self.poll_capture_probe, show_results)
+            return
+        
+        self.capture_probe_job = None
+        if finished[0] != 'done':
+            if show_results:
+                messagebox.showerror("Capture Backends", f"Benchmark failed: {finished[1]}")
+            return
+        
+        probe = finished[1]
+        self.settings['capture_probe'] = probe
+        self.save_settings()
+        self.update_capture_backend_label()
+        if show_results:
+            lines = []
+            for name, result in probe['backends'].items():
+                timing = probe['timings'].get(name)
+                if timing:
+                    lines.append(f"{name}: {timing['mean_ms']:.0f} ms per grab ({timing['grabs_per_second']:.1f}/s)")
                 else:
-                    return pyautogui.screenshot()
-            except subprocess.TimeoutExpired:
-                return pyautogui.screenshot()
-            except Exception:
-                return pyautogui.screenshot()
-                
-        except Exception:
-            return pyautogui.screenshot()
-        finally:
-            try:
-                self.root.deiconify()
-            except Exception:
-                pass
+                    lines.append(f"{name}: unavailable - {result['detail']}")
+            messagebox.showinfo("Capture Backends", "\n".join(lines))
+
+    def on_capture_area_changed(self, event=None):
+        self.capture_area = self.capture_area_var.get()
+        self.settings['capture_area'] = self.capture_area
+        self.save_settings()
 
-    def _capture_window_macos(self, timeout=3):
+    def update_capture_region_label(self):
+        if self.capture_region:
+            x, y, width, height = self.capture_region
+            self.capture_region_label.config(text=f"Region: {width}x{height} at {x},{y}")
+        else:
+            self.capture_region_label.config(text="window, active window, monitor under the pointer, a saved region or the whole desktop")
+
+    def select_capture_region(self):
+        self.root.iconify()
+        # Give the window manager time to minimize the app before the overlay goes up.
+        self.root.after(300, self.show_region_overlay)
+
+    def show_region_overlay(self):
+        """Translucent overlay over the screen; dragging a rectangle on it saves the capture region."""
+        overlay = tk.Toplevel(self.root)
+        overlay.overrideredirect(True)
+        overlay.geometry(f"{overlay.winfo_vrootwidth()}x{overlay.winfo_vrootheight()}+0+0")
+        overlay.attributes('-topmost', True)
         try:
-            self.root.iconify()
-            messagebox.showinfo("Capture", f"Screenshot will be taken in {timeout}s. Use Cmd+Shift+4 for selection.")
-            time.sleep(timeout)
-            
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
-                tmp_path = tmp.name
-            
-            try:
-                result = subprocess.run(['screencapture', '-i', tmp_path], 
-                                      capture_output=True, 
-                                      timeout=30)
-                
-                if result.returncode == 0 and os.path.exists(tmp_path):
-                    img = Image.open(tmp_path)
-                    os.unlink(tmp_path)
-                    return img
-                else:
-                    return pyautogui.screenshot()
-            except subprocess.TimeoutExpired:
-                return pyautogui.screenshot()
-            except Exception:
-                return pyautogui.screenshot()
-                
-        except Exception:
-            return pyautogui.screenshot()
-        finally:
-            try:
-                self.root.deiconify()
-            except Exception:
-                pass
+            overlay.attributes('-alpha', 0.3)
+        except tk.TclError:
+            pass
+        canvas = tk.Canvas(overlay, bg='grey', cursor='crosshair', highlightthickness=0)
+        canvas.pack(fill='both', expand=True)
+        canvas.create_text(20, 20, anchor='nw', fill='white', font=('Segoe UI', 14, 'bold'),
+                           text="Drag to select the capture region, Esc to cancel")
+        selection = {}
+        
+        def close():
+            overlay.destroy()
+            self.root.deiconify()
+        
+        def press(event):
+            selection['start'] = (event.x_root, event.y_root)
+            selection['rect'] = canvas.create_rectangle(event.x, event.y, event.x, event.y, outline='red', width=2)
+        
+        def drag(event):
+            if 'rect' in selection:
+                x, y = selection['start']
+                canvas.coords(selection['rect'], x - overlay.winfo_rootx(), y - overlay.winfo_rooty(), event.x, event.y)
+        
+        def release(event):
+            if 'start' not in selection:
+                return
+            x0, y0 = selection['start']
+            left, top = min(x0, event.x_root), min(y0, event.y_root)
+            width, height = abs(event.x_root - x0), abs(event.y_root - y0)
+            close()
+            if width < 10 or height < 10:
+                messagebox.showwarning("Capture Region", "The selected region is too small.")
+                return
+            self.capture_region = [left, top, width, height]
+            self.capture_area = 'region'
+            self.capture_area_var.set('region')
+            self.settings.update({'capture_region': self.capture_region, 'capture_area': self.capture_area})
+            self.save_settings()
+            self.update_capture_region_label()
+        
+        canvas.bind('<ButtonPress-1>', press)
+        canvas.bind('<B1-Motion>', drag)
+        canvas.bind('<ButtonRelease-1>', release)
+        overlay.bind('<Escape>', lambda event: close())
+        overlay.focus_force()
+        overlay.grab_set()
+
+    def capture_order(self):
+        """Backend names to try in turn: the chosen one first, then the working ones fastest first."""
+        order = ranked_backends(cached_probe(self.settings))
+        if self.capture_backend in BACKENDS:
+            order = [self.capture_backend] + [name for name in order if name != self.capture_backend]
+        return order
 
-    def _capture_window_generic(self, timeout=3):
+    def capture_backend_instance(self, name):
+        if name not in self.capture_backends:
+            self.capture_backends[name] = BACKENDS[name]()
+        return self.capture_backends[name]
+
+    def capture_hint(self):
+        area = self.capture_area
+        order = self.capture_order()
+        if area == 'window' and order and BACKENDS[order[0]].interactive:
+            return "then click the target window or drag an area"
+        return {
+            'window': "hover over the target window",
+            'active': "switch to the target window",
+            'monitor': "move the mouse to the monitor to capture",
+            'region': "capturing the saved region",
+            'screen': "capturing the whole screen"
+        }.get(area, "")
+
+    def capture_screenshot(self):
+        """Schedule a capture after the delay; the UI stays usable while the countdown runs."""
+        if self.capture_area == 'region' and not self.capture_region:
+            messagebox.showwarning("Capture Region", "Set a capture region first.")
+            return
+        
+        self.pending_captures.append(time.monotonic() + self.capture_delay.get())
+        if self.capture_tick_id is None:
+            self.capture_tick()
+
+    def cancel_pending_captures(self, event=None):
+        self.pending_captures.clear()
+        self.status_label.config(text="Pending captures cancelled")
+
+    def show_capture_countdown(self, text):
+        if self.capture_overlay is None:
+            self.capture_overlay = tk.Toplevel(self.root)
+            self.capture_overlay.overrideredirect(True)
+            self.capture_overlay.attributes('-topmost', True)
+            self.capture_overlay_label = tk.Label(self.capture_overlay, font=('Segoe UI', 14, 'bold'), bg='#222222', fg='white', padx=16, pady=10)
+            self.capture_overlay_label.pack()
+            self.capture_overlay_label.bind('<Button-1>', self.cancel_pending_captures)
+        self.capture_overlay_label.config(text=text)
+        self.capture_overlay.update_idletasks()
+        x = self.capture_overlay.winfo_screenwidth() - self.capture_overlay.winfo_reqwidth() - 40
+        self.capture_overlay.geometry(f"+{x}+40")
+        self.capture_overlay.deiconify()
+        self.capture_overlay.lift()
+
+    def hide_capture_countdown(self):
+        if self.capture_overlay is not None:
+            self.capture_overlay.withdraw()
+
+    def capture_tick(self):
+        """Runs every CAPTURE_TICK_MS while captures are pending or running.
+
+        Counts down the first pending capture on the overlay, starts a
+        CaptureJob when it is due and no other grab is running, and hands
+        finished grabs to add_captured_image.
+        """
+        self.capture_tick_id = None
+        job = self.capture_job
+        if job is not None:
+            finished = None
+            while True:
+                try:
+                    event = job.events.get_nowait()
+                except queue.Empty:
+                    break
+                if event[0] != 'progress':
+                    finished = event
+            if finished is not None:
+                self.finish_capture_job(finished)
+        
+        now = time.monotonic()
+        if self.capture_job is None and self.pending_captures:
+            remaining = self.pending_captures[0] - now
+            if remaining <= 0:
+                self.pending_captures.pop(0)
+                self.start_capture_job()
+            else:
+                queued = len(self.pending_captures) - 1
+                text = f"Capturing in {int(remaining) + 1}s - {self.capture_hint()}"
+                if queued:
+                    text += f" ({queued} more queued)"
+                self.show_capture_countdown(text + "\nClick here to cancel")
+        
+        if self.capture_job is not None or self.pending_captures:
+            self.capture_tick_id = self.root.after(self.CAPTURE_TICK_MS, self.capture_tick)
+        else:
+            self.hide_capture_countdown()
+
+    def start_capture_job(self):
+        self.hide_capture_countdown()
+        self.root.iconify()
+        self.capture_job = CaptureJob([self.capture_backend_instance(name) for name in self.capture_order()],
+                                      self.capture_area, self.capture_region)
+        # Let the window manager take the app and the overlay off screen before the grab.
+        self.root.after(self.CAPTURE_HIDE_MS, self.capture_job.start)
+
+    def finish_capture_job(self, finished):
         try:
-            self.root.iconify()
-            messagebox.showinfo("Capture", f"Full screen capture in {timeout}s.")
-            time.sleep(timeout)
-            return pyautogui.screenshot()
+            self.root.deiconify()
         except Exception:
-            return None
+            pass
+        try:
+            if finished[0] != 'done' or finished[1] is None:
+                messagebox.showerror("Error", "Screenshot capture failed.")
+                return
+            img, img_fingerprint = finished[1]
+            self.add_captured_image(img, img_fingerprint)
         finally:
-            try:
-                self.root.deiconify()
-            except Exception:
-                pass
+            # Only now, so a section name prompt above holds back the next grab.
+            self.capture_job = None
 
-    def capture_screenshot(self):
-        timeout = self.capture_delay.get()
-        img = None
+    def toggle_rapid_capture(self):
+        if self.rapid_capture_var.get():
+            self.start_rapid_capture()
+        else:
+            self.stop_rapid_capture()
+
+    def start_rapid_capture(self):
+        if self.capture_area == 'region' and not self.capture_region:
+            self.rapid_capture_var.set(False)
+            messagebox.showwarning("Capture Region", "Set a capture region first.")
+            return
+        if self.hotkey_release_job is not None:
+            # The previous grab is still being released; poll_hotkey_release arms this one after it.
+            return
         
-        if is_windows:
-            img = self._capture_window_windows(timeout)
-        elif is_linux:
-            img = self._capture_window_linux(timeout)
-        elif is_macos:
-            img = self._capture_window_macos(timeout)
+        self.rapid_backends = [self.capture_backend_instance(name) for name in self.capture_order()]
+        try:
+            self.rapid_hotkey_listener = XHotkey(self.rapid_hotkey, self.on_rapid_hotkey)
+        except Exception as e:
+            self.rapid_capture_var.set(False)
+            messagebox.showerror("Rapid Capture", f"Cannot use the {self.rapid_hotkey} hotkey: {e}")
+            return
         
-        if img is None:
-            img = self._capture_window_generic(timeout)
+        self.rapid_count = 0
+        self.rapid_started = None
+        self.status_label.config(text=f"Rapid capture armed: press {self.rapid_hotkey} to capture")
+        self.rapid_poll_id = self.root.after(self.RAPID_POLL_MS, self.poll_rapid_captures)
+
+    def stop_rapid_capture(self):
+        listener = self.rapid_hotkey_listener
+        if listener is None:
+            return
+        
+        self.rapid_hotkey_listener = None
+        # Cancel the scheduled poll, otherwise re-arming before it fires
+        # would leave two poll loops running.
+        if self.rapid_poll_id is not None:
+            self.root.after_cancel(self.rapid_poll_id)
+        self.poll_rapid_captures()
+        
+        listener.stop()
+        self.hotkey_release_job = HotkeyReleaseJob(listener)
+        self.hotkey_release_job.start()
+        self.root.after(self.RAPID_POLL_MS, self.poll_hotkey_release)
+
+    def poll_hotkey_release(self):
+        try:
+            self.hotkey_release_job.events.get_nowait()
+        except queue.Empty:
+            self.root.after(self.RAPID_POLL_MS, self.poll_hotkey_release)
+            return
         
+        self.hotkey_release_job = None
+        # Armed again, or given a new hotkey, while the old grab was held.
+        if self.rapid_capture_var.get() and self.rapid_hotkey_listener is None:
+            self.start_rapid_capture()
+
+    def on_rapid_hotkey(self):
+        """Runs on the hotkey listener thread: grab straight away and queue the result for the UI."""
+        img = capture_first(self.rapid_backends, self.capture_area, self.capture_region, select=False)
         if img is None:
-            messagebox.showerror("Error", "Screenshot capture failed.")
+            self.rapid_results.put(None)
             return
+        self.rapid_results.put((img, fingerprint(img), active_window_title(), datetime.now()))
+
+    def poll_rapid_captures(self):
+        self.rapid_poll_id = None
+        added = failed = 0
+        while True:
+            try:
+                result = self.rapid_results.get_nowait()
+            except queue.Empty:
+                break
+            if result is None:
+                failed += 1
+                continue
             
-        try:
-            section_name = self.section_entry.get().strip()
-            if not section_name:
-                section_name = simpledialog.askstring("Section Name", "Enter Section Name for this screenshot:", parent=self.root)
-                if not section_name:
-                    messagebox.showwarning("Warning", "Section name is required!")
-                    return
+            img, img_fingerprint, window, taken = result
+            if self.merge_duplicate(img_fingerprint):
+                continue
             
+            number = len(self.screenshots) + 1
+            section_name = self.section_entry.get().strip() or section_name_from_template(
+                self.section_template, n=number, time=taken.strftime('%H:%M:%S'), date=taken.strftime('%Y-%m-%d'),
+                window=window, module=self.module_entry.get().strip())
             notes = self.notes_entry.get('1.0', 'end-1c').strip()
             
-            self.screenshots.append(img)
-            self.section_names.append(section_name)
+            self.screenshots.add(img, fingerprint=img_fingerprint)
+            self.section_names.append(section_name or f"Screenshot {number}")
             self.notes.append(notes)
-            self.update_screenshot_list()
-            self.status_label.config(text=f"Captured {len(self.screenshots)} screenshot(s)")
-            
             self.section_entry.delete(0, 'end')
             self.notes_entry.delete('1.0', 'end')
-            
-        finally:
-            try:
-                self.root.deiconify()
-            except Exception:
-                pass
+            self.rapid_started = self.rapid_started or taken
+            self.rapid_count += 1
+            added += 1
+        
+        if added:
+            self.update_screenshot_list()
+            elapsed = (datetime.now() - self.rapid_started).total_seconds()
+            rate = f", {self.rapid_count / elapsed:.1f}/s" if self.rapid_count > 1 and elapsed > 0 else ""
+            self.status_label.config(text=f"Rapid capture: {self.rapid_count} shot(s){rate}, {len(self.screenshots)} in total")
+        elif failed:
+            self.status_label.config(text="Rapid capture: screenshot capture failed")
+        
+        if self.rapid_hotkey_listener is not None:
+            self.rapid_poll_id = self.root.after(self.RAPID_POLL_MS, self.poll_rapid_captures)
+
+    def add_captured_image(self, img, img_fingerprint):
+        if self.merge_duplicate(img_fingerprint):
+            return
+        
+        section_name = self.section_entry.get().strip()
+        if not section_name:
+            section_name = simpledialog.askstring("Section Name", "Enter Section Name for this screenshot:", parent=self.root)
+            if not section_name:
+                messagebox.showwarning("Warning", "Section name is required!")
+                return
+        
+        notes = self.notes_entry.get('1.0', 'end-1c').strip()
+        
+        self.screenshots.add(img, fingerprint=img_fingerprint)
+        self.section_names.append(section_name)
+        self.notes.append(notes)
+        self.update_screenshot_list()
+        self.status_label.config(text=f"Captured {len(self.screenshots)} screenshot(s)")
+        
+        self.section_entry.delete(0, 'end')
+        self.notes_entry.delete('1.0', 'end')
 
     def import_image(self):
         file_path = filedialog.askopenfilename(
@@ -1381,6 +2006,10 @@ Registered: Student PenTester LLC"""
         if file_path:
             try:
                 img = Image.open(file_path)
+                img_fingerprint = fingerprint(img)
+                if self.merge_duplicate(img_fingerprint):
+                    return
+                
                 section_name = self.section_entry.get().strip()
                 if not section_name:
                     section_name = simpledialog.askstring("Section Name", "Enter Section Name for this image:", parent=self.root)
@@ -1390,7 +2019,7 @@ Registered: Student PenTester LLC"""
                 
                 notes = self.notes_entry.get('1.0', 'end-1c').strip()
                 
-                self.screenshots.append(img)
+                self.screenshots.add(img, fingerprint=img_fingerprint)
                 self.section_names.append(section_name)
                 self.notes.append(notes)
                 self.update_screenshot_list()
@@ -1402,10 +2031,40 @@ Registered: Student PenTester LLC"""
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load image: {str(e)}")
 
+    def merge_duplicate(self, img_fingerprint):
+        """Fold an exact duplicate of an existing screenshot into it; returns True if merged."""
+        record = self.screenshots.find_duplicate(img_fingerprint)
+        if record is None:
+            return False
+        
+        index = self.screenshots.index(record)
+        notes = self.notes_entry.get('1.0', 'end-1c').strip()
+        if notes and notes not in self.notes[index]:
+            self.notes[index] = f"{self.notes[index]}\n{notes}".strip()
+        
+        self.section_entry.delete(0, 'end')
+        self.notes_entry.delete('1.0', 'end')
+        self.update_screenshot_list()
+        self.status_label.config(text=f"Duplicate of screenshot {index + 1} ({self.section_names[index]}), merged")
+        return True
+
     def update_screenshot_list(self):
         self.screenshots_listbox.delete(0, 'end')
+        positions = {record.id: i for i, record in enumerate(self.screenshots)}
         for i, name in enumerate(self.section_names):
-            self.screenshots_listbox.insert('end', f"{i+1}. {name}")
+            label = f"{i+1}. {name}"
+            
+            # Flag near-duplicates of an earlier screenshot
+            earlier = []
+            if i < len(self.screenshots):
+                earlier = [positions[other.id] + 1 for other in self.screenshots.similar(self.screenshots[i])
+                           if positions.get(other.id, i) < i]
+            if earlier:
+                label += f"   (similar to #{earlier[0]})"
+            
+            self.screenshots_listbox.insert('end', label)
+            if earlier:
+                self.screenshots_listbox.itemconfig('end', foreground='#b35c00')
 
     def on_screenshot_select(self, event):
         selection = self.screenshots_listbox.curselection()
@@ -1413,30 +2072,44 @@ Registered: Student PenTester LLC"""
             self.current_index = selection[0]
             self.display_screenshot(self.current_index)
 
+    def on_canvas_resize(self, event):
+        canvas_size = (event.width, event.height)
+        if canvas_size == self.canvas_size:
+            return
+        self.canvas_size = canvas_size
+        self.preview_cache.clear()
+        
+        if self.resize_after_id:
+            self.root.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.root.after(150, self.redisplay_after_resize)
+    
+    def redisplay_after_resize(self):
+        self.resize_after_id = None
+        selection = self.screenshots_listbox.curselection()
+        if selection:
+            self.display_screenshot(selection[0])
+
     def display_screenshot(self, index):
         if 0 <= index < len(self.screenshots):
-            img = self.screenshots[index]
+            record = self.screenshots[index]
             
             canvas_width = self.canvas.winfo_width()
             canvas_height = self.canvas.winfo_height()
             
             if canvas_width > 1 and canvas_height > 1:
-                img_ratio = img.width / img.height
-                canvas_ratio = canvas_width / canvas_height
+                canvas_size = (canvas_width, canvas_height)
+                key = self.preview_cache.key(record, canvas_size)
+                self.displayed_preview = key
                 
-                if img_ratio > canvas_ratio:
-                    display_width = min(canvas_width - 20, img.width)
-                    display_height = int(display_width / img_ratio)
-                else:
-                    display_height = min(canvas_height - 20, img.height)
-                    display_width = int(display_height * img_ratio)
+                photo = self.preview_cache.get(record, canvas_size)
+                if photo is None:
+                    photo = ImageTk.PhotoImage(self.preview_cache.draft(record, canvas_size))
+                    future = self.preview_cache.refine(record, canvas_size)
+                    self.root.after(20, self.poll_preview_refine, record, canvas_size, key, future)
+                self.show_preview(photo, canvas_size)
                 
-                display_img = img.resize((display_width, display_height), Image.Resampling.LANCZOS)
-                self.photo = ImageTk.PhotoImage(display_img)
-                
-                self.canvas.delete("all")
-                self.canvas.create_image(canvas_width//2, canvas_height//2, image=self.photo)
-                self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+                neighbours = [j for j in (index + 1, index - 1, index + 2, index - 2) if 0 <= j < len(self.screenshots)]
+                self.preview_cache.prefetch([self.screenshots[j] for j in neighbours], canvas_size)
             
             self.preview_section_entry.delete(0, 'end')
             self.preview_section_entry.insert(0, self.section_names[index])
@@ -1445,11 +2118,29 @@ Registered: Student PenTester LLC"""
             if index < len(self.notes):
                 self.preview_notes_text.insert('1.0', self.notes[index])
 
+    def show_preview(self, photo, canvas_size):
+        canvas_width, canvas_height = canvas_size
+        self.photo = photo
+        self.canvas.delete("all")
+        self.canvas.create_image(canvas_width//2, canvas_height//2, image=self.photo)
+        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+
+    def poll_preview_refine(self, record, canvas_size, key, future):
+        if self.displayed_preview != key:
+            return
+        if not future.done():
+            self.root.after(20, self.poll_preview_refine, record, canvas_size, key, future)
+            return
+        
+        photo = self.preview_cache.get(record, canvas_size)
+        if photo is not None:
+            self.show_preview(photo, canvas_size)
+
     def move_up(self):
         selection = self.screenshots_listbox.curselection()
         if selection and selection[0] > 0:
             index = selection[0]
-            self.screenshots[index], self.screenshots[index-1] = self.screenshots[index-1], self.screenshots[index]
+            self.screenshots.swap(index, index-1)
             self.section_names[index], self.section_names[index-1] = self.section_names[index-1], self.section_names[index]
             if len(self.notes) > index and len(self.notes) > index-1:
                 self.notes[index], self.notes[index-1] = self.notes[index-1], self.notes[index]
@@ -1460,7 +2151,7 @@ Registered: Student PenTester LLC"""
         selection = self.screenshots_listbox.curselection()
         if selection and selection[0] < len(self.screenshots) - 1:
             index = selection[0]
-            self.screenshots[index], self.screenshots[index+1] = self.screenshots[index+1], self.screenshots[index]
+            self.screenshots.swap(index, index+1)
             self.section_names[index], self.section_names[index+1] = self.section_names[index+1], self.section_names[index]
             if len(self.notes) > index and len(self.notes) > index+1:
                 self.notes[index], self.notes[index+1] = self.notes[index+1], self.notes[index]
@@ -1477,6 +2168,7 @@ Registered: Student PenTester LLC"""
                 if index < len(self.notes):
                     del self.notes[index]
                 self.update_screenshot_list()
+                self.displayed_preview = None
                 self.canvas.delete("all")
                 self.preview_section_entry.delete(0, 'end')
                 self.preview_notes_text.delete('1.0', 'end')
@@ -1495,6 +2187,30 @@ Registered: Student PenTester LLC"""
                     self.preview_section_entry.delete(0, 'end')
                     self.preview_section_entry.insert(0, new_name)
 
+    def batch_rename_sections(self):
+        """Rename the selected screenshots, or all of them when at most one is selected, from a template."""
+        if not self.section_names:
+            messagebox.showwarning("Warning", "No screenshots to rename!")
+            return
+        
+        selection = self.screenshots_listbox.curselection()
+        indices = list(selection) if len(selection) > 1 else list(range(len(self.section_names)))
+        template = simpledialog.askstring(
+            "Rename Sections",
+            f"Name template for {len(indices)} screenshot(s):\n{{name}} current name, {{n}} screenshot number, {{i}} position among these",
+            initialvalue='{name}', parent=self.root)
+        if not template:
+            return
+        
+        for i, index in enumerate(indices, 1):
+            new_name = section_name_from_template(template, name=self.section_names[index], n=index + 1, i=i)
+            if new_name:
+                self.section_names[index] = new_name
+        self.update_screenshot_list()
+        for index in selection:
+            self.screenshots_listbox.selection_set(index)
+        self.status_label.config(text=f"Renamed {len(indices)} screenshot(s)")
+
     def update_section_name(self):
         selection = self.screenshots_listbox.curselection()
         if selection:
@@ -1522,16 +2238,57 @@ Registered: Student PenTester LLC"""
         self.last_name = self.last_name_entry.get()
         self.course_code = self.course_code_entry.get()
         self.default_save_path = self.save_path_entry.get()
+        self.memory_budget_mb = self.memory_budget_var.get()
+        self.screenshots.set_budget(self.memory_budget_mb)
+        self.export_png_profile = self.export_png_profile_var.get()
+        self.project_png_profile = self.project_png_profile_var.get()
+        self.screenshots.png_profile = self.project_png_profile
+        self.export_dpi = max(MIN_EXPORT_DPI, self.export_dpi_var.get()) if self.downscale_var.get() else 0
+        self.palette_mode = self.palette_mode_var.get()
+        self.palette_max_colors = max(256, self.palette_max_colors_var.get())
+        self.image_format = self.image_format_var.get()
+        self.jpeg_quality = min(95, max(50, self.jpeg_quality_var.get()))
+        self.store_media = self.store_media_var.get()
+        self.max_output_mb = max(1, self.max_output_mb_var.get()) if self.size_limit_var.get() else 0
+        self.use_render_service = self.use_render_service_var.get()
+        previous_backend, self.capture_backend = self.capture_backend, self.capture_backend_var.get()
+        previous_hotkey, self.rapid_hotkey = self.rapid_hotkey, self.rapid_hotkey_entry.get().strip() or 'ctrl+shift+F9'
+        self.section_template = self.section_template_entry.get().strip() or 'Screenshot {n}'
+        self.rapid_capture_check.config(text=f"Rapid capture: grab on {self.rapid_hotkey}, no dialogs")
         
         self.settings.update({
             'first_name': self.first_name,
             'last_name': self.last_name,
             'course_code': self.course_code,
-            'save_path': self.default_save_path
+            'save_path': self.default_save_path,
+            'memory_budget_mb': self.memory_budget_mb,
+            'export_png_profile': self.export_png_profile,
+            'project_png_profile': self.project_png_profile,
+            'export_dpi': self.export_dpi,
+            'palette_mode': self.palette_mode,
+            'palette_max_colors': self.palette_max_colors,
+            'image_format': self.image_format,
+            'jpeg_quality': self.jpeg_quality,
+            'store_media': self.store_media,
+            'max_output_mb': self.max_output_mb,
+            'use_render_service': self.use_render_service,
+            'capture_backend': self.capture_backend,
+            'rapid_hotkey': self.rapid_hotkey,
+            'section_template': self.section_template
         })
         
         self.save_settings()
         messagebox.showinfo("Settings", "Settings saved successfully!")
+        
+        # Switching to auto is when the backends are worth timing, once.
+        if self.capture_backend == 'auto' and previous_backend != 'auto':
+            probe = cached_probe(self.settings)
+            if probe is None or not probe.get('timings'):
+                self.start_capture_probe(benchmark=True)
+        
+        # A new hotkey while armed: drop the old grab, poll_hotkey_release takes the new one.
+        if self.rapid_hotkey != previous_hotkey and self.rapid_hotkey_listener is not None:
+            self.stop_rapid_capture()
 
     def browse_save_path(self):
         path = filedialog.askdirectory(initialdir=self.default_save_path)
@@ -1551,8 +2308,30 @@ Registered: Student PenTester LLC"""
             self.save_path_entry.insert(0, os.path.join(os.path.expanduser("~"), "Documents"))
             self.margin_var.set(0.25)
             self.image_height_var.set(6.5)
+            self.memory_budget_var.set(DEFAULT_MEMORY_BUDGET_MB)
+            self.export_png_profile_var.set(DEFAULT_PNG_PROFILE)
+            self.project_png_profile_var.set(DEFAULT_PNG_PROFILE)
+            self.downscale_var.set(False)
+            self.export_dpi_var.set(DEFAULT_EXPORT_DPI)
+            self.palette_mode_var.set('off')
+            self.palette_max_colors_var.set(DEFAULT_PALETTE_COLORS)
+            self.image_format_var.set('png')
+            self.jpeg_quality_var.set(DEFAULT_JPEG_QUALITY)
+            self.store_media_var.set(True)
+            self.size_limit_var.set(False)
+            self.max_output_mb_var.set(10)
+            self.use_render_service_var.set(False)
+            self.capture_backend_var.set('auto')
+            self.rapid_hotkey_entry.delete(0, 'end')
+            self.rapid_hotkey_entry.insert(0, 'ctrl+shift+F9')
+            self.section_template_entry.delete(0, 'end')
+            self.section_template_entry.insert(0, 'Screenshot {n}')
 
     def save_project(self):
+        if self.save_job is not None:
+            messagebox.showinfo("Save Project", "The project is already being saved.")
+            return
+        
         if not self.screenshots:
             messagebox.showwarning("Warning", "No screenshots to save!")
             return
@@ -1564,30 +2343,47 @@ Registered: Student PenTester LLC"""
         )
         
         if file_path:
+            self.save_job = ProjectSaveJob(file_path, self.project_data(), self.screenshots)
+            self.status_label.config(text="Saving project...")
+            self.save_job.start()
+            self.root.after(50, self.poll_save_job)
+
+    def project_data(self):
+        return {
+            'section_names': list(self.section_names),
+            'notes': list(self.notes),
+            'module': self.module_entry.get(),
+            'doc_title': self.doc_title_entry.get(),
+            'export_formats': [record.export_format for record in self.screenshots],
+            'created': datetime.now().isoformat()
+        }
+
+    def poll_save_job(self):
+        job = self.save_job
+        finished = None
+        while True:
             try:
-                project_data = {
-                    'section_names': self.section_names,
-                    'notes': self.notes,
-                    'module': self.module_entry.get(),
-                    'doc_title': self.doc_title_entry.get(),
-                    'created': datetime.now().isoformat(),
-                    'screenshot_count': len(self.screenshots)
-                }
-                
-                project_dir = file_path + "_data"
-                os.makedirs(project_dir, exist_ok=True)
-                
-                for i, img in enumerate(self.screenshots):
-                    img_path = os.path.join(project_dir, f"screenshot_{i}.png")
-                    img.save(img_path, "PNG")
-                
-                with open(file_path, 'w') as f:
-                    json.dump(project_data, f, indent=2)
-                
-                messagebox.showinfo("Success", f"Project saved successfully!")
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to save project: {str(e)}")
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == 'progress':
+                self.status_label.config(text=event[2])
+            else:
+                finished = event
+        
+        if finished is None:
+            self.root.after(50, self.poll_save_job)
+            return
+        
+        self.save_job = None
+        self.status_label.config(text=f"Captured {len(self.screenshots)} screenshot(s)")
+        if finished[0] == 'done':
+            _, archive = finished[1]
+            if archive is not None:
+                self.set_project_archive(archive)
+            messagebox.showinfo("Success", f"Project saved successfully!")
+        else:
+            messagebox.showerror("Error", f"Failed to save project: {str(finished[1])}")
 
     def load_project(self):
         file_path = filedialog.askopenfilename(
@@ -1597,20 +2393,21 @@ Registered: Student PenTester LLC"""
         
         if file_path:
             try:
-                with open(file_path, 'r') as f:
-                    project_data = json.load(f)
-                
-                project_dir = file_path + "_data"
+                project_data, entries, archive = project_io.load_project(file_path)
                 
-                self.screenshots = []
+                self.screenshots.clear()
                 self.section_names = project_data.get('section_names', [])
                 self.notes = project_data.get('notes', [])
                 
-                for i in range(project_data.get('screenshot_count', 0)):
-                    img_path = os.path.join(project_dir, f"screenshot_{i}.png")
-                    if os.path.exists(img_path):
-                        img = Image.open(img_path)
-                        self.screenshots.append(img)
+                for entry in entries:
+                    if archive is not None:
+                        source = functools.partial(archive.read_png, entry['digest'])
+                    else:
+                        source = functools.partial(project_io.read_image_file, entry['path'])
+                    record = self.screenshots.add_lazy((entry['width'], entry['height']), entry['mode'],
+                                                       source, entry['digest'], entry['thumbnail'])
+                    record.export_format = entry['export_format']
+                self.set_project_archive(archive)
                 
                 while len(self.notes) < len(self.screenshots):
                     self.notes.append("")
@@ -1629,7 +2426,21 @@ Registered: Student PenTester LLC"""
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load project: {str(e)}")
 
+    def set_project_archive(self, archive):
+        """Make `archive` the one lazily loaded screenshots read from, closing the previous one."""
+        previous, self.project_archive = self.project_archive, archive
+        if previous is None or previous is archive:
+            return
+        # A running export or save may still read screenshots of the previous
+        # project; its connection is then closed when they are released.
+        if self.generation_job is None and self.save_job is None:
+            previous.close()
+
     def generate_docx(self):
+        if self.generation_job is not None:
+            messagebox.showinfo("Generate DOCX", "A document is already being generated.")
+            return
+        
         if not self.screenshots:
             messagebox.showerror("Error", "No screenshots captured!")
             return
@@ -1639,114 +2450,173 @@ Registered: Student PenTester LLC"""
             messagebox.showerror("Error", "Module number is required!")
             return
         
-        doc_title = self.doc_title_entry.get() or "Interactive Sections"
+        options = {
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'course_code': self.course_code,
+            'module': module,
+            'doc_title': self.doc_title_entry.get() or "Interactive Sections",
+            'margin': self.margin_var.get(),
+            'image_height': self.image_height_var.get(),
+            'output_dir': os.getcwd(),
+            'encode_workers': self.settings.get('encode_workers'),
+            'export_dpi': self.export_dpi,
+            'palette_mode': self.palette_mode,
+            'palette_max_colors': self.palette_max_colors,
+            'image_format': self.image_format,
+            'jpeg_quality': self.jpeg_quality,
+            'store_media': self.store_media,
+            'png_profile': self.export_png_profile,
+            'max_output_mb': self.max_output_mb
+        }
         
-        try:
-            self.progress_bar.pack(fill='x', pady=(10, 0))
-            self.progress_var.set(0)
-            self.root.update()
-            
-            doc = Document()
-            section = doc.sections[0]
-            
-            margin = self.margin_var.get()
-            section.left_margin = Inches(margin)
-            section.right_margin = Inches(margin)
-            section.top_margin = Inches(0.5)
-            section.bottom_margin = Inches(0.5)
-            
-            header = section.header
-            header_para = header.paragraphs[0]
-            header_para.text = f"{self.first_name} {self.last_name}   {self.course_code}   Module {module} {doc_title}"
-            header_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
-            
-            sectPr = section._sectPr
-            cols = sectPr.xpath('./w:cols')
-            if cols:
-                cols[0].set('num', '1')
-            
-            total_screenshots = len(self.screenshots)
-            image_height = self.image_height_var.get()
-            
-            for i, img in enumerate(self.screenshots):
-                self.progress_var.set((i / total_screenshots) * 90)
-                self.root.update()
-                
-                p = doc.add_paragraph(self.section_names[i])
-                p.paragraph_format.space_after = Pt(6)
-                p.paragraph_format.space_before = Pt(6)
-                p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
-                
-                img_stream = io.BytesIO()
-                img.save(img_stream, format='PNG')
-                img_stream.seek(0)
-                
-                pic = doc.add_picture(img_stream, height=Inches(image_height))
-                img_stream.close()
-                
-                pic_paragraph = pic._inline.xpath('ancestor::w:p')[0]
-                pic_paragraph.set(qn('w:jc'), 'center')
-                
-                if i < len(self.notes) and self.notes[i].strip():
-                    notes_paragraph = doc.add_paragraph()
-                    notes_run = notes_paragraph.add_run(self.notes[i])
-                    notes_run.font.size = Pt(10)
-                    notes_run.font.italic = True
-                    notes_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-                    notes_paragraph.paragraph_format.space_after = Pt(12)
-                    notes_paragraph.paragraph_format.space_before = Pt(6)
-                    notes_paragraph.paragraph_format.left_indent = Inches(0.25)
-                
-                if i < len(self.screenshots) - 1:
-                    doc.add_page_break()
-            
-            self.progress_var.set(95)
-            self.root.update()
-            
-            # Fix: Save to current directory instead of Documents
-            dir_path = os.getcwd()  # Current working directory
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{self.first_name.replace(' ', '.')}.{self.last_name.replace(' ', '.')}.Module{module}_{timestamp}.docx"
-            full_path = os.path.join(dir_path, filename)
-            
-            doc.save(full_path)
-            
-            self.progress_var.set(100)
-            self.root.update()
-            
-            messagebox.showinfo("Success", f"Document saved as {filename} in {dir_path}")
-            
-            if messagebox.askyesno("Open File", "Do you want to open the file?"):
-                try:
-                    if is_windows:
-                        os.startfile(full_path)
-                    elif is_macos:
-                        subprocess.run(['open', full_path])
-                    elif is_linux:
-                        subprocess.run(['xdg-open', full_path])
-                except Exception:
-                    messagebox.showwarning("Open", "Unable to open file automatically.")
+        client = None
+        if self.use_render_service:
+            try:
+                client = RenderClient(self.settings.get('render_socket'))
+                if self.handoff_path is None:
+                    self.handoff_path = os.path.join(runtime_dir(), f"handoff-{os.getpid()}.ssp")
+            except OSError:
+                client = None
+        if client is not None and client.available():
+            self.generation_job = RenderServiceJob(client, self.handoff_path, self.project_data(), self.screenshots, options)
+        else:
+            self.generation_job = DocxGenerationJob(self.screenshots, self.section_names, self.notes, options)
+        
+        self.generate_button.config(state='disabled')
+        self.cancel_button.pack(side='left', padx=(0, 10), after=self.generate_button)
+        self.progress_bar.pack(fill='x', pady=(10, 0))
+        self.progress_var.set(0)
+        self.status_label.config(text="Generating document...")
+        
+        self.generation_job.start()
+        self.root.after(100, self.poll_generation_job)
+
+    def show_export_report(self, filename, report):
+        window = tk.Toplevel(self.root)
+        window.title(f"Export Report - {filename}")
+        window.geometry("900x400")
+        
+        text = tk.Text(window, font=('Consolas', 9), wrap='none')
+        scrollbar = ttk.Scrollbar(window, command=text.yview)
+        text.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        text.pack(fill='both', expand=True)
+        
+        text.insert('end', f"{'#':>4}  {'Section':<28} {'Original':>11} {'Exported':>11} {'Format':>8} {'Original KB':>12} {'Exported KB':>12} {'Saved KB':>9}  Settings\n")
+        for i, image in enumerate(report['images']):
+            original_size = "{}x{}".format(*image['original_size'])
+            size = "{}x{}".format(*image['size'])
+            original_kb = f"{image['original_bytes'] / 1024:.0f}" if image['original_bytes'] else "-"
+            saved_kb = f"{(image['original_bytes'] - image['bytes']) / 1024:.0f}" if image['original_bytes'] else "-"
+            image_format = "png-8" if image['palette'] else image['format']
+            text.insert('end', f"{i + 1:>4}  {image['name'][:28]:<28} {original_size:>11} {size:>11} {image_format:>8} "
+                               f"{original_kb:>12} {image['bytes'] / 1024:>12.0f} {saved_kb:>9}  {image['settings']}\n")
+        text.config(state='disabled')
+
+    def cancel_generation(self):
+        if self.generation_job is not None:
+            self.generation_job.cancel()
+            self.cancel_button.config(state='disabled')
+            self.status_label.config(text="Cancelling document generation...")
+
+    def poll_generation_job(self):
+        job = self.generation_job
+        if job is None:
+            return
+        
+        finished = None
+        while True:
+            try:
+                event = job.events.get_nowait()
+            except queue.Empty:
+                break
             
-            if messagebox.askyesno("Clear Screenshots", "Do you want to clear all screenshots for a new project?"):
-                self.screenshots = []
-                self.section_names = []
-                self.notes = []
-                self.update_screenshot_list()
-                self.canvas.delete("all")
-                self.preview_section_entry.delete(0, 'end')
-                self.preview_notes_text.delete('1.0', 'end')
-                self.status_label.config(text="No screenshots captured")
-                
-        except PermissionError:
-            messagebox.showerror("Error", f"Permission denied: Cannot save to {full_path}. Close the file if open and try again.")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save document: {str(e)}")
-        finally:
-            self.progress_bar.pack_forget()
-            self.progress_var.set(0)
+            if event[0] == 'progress':
+                self.progress_var.set(event[1])
+                self.status_label.config(text=event[2])
+            else:
+                finished = event
+        
+        if finished is None:
+            self.root.after(100, self.poll_generation_job)
+            return
+        
+        self.generation_job = None
+        self.generate_button.config(state='normal')
+        self.cancel_button.config(state='normal')
+        self.cancel_button.pack_forget()
+        self.progress_bar.pack_forget()
+        self.progress_var.set(0)
+        self.status_label.config(text=f"Captured {len(self.screenshots)} screenshot(s)")
+        
+        if finished[0] == 'done':
+            self.on_generation_done(finished[1])
+        elif finished[0] == 'cancelled':
+            self.status_label.config(text="Document generation cancelled")
+        elif isinstance(finished[1], PermissionError):
+            messagebox.showerror("Error", f"Permission denied: Cannot save to {finished[1].filename}. Close the file if open and try again.")
+        else:
+            messagebox.showerror("Error", f"Failed to save document: {str(finished[1])}")
+
+    def on_generation_done(self, result):
+        full_path, report = result
+        dir_path, filename = os.path.split(full_path)
+        message = f"Document saved as {filename} in {dir_path}"
+        
+        resampled = [image for image in report['images'] if image['size'] != image['original_size']]
+        indexed = [image for image in report['images'] if image['palette']]
+        jpeg = [image for image in report['images'] if image['format'] == 'jpeg']
+        if resampled or indexed or jpeg:
+            saved = sum(image['original_bytes'] - image['bytes'] for image in report['images'] if image['original_bytes'])
+            if resampled:
+                message += f"\n\n{len(resampled)} image(s) downscaled to {report['dpi']} DPI."
+            if indexed:
+                message += f"\n{len(indexed)} image(s) saved as 8-bit palette PNG."
+            if jpeg:
+                message += f"\n{len(jpeg)} photo-like image(s) saved as JPEG."
+            message += f"\nImages are {saved / 1048576:.1f} MB smaller in total."
+        if report['budget']:
+            message += (f"\n\nFitted to a {report['budget']} MB limit: estimated {report['estimated'] / 1048576:.1f} MB,"
+                        f" saved {report['total'] / 1048576:.1f} MB.")
+            if report['total'] > report['budget'] * 1048576:
+                message += "\nThe document is still over the limit; try a lower image height or fewer screenshots."
+        if resampled or indexed or jpeg or report['budget']:
+            self.show_export_report(filename, report)
+        
+        messagebox.showinfo("Success", message)
+        
+        if messagebox.askyesno("Open File", "Do you want to open the file?"):
+            try:
+                if is_windows:
+                    os.startfile(full_path)
+                elif is_macos:
+                    subprocess.run(['open', full_path])
+                elif is_linux:
+                    subprocess.run(['xdg-open', full_path])
+            except Exception:
+                messagebox.showwarning("Open", "Unable to open file automatically.")
+        
+        if messagebox.askyesno("Clear Screenshots", "Do you want to clear all screenshots for a new project?"):
+            self.screenshots.clear()
+            self.set_project_archive(None)
+            self.section_names = []
+            self.notes = []
+            self.update_screenshot_list()
+            self.displayed_preview = None
+            self.canvas.delete("all")
+            self.preview_section_entry.delete(0, 'end')
+            self.preview_notes_text.delete('1.0', 'end')
+            self.status_label.config(text="No screenshots captured")
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = DocxScreenshotApp(root)
     root.mainloop()
+    if app.rapid_hotkey_listener is not None:
+        app.rapid_hotkey_listener.stop()
+    app.screenshots.close()
+    for backend in app.capture_backends.values():
+        backend.close()
+    if app.handoff_path and os.path.exists(app.handoff_path):
+        os.remove(app.handoff_path)
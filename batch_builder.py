@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import project_io
+from report_builder import build_report, load_project, settings_options, add_option_arguments, argument_options
+from screenshot_store import ScreenshotStore
+
+STATE_FILE = '.batch_state.json'
+SUMMARY_FILE = 'batch_summary.json'
+LOG_DIR = 'logs'
+
+# Options that change how fast a document is built, not what is in it.
+UNHASHED_OPTIONS = ('encode_workers',)
+
+
+def find_projects(project_dir):
+    return sorted(os.path.join(project_dir, name) for name in os.listdir(project_dir)
+                  if name.lower().endswith('.ssp') and os.path.isfile(os.path.join(project_dir, name)))
+
+
+def input_hash(project_path, options):
+    """SHA-256 over the build options, the project file and, for JSON projects, their image files."""
+    sha = hashlib.sha256()
+    sha.update(json.dumps({name: value for name, value in options.items() if name not in UNHASHED_OPTIONS},
+                          sort_keys=True).encode())
+    paths = [project_path]
+    data_dir = project_io.project_data_dir(project_path)
+    if not project_io.is_archive(project_path) and os.path.isdir(data_dir):
+        paths += [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir))
+                  if project_io.PROJECT_IMAGE_PATTERN.match(name)]
+    for path in paths:
+        sha.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1048576), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def build_project(project_path, output_path, base_options, overrides, log_path):
+    """Build one project in a worker process, logging to `log_path`; returns a result dict."""
+    started = time.perf_counter()
+    with open(log_path, 'w') as log:
+        def progress(percent, text):
+            log.write(f"{datetime.now():%H:%M:%S} [{percent:3.0f}%] {text}\n")
+            log.flush()
+
+        log.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} Building {project_path} -> {output_path}\n")
+        store = ScreenshotStore()
+        archive = None
+        try:
+            project_options, section_names, notes, archive = load_project(project_path, store)
+            if not len(store):
+                raise ValueError("Project has no screenshots")
+            options = dict(base_options, **project_options)
+            options.update(overrides)
+            options['output_path'] = output_path
+            path, report = build_report(store, section_names, notes, options, progress)
+            seconds = time.perf_counter() - started
+            log.write(f"Built {len(report['images'])} screenshot(s), {report['total']} bytes in {seconds:.2f}s\n")
+            return {'status': 'built', 'seconds': seconds, 'screenshots': len(report['images']),
+                    'bytes': report['total']}
+        except Exception as e:
+            log.write(traceback.format_exc())
+            return {'status': 'failed', 'seconds': time.perf_counter() - started, 'error': str(e)}
+        finally:
+            if archive is not None:
+                archive.close()
+            store.close()
+
+
+def load_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(output_dir, state):
+    project_io.atomic_write(os.path.join(output_dir, STATE_FILE), json.dumps(state, indent=2).encode())
+
+
+def summarize(results, wall_seconds):
+    built = [result for result in results if result['status'] == 'built']
+    screenshots = sum(result['screenshots'] for result in built)
+    total_bytes = sum(result['bytes'] for result in built)
+    return {
+        'finished': datetime.now().isoformat(),
+        'wall_seconds': wall_seconds,
+        'built': len(built),
+        'skipped': sum(result['status'] == 'skipped' for result in results),
+        'failed': sum(result['status'] == 'failed' for result in results),
+        'screenshots': screenshots,
+        'bytes': total_bytes,
+        'projects_per_minute': len(built) / wall_seconds * 60 if wall_seconds and built else 0,
+        'screenshots_per_second': screenshots / wall_seconds if wall_seconds else 0,
+        'megabytes_per_second': total_bytes / 1048576 / wall_seconds if wall_seconds else 0,
+        'projects': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a DOCX report for every .ssp project in a directory")
+    parser.add_argument('projects', help="directory of .ssp projects")
+    parser.add_argument('-o', '--output', help="output directory (default: <projects>/reports)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="projects built in parallel")
+    parser.add_argument('--force', action='store_true', help="rebuild documents that are up to date")
+    add_option_arguments(parser)
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args()
+
+    output_dir = args.output or os.path.join(args.projects, 'reports')
+    log_dir = os.path.join(output_dir, LOG_DIR)
+    os.makedirs(log_dir, exist_ok=True)
+
+    base_options = settings_options(args.settings)
+    overrides = argument_options(args)
+    # Each job encodes in its own process; a nested pool per job would
+    # only oversubscribe the CPUs.
+    overrides.setdefault('encode_workers', 1)
+
+    state = load_state(output_dir)
+    results = []
+    pending = []
+    started = time.perf_counter()
+    for project_path in find_projects(args.projects):
+        name = os.path.splitext(os.path.basename(project_path))[0]
+        output_path = os.path.join(output_dir, f"{name}.docx")
+        digest = input_hash(project_path, dict(base_options, **overrides))
+        if not args.force and state.get(name, {}).get('input_hash') == digest and os.path.exists(output_path):
+            results.append({'project': name, 'status': 'skipped', 'seconds': 0, 'output': output_path})
+            if not args.quiet:
+                print(f"{name}: up to date")
+            continue
+        pending.append((name, project_path, output_path, digest))
+
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(pending) or 1))) as executor:
+        futures = {executor.submit(build_project, project_path, output_path, base_options, overrides,
+                                   os.path.join(log_dir, f"{name}.log")): (name, output_path, digest)
+                   for name, project_path, output_path, digest in pending}
+        for future in as_completed(futures):
+            name, output_path, digest = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': 'failed', 'seconds': 0, 'error': f"Worker failed: {e}"}
+            result.update(project=name, output=output_path)
+            results.append(result)
+            if result['status'] == 'built':
+                state[name] = {'input_hash': digest, 'built': datetime.now().isoformat()}
+                save_state(output_dir, state)
+            if not args.quiet:
+                if result['status'] == 'built':
+                    print(f"{name}: built {result['screenshots']} screenshot(s) in {result['seconds']:.1f}s")
+                else:
+                    print(f"{name}: FAILED after {result['seconds']:.1f}s: {result['error']}")
+
+    summary = summarize(sorted(results, key=lambda result: result['project']), time.perf_counter() - started)
+    project_io.atomic_write(os.path.join(output_dir, SUMMARY_FILE), json.dumps(summary, indent=2).encode())
+
+    print(f"{summary['built']} built, {summary['skipped']} up to date, {summary['failed']} failed "
+          f"in {summary['wall_seconds']:.1f}s ({summary['projects_per_minute']:.1f} projects/min, "
+          f"{summary['screenshots_per_second']:.1f} screenshots/s, {summary['megabytes_per_second']:.1f} MB/s)")
+    print(f"Summary written to {os.path.join(output_dir, SUMMARY_FILE)}, logs in {log_dir}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
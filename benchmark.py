@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import zipfile
+
+from PIL import Image, ImageDraw
+
+from docx.shared import Inches
+
+from docx_stream import StreamingDocxWriter
+from image_pipeline import PngEncoderPool, PNG_PROFILES, encode_png
+from capture_backends import create_backends, probe_backends, benchmark_backends
+
+
+def make_sample_image(width, height, seed=0):
+    """Screenshot-like test image: flat panels, window chrome and lines of text."""
+    rng = random.Random(seed)
+    img = Image.new('RGB', (width, height), (rng.randrange(30, 60),) * 3)
+    draw = ImageDraw.Draw(img)
+
+    for _ in range(12):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 8, width // 2), y0 + rng.randrange(height // 8, height // 2)
+        draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+        draw.rectangle((x0, y0, x1, y0 + 24), fill=(rng.randrange(60, 90),) * 3)
+
+    for y in range(0, height, 18):
+        x = rng.randrange(0, 200)
+        line = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789 -_/.:') for _ in range(rng.randrange(20, 160)))
+        draw.text((x, y), line, fill=(rng.randrange(150, 256),) * 3)
+
+    return img
+
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def bench_encode(args):
+    width, height = parse_size(args.size)
+    images = [make_sample_image(width, height, seed) for seed in range(args.count)]
+    workers = [int(w) for w in args.workers.split(',')]
+
+    print(f"Encoding {args.count} images of {width}x{height} ({os.cpu_count()} CPUs)")
+    baseline = None
+    for count in workers:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            with PngEncoderPool(count) as pool:
+                total_bytes = sum(len(data) for data in pool.imap(images))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        baseline = baseline or best
+        print(f"  workers={count:<3} {best:7.2f}s  {args.count / best:6.2f} img/s  "
+              f"speedup {baseline / best:4.2f}x  output {total_bytes / 1048576:.1f} MB")
+
+
+def bench_png(args):
+    width, height = parse_size(args.size)
+    images = [make_sample_image(width, height, seed) for seed in range(args.count)]
+    print(f"Encoding {args.count} images of {width}x{height} per PNG profile ({os.cpu_count()} CPUs)")
+
+    for profile in PNG_PROFILES:
+        start = time.perf_counter()
+        total_bytes = sum(len(encode_png(img, profile, args.threads)) for img in images)
+        elapsed = time.perf_counter() - start
+        print(f"  {profile:<9} {elapsed:7.2f}s  {args.count / elapsed:6.2f} img/s  output {total_bytes / 1048576:.1f} MB")
+
+
+def bench_zip(args):
+    width, height = parse_size(args.size)
+    media = [encode_png(make_sample_image(width, height, seed)) for seed in range(args.count)]
+    print(f"Writing DOCX with {args.count} PNGs of {width}x{height} ({sum(map(len, media)) / 1048576:.1f} MB of media)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'benchmark.docx')
+        results = {}
+        for label, compression in (('deflated', zipfile.ZIP_DEFLATED), ('stored', zipfile.ZIP_STORED)):
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                with StreamingDocxWriter(path, compression) as writer:
+                    for i, data in enumerate(media):
+                        writer.add_paragraph(f"Section {i + 1}")
+                        writer.add_picture(data, height=Inches(6.5))
+                        writer.add_page_break()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (best, os.path.getsize(path))
+
+    deflated_time, deflated_size = results['deflated']
+    for label, (best, size) in results.items():
+        print(f"  media {label:<9} {best:7.2f}s  speedup {deflated_time / best:4.2f}x  "
+              f"file {size / 1048576:7.2f} MB ({(size - deflated_size) / deflated_size:+.1%})")
+
+
+def bench_capture(args):
+    """Full-screen or region grabs per registered capture backend; needs a display, e.g. under xvfb-run."""
+    backends = create_backends(args.backends.split(',') if args.backends else None)
+    try:
+        for name, result in probe_backends(backends).items():
+            if not result['ok']:
+                print(f"  {name:<17} unavailable: {result['detail']}")
+                del backends[name]
+        errors = {}
+        region = tuple(int(value) for value in args.region.split(',')) if args.region else None
+        timings = benchmark_backends(backends, args.count, region, errors)
+    finally:
+        for backend in backends.values():
+            backend.close()
+
+    for name, error in errors.items():
+        print(f"  {name:<17} grab failed: {error}")
+    slowest = max((timing['mean_ms'] for timing in timings.values()), default=None)
+    for name, timing in sorted(timings.items(), key=lambda item: item[1]['mean_ms']):
+        print(f"  {name:<17} {timing['mean_ms']:8.1f} ms/grab  {timing['grabs_per_second']:7.1f} grabs/s  "
+              f"first {timing['first_ms']:7.1f} ms  speedup {slowest / timing['mean_ms']:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Screenshot to DOCX performance benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    encode_parser = subparsers.add_parser('encode', help="PNG encoding throughput by process pool size")
+    encode_parser.add_argument('--count', type=int, default=16)
+    encode_parser.add_argument('--size', default='3840x2160')
+    encode_parser.add_argument('--workers', default=','.join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})))
+    encode_parser.add_argument('--repeat', type=int, default=1)
+    encode_parser.set_defaults(func=bench_encode)
+
+    png_parser = subparsers.add_parser('png', help="PNG encoder profiles, time and size")
+    png_parser.add_argument('--count', type=int, default=4)
+    png_parser.add_argument('--size', default='3840x2160')
+    png_parser.add_argument('--threads', type=int, default=None, help="deflate threads for the smallest profile")
+    png_parser.set_defaults(func=bench_png)
+
+    zip_parser = subparsers.add_parser('zip', help="DOCX save time and size with stored vs deflated media")
+    zip_parser.add_argument('--count', type=int, default=16)
+    zip_parser.add_argument('--size', default='3840x2160')
+    zip_parser.add_argument('--repeat', type=int, default=3)
+    zip_parser.set_defaults(func=bench_zip)
+
+    capture_parser = subparsers.add_parser('capture', help="screen grab time per capture backend")
+    capture_parser.add_argument('--count', type=int, default=20)
+    capture_parser.add_argument('--region', help="x,y,width,height to grab instead of the whole screen")
+    capture_parser.add_argument('--backends', help="comma-separated backend names (default: all for this platform)")
+    capture_parser.set_defaults(func=bench_capture)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
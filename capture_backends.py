@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+
+import argparse
+import ctypes
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from PIL import Image
+
+from x11_capture import XDisplay, XShmCapture, XShmUnavailable, XUnavailable
+
+CURRENT_OS = platform.system().lower()
+
+GRAB_TIMEOUT = 10
+SELECT_TIMEOUT = 30
+PROBE_BENCHMARK_COUNT = 3
+DEFAULT_BENCHMARK_COUNT = 10
+
+# What a capture takes: the window under the pointer (or the user's
+# selection with interactive backends), the active window, the monitor
+# under the pointer, a saved fixed region or the whole virtual desktop.
+CAPTURE_AREAS = ('window', 'active', 'monitor', 'region', 'screen')
+
+
+class CaptureUnavailable(Exception):
+    pass
+
+
+class CaptureBackend:
+    """One way of getting screen pixels.
+
+    probe() checks, cheaply, that the backend can work here and returns a
+    short description; grab() takes the whole screen or an (x, y, width,
+    height) region without user interaction. capture() is what a capture
+    from the app does for one of CAPTURE_AREAS; the rectangle comes from
+    the platform's window and monitor geometry, so only the pixels needed
+    are grabbed, and falls back to the monitor under the pointer rather
+    than the whole desktop. When even that cannot be found the capture
+    fails instead of taking more than was asked for. For 'window',
+    interactive backends let the user click a window or drag an area
+    instead, unless the capture must not wait for the user (select=False).
+    """
+
+    name = None
+    platforms = ()
+    interactive = False
+
+    def probe(self):
+        raise NotImplementedError
+
+    def grab(self, region=None):
+        raise NotImplementedError
+
+    def geometry(self):
+        return screen_geometry()
+
+    def area_rect(self, area, region=None):
+        """Rectangle to grab for a capture area; None means the whole desktop."""
+        if area == 'screen':
+            return None
+        if area == 'region':
+            if not region:
+                raise CaptureUnavailable("No capture region has been set")
+            return tuple(region)
+        geometry = self.geometry()
+        try:
+            rect = None
+            if area == 'window':
+                rect = geometry.pointer_window_rect()
+            elif area == 'active':
+                rect = geometry.active_window_rect()
+            rect = rect or geometry.pointer_monitor_rect()
+        except (XUnavailable, OSError) as e:
+            raise CaptureUnavailable(f"Cannot find the {area} to capture: {e}")
+        if rect is None:
+            raise CaptureUnavailable(f"Cannot find the {area} to capture")
+        return rect
+
+    def capture_window(self):
+        return self.grab(self.area_rect('window'))
+
+    def capture(self, area='window', region=None, select=True):
+        """Capture `area`; with select=False interactive backends grab the window under the pointer too."""
+        if area == 'window' and (select or not self.interactive):
+            return self.capture_window()
+        return self.grab(self.area_rect(area, region))
+
+    def close(self):
+        pass
+
+
+BACKENDS = OrderedDict()
+
+
+def register(backend_class):
+    """Class decorator adding a backend; registration order is the preference before any benchmark."""
+    BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+def require_display():
+    if CURRENT_OS == 'linux' and not os.environ.get('DISPLAY'):
+        raise CaptureUnavailable("No X display (DISPLAY is not set)")
+
+
+_geometry = None
+_geometry_lock = threading.Lock()
+
+
+def screen_geometry():
+    """Window and monitor geometry for this platform, shared by the backends.
+
+    The result answers pointer_window_rect(), active_window_rect() and
+    pointer_monitor_rect() with (x, y, width, height) rectangles. On Linux
+    it is a plain Xlib connection, so it works without MIT-SHM. Raises
+    CaptureUnavailable where there is none (macOS, no X display).
+    """
+    global _geometry
+    with _geometry_lock:
+        if _geometry is None:
+            if CURRENT_OS == 'windows':
+                geometry = GdiBackend()
+                geometry.probe()
+            elif CURRENT_OS == 'linux':
+                require_display()
+                try:
+                    geometry = XDisplay()
+                except XUnavailable as e:
+                    raise CaptureUnavailable(str(e))
+            else:
+                raise CaptureUnavailable(f"Window and monitor geometry are not available on {CURRENT_OS}")
+            _geometry = geometry
+        return _geometry
+
+
+def capture_first(backends, area='window', region=None, select=True):
+    """Capture with the first of `backends` that works; None if they all fail.
+
+    Failures are printed to stderr, so a backend that is ranked first but
+    keeps failing does not go unnoticed behind the fallbacks.
+    """
+    for backend in backends:
+        try:
+            img = backend.capture(area, region, select)
+        except Exception as e:
+            print(f"[CAPTURE] {datetime.now():%H:%M:%S} - {backend.name} failed: {type(e).__name__}: {e}",
+                  file=sys.stderr)
+            continue
+        if img is not None:
+            return img
+    return None
+
+
+def active_window_title():
+    """Title of the active window, or an empty string where it cannot be found."""
+    try:
+        return screen_geometry().active_window_title()
+    except Exception:
+        return ''
+
+
+@register
+class XShmBackend(CaptureBackend):
+    name = 'xshm'
+    platforms = ('linux',)
+
+    def __init__(self):
+        # Not self.capture, which would hide CaptureBackend.capture().
+        self.xshm = None
+
+    def probe(self):
+        require_display()
+        try:
+            self.xshm = self.xshm or XShmCapture()
+        except XShmUnavailable as e:
+            raise CaptureUnavailable(str(e))
+        width, height = self.xshm.screen_size
+        return f"MIT-SHM, {width}x{height}"
+
+    def grab(self, region=None):
+        if self.xshm is None:
+            self.probe()
+        if region is not None:
+            region = self.xshm.clip(region)
+            if region is None:
+                raise CaptureUnavailable("The capture region is off the screen")
+        return self.xshm.grab(region)
+
+    def geometry(self):
+        if self.xshm is None:
+            self.probe()
+        return self.xshm
+
+    def close(self):
+        if self.xshm is not None:
+            self.xshm.close()
+            self.xshm = None
+
+
+@register
+class GdiBackend(CaptureBackend):
+    """Windows GDI: PrintWindow of the window under the cursor, BitBlt of the screen otherwise."""
+
+    name = 'gdi'
+    platforms = ('windows',)
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+    PW_RENDERFULLCONTENT = 0x00000002
+    DWMWA_EXTENDED_FRAME_BOUNDS = 9
+    MONITOR_DEFAULTTONEAREST = 2
+    # SM_XVIRTUALSCREEN, SM_YVIRTUALSCREEN, SM_CXVIRTUALSCREEN, SM_CYVIRTUALSCREEN
+    SM_VIRTUALSCREEN = (76, 77, 78, 79)
+
+    def probe(self):
+        try:
+            self.user32 = ctypes.windll.user32
+            self.gdi32 = ctypes.windll.gdi32
+            self.dwmapi = ctypes.windll.dwmapi
+        except (AttributeError, OSError) as e:
+            raise CaptureUnavailable(f"Windows GDI not available: {e}")
+        return "GDI"
+
+    def _window_under_cursor(self):
+        import ctypes.wintypes as wt
+        pt = wt.POINT()
+        self.user32.GetCursorPos(ctypes.byref(pt))
+        hwnd = self.user32.WindowFromPoint(pt)
+        if not hwnd or self.user32.IsIconic(hwnd):
+            return None
+        return hwnd
+
+    def _get_window_rect(self, hwnd):
+        import ctypes.wintypes as wt
+        rect = wt.RECT()
+        ok = self.dwmapi.DwmGetWindowAttribute(wt.HWND(hwnd), wt.DWORD(self.DWMWA_EXTENDED_FRAME_BOUNDS),
+                                               ctypes.byref(rect), ctypes.sizeof(rect))
+        if ok != 0:
+            self.user32.GetWindowRect(wt.HWND(hwnd), ctypes.byref(rect))
+        return rect.left, rect.top, rect.right, rect.bottom
+
+    def _pil_image_from_hbitmap(self, hdc, hbmp, width, height):
+        bmi = ctypes.create_string_buffer(40 + 4 * 256)
+        ctypes.memset(bmi, 0, 40)
+        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint32))[0] = 40
+        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_int32))[1] = width
+        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_int32))[2] = -height
+        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint16))[6] = 1
+        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint16))[7] = 32
+        ctypes.cast(bmi, ctypes.POINTER(ctypes.c_uint32))[5] = 0
+        buf_len = width * height * 4
+        pixel_data = ctypes.create_string_buffer(buf_len)
+        self.gdi32.GetDIBits(hdc, hbmp, 0, height, pixel_data, bmi, 0)
+        return Image.frombuffer("RGBA", (width, height), pixel_data, "raw", "BGRA", 0, 1)
+
+    def _copy(self, hwnd, source_dc, x, y, width, height, print_window=False):
+        memdc = self.gdi32.CreateCompatibleDC(source_dc)
+        hbmp = self.gdi32.CreateCompatibleBitmap(source_dc, width, height)
+        try:
+            self.gdi32.SelectObject(memdc, hbmp)
+            ok = 0
+            if print_window:
+                ok = self.user32.PrintWindow(hwnd, memdc, self.PW_RENDERFULLCONTENT)
+            if ok == 0:
+                ok = self.gdi32.BitBlt(memdc, 0, 0, width, height, source_dc, x, y, self.SRCCOPY | self.CAPTUREBLT)
+            return self._pil_image_from_hbitmap(memdc, hbmp, width, height) if ok != 0 else None
+        finally:
+            self.gdi32.DeleteObject(hbmp)
+            self.gdi32.DeleteDC(memdc)
+
+    def geometry(self):
+        if not hasattr(self, 'user32'):
+            self.probe()
+        return self
+
+    def _window_rect(self, hwnd):
+        if not hwnd:
+            return None
+        left, top, right, bottom = self._get_window_rect(hwnd)
+        if right <= left or bottom <= top:
+            return None
+        return left, top, right - left, bottom - top
+
+    def pointer_window_rect(self):
+        return self._window_rect(self._window_under_cursor())
+
+    def active_window_rect(self):
+        return self._window_rect(self.user32.GetForegroundWindow())
+
+    def active_window_title(self):
+        hwnd = self.user32.GetForegroundWindow()
+        if not hwnd:
+            return ''
+        title = ctypes.create_unicode_buffer(self.user32.GetWindowTextLengthW(hwnd) + 1)
+        self.user32.GetWindowTextW(hwnd, title, len(title))
+        return title.value
+
+    def pointer_monitor_rect(self):
+        import ctypes.wintypes as wt
+
+        class MONITORINFO(ctypes.Structure):
+            _fields_ = [('cbSize', wt.DWORD), ('rcMonitor', wt.RECT), ('rcWork', wt.RECT), ('dwFlags', wt.DWORD)]
+
+        pt = wt.POINT()
+        self.user32.GetCursorPos(ctypes.byref(pt))
+        monitor = self.user32.MonitorFromPoint(pt, self.MONITOR_DEFAULTTONEAREST)
+        info = MONITORINFO()
+        info.cbSize = ctypes.sizeof(info)
+        if not monitor or not self.user32.GetMonitorInfoW(monitor, ctypes.byref(info)):
+            return None
+        rect = info.rcMonitor
+        return rect.left, rect.top, rect.right - rect.left, rect.bottom - rect.top
+
+    def grab(self, region=None):
+        if not hasattr(self, 'user32'):
+            self.probe()
+        if region is None:
+            region = tuple(self.user32.GetSystemMetrics(index) for index in self.SM_VIRTUALSCREEN)
+        x, y, width, height = region
+        screen_dc = self.user32.GetDC(0)
+        try:
+            img = self._copy(None, screen_dc, x, y, width, height)
+        finally:
+            self.user32.ReleaseDC(0, screen_dc)
+        if img is None:
+            raise CaptureUnavailable("BitBlt failed")
+        return img
+
+    def capture_window(self):
+        if not hasattr(self, 'user32'):
+            self.probe()
+        hwnd = self._window_under_cursor()
+        if hwnd is None:
+            return self.grab(self.area_rect('monitor'))
+        left, top, right, bottom = self._get_window_rect(hwnd)
+        width, height = right - left, bottom - top
+        if width <= 0 or height <= 0:
+            return self.grab(self.area_rect('monitor'))
+        hdc_window = self.user32.GetWindowDC(hwnd)
+        try:
+            img = self._copy(hwnd, hdc_window, 0, 0, width, height, print_window=True)
+        finally:
+            self.user32.ReleaseDC(hwnd, hdc_window)
+        return img if img is not None else self.grab((left, top, width, height))
+
+
+@register
+class PilBackend(CaptureBackend):
+    """PIL.ImageGrab: GDI on Windows, screencapture on macOS, XCB on Linux."""
+
+    name = 'pil'
+    platforms = ('windows', 'darwin', 'linux')
+
+    def probe(self):
+        require_display()
+        from PIL import ImageGrab, features
+        if CURRENT_OS == 'linux' and not features.check('xcb'):
+            raise CaptureUnavailable("Pillow was built without XCB support")
+        self.image_grab = ImageGrab
+        return "PIL.ImageGrab"
+
+    def grab(self, region=None):
+        if not hasattr(self, 'image_grab'):
+            self.probe()
+        bbox = None
+        if region is not None:
+            x, y, width, height = region
+            bbox = (x, y, x + width, y + height)
+        return self.image_grab.grab(bbox=bbox).convert('RGB')
+
+
+class CommandBackend(CaptureBackend):
+    """A screenshot tool run as a subprocess, writing a PNG to a temp file."""
+
+    tool = None
+    interactive = True
+
+    def probe(self):
+        path = shutil.which(self.tool)
+        if not path:
+            raise CaptureUnavailable(f"{self.tool} not found")
+        require_display()
+        return path
+
+    def grab_command(self, path, region):
+        """Command for a non-interactive grab, and whether it already honours `region`."""
+        raise NotImplementedError
+
+    def select_command(self, path):
+        raise NotImplementedError
+
+    def _run(self, command_for, timeout):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'capture.png')
+            result = subprocess.run(command_for(path), capture_output=True, timeout=timeout)
+            if result.returncode != 0 or not os.path.exists(path):
+                raise CaptureUnavailable(f"{self.tool} failed: {result.stderr.decode(errors='replace').strip()}")
+            with Image.open(path) as img:
+                img.load()
+                return img
+
+    def grab(self, region=None):
+        cropped = []
+
+        def command_for(path):
+            command, honours_region = self.grab_command(path, region)
+            cropped.append(honours_region)
+            return command
+
+        img = self._run(command_for, GRAB_TIMEOUT)
+        if region is not None and not cropped[0]:
+            x, y, width, height = region
+            img = img.crop((x, y, x + width, y + height))
+        return img
+
+    def capture_window(self):
+        return self._run(self.select_command, SELECT_TIMEOUT)
+
+
+@register
+class MaimBackend(CommandBackend):
+    name = 'maim'
+    tool = 'maim'
+    platforms = ('linux',)
+
+    def grab_command(self, path, region):
+        if region is None:
+            return ['maim', path], True
+        x, y, width, height = region
+        return ['maim', '-g', f"{width}x{height}+{x}+{y}", path], True
+
+    def select_command(self, path):
+        return ['maim', '-s', path]
+
+
+@register
+class ImportBackend(CommandBackend):
+    """ImageMagick's import."""
+
+    name = 'import'
+    tool = 'import'
+    platforms = ('linux',)
+
+    def grab_command(self, path, region):
+        if region is None:
+            return ['import', '-silent', '-window', 'root', path], True
+        x, y, width, height = region
+        return ['import', '-silent', '-window', 'root', '-crop', f"{width}x{height}+{x}+{y}", path], True
+
+    def select_command(self, path):
+        return ['import', '-silent', path]
+
+
+@register
+class ScrotBackend(CommandBackend):
+    name = 'scrot'
+    tool = 'scrot'
+    platforms = ('linux',)
+
+    def grab_command(self, path, region):
+        if region is None:
+            return ['scrot', path], True
+        x, y, width, height = region
+        return ['scrot', '-a', f"{x},{y},{width},{height}", path], True
+
+    def select_command(self, path):
+        return ['scrot', '-s', path]
+
+
+@register
+class ScreencaptureBackend(CommandBackend):
+    name = 'screencapture'
+    tool = 'screencapture'
+    platforms = ('darwin',)
+
+    def grab_command(self, path, region):
+        if region is None:
+            return ['screencapture', '-x', path], True
+        x, y, width, height = region
+        return ['screencapture', '-x', '-R', f"{x},{y},{width},{height}", path], True
+
+    def select_command(self, path):
+        return ['screencapture', '-i', path]
+
+
+@register
+class GnomeScreenshotBackend(CommandBackend):
+    name = 'gnome-screenshot'
+    tool = 'gnome-screenshot'
+    platforms = ('linux',)
+
+    def grab_command(self, path, region):
+        return ['gnome-screenshot', '-f', path], False
+
+    def select_command(self, path):
+        return ['gnome-screenshot', '-a', '-f', path]
+
+
+@register
+class PyautoguiBackend(CaptureBackend):
+    name = 'pyautogui'
+    platforms = ('windows', 'darwin', 'linux')
+
+    def probe(self):
+        require_display()
+        try:
+            import pyautogui
+        except Exception as e:
+            raise CaptureUnavailable(f"pyautogui not usable: {e}")
+        self.pyautogui = pyautogui
+        return f"pyautogui {getattr(pyautogui, '__version__', '')}".strip()
+
+    def grab(self, region=None):
+        if not hasattr(self, 'pyautogui'):
+            self.probe()
+        return self.pyautogui.screenshot(region=region)
+
+
+def environment_key():
+    """Probe results are only reused on the same platform and display."""
+    return f"{CURRENT_OS}:{os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY') or ''}"
+
+
+def platform_backends():
+    return [name for name, backend_class in BACKENDS.items() if CURRENT_OS in backend_class.platforms]
+
+
+def create_backends(names=None):
+    return {name: BACKENDS[name]() for name in (names or platform_backends())}
+
+
+def probe_backends(backends):
+    """{name: {'ok': bool, 'detail': str}} for each backend instance."""
+    results = {}
+    for name, backend in backends.items():
+        try:
+            results[name] = {'ok': True, 'detail': backend.probe()}
+        except Exception as e:
+            results[name] = {'ok': False, 'detail': str(e)}
+    return results
+
+
+def benchmark_backends(backends, count=DEFAULT_BENCHMARK_COUNT, region=None, errors=None):
+    """Full-screen grab timings per backend: first grab, mean of `count` more and grabs per second.
+
+    Backends that fail are left out of the result, with the reason in `errors` if given.
+    """
+    timings = {}
+    for name, backend in backends.items():
+        try:
+            start = time.perf_counter()
+            img = backend.grab(region)
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(count):
+                backend.grab(region)
+            mean = (time.perf_counter() - start) / max(1, count)
+        except Exception as e:
+            if errors is not None:
+                errors[name] = str(e) or type(e).__name__
+            continue
+        timings[name] = {'first_ms': first * 1000, 'mean_ms': mean * 1000,
+                         'grabs_per_second': 1 / mean if mean else 0, 'size': list(img.size)}
+    return timings
+
+
+def probe_and_benchmark(count=PROBE_BENCHMARK_COUNT):
+    """Probe every backend of this platform and time the working ones; the result is what settings cache.
+
+    With a `count` of 0 nothing is grabbed: the backends are only checked
+    for being usable, which does not flash the screen or play a shutter
+    sound the way timing the screenshot tools does, and the result has no
+    timings.
+    """
+    backends = create_backends()
+    try:
+        probe = probe_backends(backends)
+        timings = {}
+        if count:
+            working = {name: backend for name, backend in backends.items() if probe[name]['ok']}
+            errors = {}
+            timings = benchmark_backends(working, count, errors=errors)
+            # A backend that loads but cannot grab is no use either.
+            for name, error in errors.items():
+                probe[name] = {'ok': False, 'detail': f"grab failed: {error}"}
+    finally:
+        for backend in backends.values():
+            backend.close()
+    return {'environment': environment_key(), 'probed': datetime.now().isoformat(),
+            'backends': probe, 'timings': timings}
+
+
+def ranked_backends(cache):
+    """Working backend names, fastest measured first, then unmeasured ones in registration order."""
+    if not cache:
+        return platform_backends()
+    working = [name for name in platform_backends() if cache['backends'].get(name, {}).get('ok')]
+    timings = cache.get('timings') or {}
+    measured = sorted((name for name in working if name in timings), key=lambda name: timings[name]['mean_ms'])
+    return measured + [name for name in working if name not in timings]
+
+
+def cached_probe(settings):
+    """The probe cached in `settings` if it was made on this platform and display."""
+    cache = settings.get('capture_probe')
+    if cache and cache.get('environment') == environment_key():
+        return cache
+    return None
+
+
+def print_results(cache):
+    for name, result in cache['backends'].items():
+        timing = cache['timings'].get(name)
+        if timing:
+            print(f"  {name:<17} {timing['mean_ms']:8.1f} ms/grab  {timing['grabs_per_second']:7.1f} grabs/s  "
+                  f"first {timing['first_ms']:7.1f} ms  {result['detail']}")
+        elif result['ok']:
+            print(f"  {name:<17} not timed    {result['detail']}")
+        else:
+            print(f"  {name:<17} unavailable  {result['detail']}")
+    ranking = ranked_backends(cache)
+    print(f"Fastest working backend: {ranking[0] if ranking else 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe and benchmark the screen capture backends")
+    parser.add_argument('--count', type=int, default=DEFAULT_BENCHMARK_COUNT, help="grabs per backend")
+    args = parser.parse_args()
+
+    print(f"Capture backends ({environment_key()}):")
+    print_results(probe_and_benchmark(args.count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+
+from docx import Document
+from docx.image.image import Image as DocxImage
+from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from docx.oxml.shape import CT_Inline
+from docx.shape import InlineShape
+from lxml import etree
+
+CONTENT_TYPES_PART = '[Content_Types].xml'
+DOCUMENT_PART = 'word/document.xml'
+DOCUMENT_RELS_PART = 'word/_rels/document.xml.rels'
+MEDIA_CONTENT_TYPES = {'png': CT.PNG, 'jpg': CT.JPEG, 'jpeg': CT.JPEG}
+
+CT_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/content-types'
+RELS_NAMESPACE = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_BODY_MARKER = 'streamed-body'
+
+
+class StreamingDocxWriter:
+    """Writes a DOCX package while the document is being built.
+
+    `document` is an ordinary python-docx Document that holds the section
+    setup, header and styles, and is used to create body content. Elements
+    added to its body are serialized and removed as soon as the next one is
+    started, and each picture goes straight into word/media/ in the zip, so
+    memory use is bounded by one image rather than the whole report.
+
+    Media is written with `media_compression`; PNG and JPEG data is already
+    compressed, so ZIP_STORED saves the deflate pass at almost no cost in
+    size. XML parts are always deflated. The body XML is staged in a temp
+    file, and document.xml, its relationships and the content types are
+    completed in close(). The package is written next to `path` and renamed
+    into place at the end; used as a context manager the writer opens on
+    entry and closes, or aborts on an exception, on exit.
+    """
+
+    def __init__(self, path, media_compression=zipfile.ZIP_STORED):
+        self.path = path
+        self.tmp_path = f"{path}.part"
+        self.media_compression = media_compression
+        self.document = Document()
+        self.zip = None
+        self.body = None
+        self.media = {}
+        self.relationships = []
+        self.extensions = set()
+        self.next_rId = None
+        self.next_shape_id = None
+        self.document_prefix = None
+        self.document_suffix = None
+        self.root_namespaces = None
+        self.skeleton_rels = None
+        self.skeleton_content_types = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def open(self):
+        """Write the static parts of the package; call after setting up sections and header."""
+        body = self.document.element.body
+        for child in list(body):
+            if child is not body.sectPr:
+                body.remove(child)
+        body.insert(0, etree.Comment(_BODY_MARKER))
+        xml = etree.tostring(self.document.element, encoding='UTF-8', standalone=True)
+        body.remove(body[0])
+        self.document_prefix, self.document_suffix = xml.split(f"<!--{_BODY_MARKER}-->".encode())
+        self.root_namespaces = dict(self.document.element.nsmap)
+        self.next_shape_id = self.document.part.next_id
+
+        skeleton = io.BytesIO()
+        self.document.save(skeleton)
+        self.zip = zipfile.ZipFile(self.tmp_path, 'w', zipfile.ZIP_DEFLATED)
+        self.body = tempfile.TemporaryFile()
+
+        with zipfile.ZipFile(skeleton) as source:
+            self.skeleton_content_types = source.read(CONTENT_TYPES_PART)
+            self.skeleton_rels = source.read(DOCUMENT_RELS_PART)
+            for info in source.infolist():
+                if info.filename not in (CONTENT_TYPES_PART, DOCUMENT_PART, DOCUMENT_RELS_PART):
+                    self.zip.writestr(info.filename, source.read(info.filename), zipfile.ZIP_DEFLATED)
+
+        rIds = [int(n) for n in re.findall(rb'Id="rId(\d+)"', self.skeleton_rels)]
+        self.next_rId = max(rIds, default=0) + 1
+
+    def add_paragraph(self, text='', style=None):
+        self.flush()
+        return self.document.add_paragraph(text, style)
+
+    def add_page_break(self):
+        self.flush()
+        return self.document.add_page_break()
+
+    def add_picture(self, image_data, width=None, height=None):
+        """Picture in a new paragraph, like Document.add_picture(); returns its InlineShape."""
+        self.flush()
+        if hasattr(image_data, 'read'):
+            image_data = image_data.read()
+        image = DocxImage.from_blob(image_data)
+        rId = self._add_media(image, image_data)
+        cx, cy = image.scaled_dimensions(width, height)
+
+        run = self.document.add_paragraph().add_run()
+        inline = CT_Inline.new_pic_inline(self.next_shape_id, rId, image.filename, cx, cy)
+        self.next_shape_id += 1
+        run._r.add_drawing(inline)
+        return InlineShape(inline)
+
+    def flush(self):
+        """Serialize the body elements built so far and drop them from the tree."""
+        body = self.document.element.body
+        for child in list(body):
+            if child is body.sectPr:
+                continue
+            self.body.write(self._serialize(child))
+            body.remove(child)
+
+    def close(self):
+        self.flush()
+        self.body.seek(0)
+        with self.zip.open(DOCUMENT_PART, 'w') as part:
+            part.write(self.document_prefix)
+            shutil.copyfileobj(self.body, part)
+            part.write(self.document_suffix)
+        self.body.close()
+        self.zip.writestr(DOCUMENT_RELS_PART, self._document_rels(), zipfile.ZIP_DEFLATED)
+        self.zip.writestr(CONTENT_TYPES_PART, self._content_types(), zipfile.ZIP_DEFLATED)
+        self.zip.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        if self.body is not None:
+            self.body.close()
+        if self.zip is not None:
+            self.zip.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+    def _add_media(self, image, image_data):
+        # Identical images share one media part, as python-docx does.
+        digest = hashlib.sha1(image_data).hexdigest()
+        if digest in self.media:
+            return self.media[digest]
+
+        partname = f"word/media/image{len(self.media) + 1}.{image.ext}"
+        rId = f"rId{self.next_rId}"
+        self.next_rId += 1
+        self.zip.writestr(partname, image_data, self.media_compression)
+        self.extensions.add(image.ext)
+        self.relationships.append((rId, partname[len('word/'):]))
+        self.media[digest] = rId
+        return rId
+
+    def _serialize(self, element):
+        xml = etree.tostring(element, encoding='UTF-8')
+        # Drop namespace declarations already made on the document root.
+        end = xml.index(b'>')
+        start_tag = xml[:end]
+        for prefix, uri in re.findall(rb' xmlns:(\w+)="([^"]*)"', start_tag):
+            if self.root_namespaces.get(prefix.decode()) == uri.decode():
+                start_tag = start_tag.replace(b' xmlns:' + prefix + b'="' + uri + b'"', b'', 1)
+        return start_tag + xml[end:]
+
+    def _content_types(self):
+        root = etree.fromstring(self.skeleton_content_types)
+        defaults = {element.get('Extension') for element in root.findall(f'{{{CT_NAMESPACE}}}Default')}
+        for ext in self.extensions - defaults:
+            root.insert(0, etree.Element(f'{{{CT_NAMESPACE}}}Default', Extension=ext, ContentType=MEDIA_CONTENT_TYPES[ext]))
+        # Defaults sorted by extension ahead of the overrides, as python-docx writes them.
+        elements = sorted(root.findall(f'{{{CT_NAMESPACE}}}Default'), key=lambda element: element.get('Extension'))
+        for i, element in enumerate(elements):
+            root.insert(i, element)
+        return etree.tostring(root, encoding='UTF-8', standalone=True)
+
+    def _document_rels(self):
+        root = etree.fromstring(self.skeleton_rels)
+        for rId, target in self.relationships:
+            etree.SubElement(root, f'{{{RELS_NAMESPACE}}}Relationship', Id=rId, Type=RT.IMAGE, Target=target)
+        return etree.tostring(root, encoding='UTF-8', standalone=True)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import hashlib
+from collections import namedtuple
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HASH_SIZE = 8
+# Hashes at most this many bits apart (out of 64) count as near-duplicates.
+NEAR_DUPLICATE_DISTANCE = 6
+
+Fingerprint = namedtuple('Fingerprint', ['digest', 'ahash', 'dhash'])
+
+
+def pixel_digest(img):
+    """SHA-256 of the decoded pixels, so the same image matches whatever its file encoding."""
+    h = hashlib.sha256(f"{img.mode} {img.width}x{img.height} ".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def _block_sums(small, columns, rows):
+    """Integer pixel sums of a `columns` x `rows` grid of blocks over a greyscale image."""
+    block_w, block_h = small.width // columns, small.height // rows
+    if np is not None:
+        pixels = np.asarray(small, dtype=np.int64)
+        return pixels.reshape(rows, block_h, columns, block_w).sum(axis=(1, 3)).tolist()
+
+    pixels = small.tobytes()
+    sums = [[0] * columns for _ in range(rows)]
+    for y in range(small.height):
+        row = sums[y // block_h]
+        line = pixels[y * small.width:(y + 1) * small.width]
+        for x in range(columns):
+            row[x] += sum(line[x * block_w:(x + 1) * block_w])
+    return sums
+
+
+def perceptual_hashes(img):
+    """Average hash and difference hash of the image, 64 bits each."""
+    # One resize to a grid of 8x8 pixel blocks, then both hashes from block
+    # sums. The sums are exact integers and the comparisons are made on them
+    # directly, so the NumPy and pure-Python paths give the same bits.
+    block = 8
+    small = img.convert('L').resize(((HASH_SIZE + 1) * block, HASH_SIZE * block), Image.Resampling.BOX)
+    wide = _block_sums(small, HASH_SIZE + 1, HASH_SIZE)
+    square = _block_sums(small, HASH_SIZE, HASH_SIZE)
+
+    # A block is above the mean of the HASH_SIZE**2 block means when its sum
+    # times the block count exceeds the sum of all blocks.
+    total = sum(map(sum, square))
+    ahash = _bits_to_int(value * HASH_SIZE * HASH_SIZE > total for row in square for value in row)
+    dhash = _bits_to_int(row[x + 1] > row[x] for row in wide for x in range(HASH_SIZE))
+    return ahash, dhash
+
+
+def fingerprint(img):
+    ahash, dhash = perceptual_hashes(img)
+    return Fingerprint(pixel_digest(img), ahash, dhash)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class DuplicateIndex:
+    """Exact and near-duplicate lookup over image fingerprints.
+
+    Exact matches are a dict lookup on the pixel digest. For near matches the
+    64-bit dHash is split into `bands` 8-bit bands, each indexed separately:
+    two hashes within `max_distance` < `bands` bits share at least one band,
+    so only images sharing a band are compared instead of every image.
+    """
+
+    def __init__(self, max_distance=NEAR_DUPLICATE_DISTANCE, bands=8):
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = 64 // bands
+        self.fingerprints = {}
+        self.exact = {}
+        self.band_index = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def _bands(self, dhash):
+        mask = (1 << self.band_bits) - 1
+        return [(dhash >> (i * self.band_bits)) & mask for i in range(self.bands)]
+
+    def add(self, key, fp):
+        self.remove(key)
+        self.fingerprints[key] = fp
+        self.exact.setdefault(fp.digest, []).append(key)
+        for band, value in zip(self.band_index, self._bands(fp.dhash)):
+            band.setdefault(value, set()).add(key)
+
+    def remove(self, key):
+        fp = self.fingerprints.pop(key, None)
+        if fp is None:
+            return
+        keys = self.exact[fp.digest]
+        keys.remove(key)
+        if not keys:
+            del self.exact[fp.digest]
+        for band, value in zip(self.band_index, self._bands(fp.dhash)):
+            band[value].discard(key)
+            if not band[value]:
+                del band[value]
+
+    def find_exact(self, fp):
+        keys = self.exact.get(fp.digest)
+        return keys[0] if keys else None
+
+    def find_similar(self, fp, exclude=None):
+        """Keys of near-duplicates as (distance, key), closest first."""
+        candidates = set()
+        for band, value in zip(self.band_index, self._bands(fp.dhash)):
+            candidates.update(band.get(value, ()))
+        candidates.discard(exclude)
+
+        matches = []
+        for key in candidates:
+            other = self.fingerprints[key]
+            distance = max(hamming(fp.dhash, other.dhash), hamming(fp.ahash, other.ahash))
+            if distance <= self.max_distance:
+                matches.append((distance, key))
+        matches.sort(key=lambda match: match[0])
+        return matches
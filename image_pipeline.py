@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image, ImageChops, ImageStat
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Modes whose raw pixel buffer can be rebuilt with Image.frombuffer in a worker.
+SHARED_MODES = ('L', 'LA', 'RGB', 'RGBA', 'P')
+
+
+# PNG encoder profiles as Pillow save options. "balanced" passes none, so its
+# output is exactly Pillow's default encoding. "smallest" keeps zlib's
+# default strategy: Z_FILTERED and Pillow's optimize flag both came out
+# larger on screenshots. It encodes large images with the chunked
+# multithreaded deflate below when NumPy is available.
+PNG_PROFILES = {
+    'fast': {'compress_level': 1},
+    'balanced': {},
+    'smallest': {'compress_level': 9, 'parallel': True},
+}
+DEFAULT_PNG_PROFILE = 'balanced'
+PARALLEL_DEFLATE_PIXELS = 4000000
+DEFLATE_CHUNK_SIZE = 1 << 20
+DEFLATE_WINDOW = 1 << 15
+PNG_COLOR_TYPES = {'L': 0, 'RGB': 2, 'P': 3, 'LA': 4, 'RGBA': 6}
+
+
+def encode_png(img, profile=DEFAULT_PNG_PROFILE, threads=None):
+    options = PNG_PROFILES[profile]
+    threads = threads or os.cpu_count() or 1
+    if (options.get('parallel') and np is not None and threads > 1
+            and img.width * img.height >= PARALLEL_DEFLATE_PIXELS and img.mode in PNG_COLOR_TYPES
+            and (img.mode == 'P' or 'transparency' not in img.info)):
+        return encode_png_parallel(img, options['compress_level'], zlib.Z_DEFAULT_STRATEGY, threads)
+
+    stream = io.BytesIO()
+    params = {key: value for key, value in options.items() if key != 'parallel'}
+    if 'dpi' in img.info:
+        params['dpi'] = img.info['dpi']
+    img.save(stream, format='PNG', **params)
+    return stream.getvalue()
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def _filter_band(pixels, previous, bpp):
+    """Filter rows of `pixels` (previous row `previous`) with the adaptive
+    per-row heuristic from the PNG spec: the filter whose output has the
+    smallest sum of absolute signed bytes wins."""
+    x = pixels.astype(np.int16)
+    up = np.vstack([previous[None, :], pixels[:-1]]).astype(np.int16)
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    upleft = np.zeros_like(x)
+    upleft[:, bpp:] = up[:, :-bpp]
+
+    p = left + up - upleft
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - upleft)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upleft))
+
+    candidates = np.stack([x, x - left, x - up, x - (left + up) // 2, x - paeth]).astype(np.uint8)
+    cost = np.abs(candidates.view(np.int8).astype(np.int16)).sum(axis=2)
+    best = cost.argmin(axis=0)
+    rows = candidates[best, np.arange(len(best))]
+    return np.hstack([best.astype(np.uint8)[:, None], rows]).tobytes()
+
+
+def encode_png_parallel(img, level=9, strategy=zlib.Z_DEFAULT_STRATEGY, threads=None):
+    """PNG encoder that filters and deflates row bands on a thread pool.
+
+    Like pigz, each band is compressed as raw deflate primed with the last
+    32 KiB of the previous band as dictionary and ended with a sync flush,
+    so the pieces concatenate into one zlib stream. zlib and NumPy release
+    the GIL, which makes threads enough.
+    """
+    mode = img.mode
+    pixels = np.asarray(img).reshape(img.height, -1)
+    bpp = len(mode) if mode != 'P' else 1
+    band_rows = max(1, DEFLATE_CHUNK_SIZE // max(1, pixels.shape[1]))
+    bands = range(0, img.height, band_rows)
+
+    def filter_band(start):
+        band = pixels[start:start + band_rows]
+        if mode == 'P':
+            return np.hstack([np.zeros((len(band), 1), np.uint8), band]).tobytes()
+        previous = pixels[start - 1] if start else np.zeros(pixels.shape[1], np.uint8)
+        return _filter_band(band, previous, bpp)
+
+    def compress_band(i):
+        if i:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, strategy, zdict=filtered[i - 1][-DEFLATE_WINDOW:])
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, strategy)
+        last = i == len(filtered) - 1
+        return compressor.compress(filtered[i]) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count()) as executor:
+        filtered = list(executor.map(filter_band, bands))
+        compressed = list(executor.map(compress_band, range(len(filtered))))
+
+    checksum = 1
+    for data in filtered:
+        checksum = zlib.adler32(data, checksum)
+    stream = b''.join([b'\x78\xda'] + compressed + [struct.pack('>I', checksum)])
+
+    out = [b'\x89PNG\r\n\x1a\n',
+           _png_chunk(b'IHDR', struct.pack('>IIBBBBB', img.width, img.height, 8, PNG_COLOR_TYPES[mode], 0, 0, 0))]
+    if 'dpi' in img.info:
+        ppm = [int(round(value / 0.0254)) for value in img.info['dpi']]
+        out.append(_png_chunk(b'pHYs', struct.pack('>IIB', ppm[0], ppm[1], 1)))
+    if mode == 'P':
+        palette = img.getpalette()
+        colors = len(palette) // 3
+        out.append(_png_chunk(b'PLTE', bytes(palette[:colors * 3])))
+        transparency = img.info.get('transparency')
+        if isinstance(transparency, int):
+            out.append(_png_chunk(b'tRNS', bytes([255] * transparency + [0])))
+        elif isinstance(transparency, bytes):
+            out.append(_png_chunk(b'tRNS', transparency))
+    for i in range(0, len(stream), DEFLATE_CHUNK_SIZE):
+        out.append(_png_chunk(b'IDAT', stream[i:i + DEFLATE_CHUNK_SIZE]))
+    out.append(_png_chunk(b'IEND', b''))
+    return b''.join(out)
+
+
+THUMBNAIL_SIZE = (256, 256)
+
+
+def make_thumbnail(img, size=THUMBNAIL_SIZE):
+    if img.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    scale = min(size[0] / img.width, size[1] / img.height, 1)
+    thumb_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return encode_png(img.resize(thumb_size, Image.Resampling.LANCZOS, reducing_gap=2.0))
+
+
+# Export resolution: images are resampled to the pixels their printed height
+# needs at the target DPI, never below the floor.
+DEFAULT_EXPORT_DPI = 200
+MIN_EXPORT_DPI = 96
+
+
+def export_size(image_size, height_inches, dpi):
+    """Pixel size for an image printed `height_inches` tall, or None to keep it as is."""
+    dpi = max(MIN_EXPORT_DPI, dpi)
+    width, height = image_size
+    target_height = max(1, round(height_inches * dpi))
+    if height <= target_height:
+        return None
+    return max(1, round(width * target_height / height)), target_height
+
+
+def downscale(img, size, dpi=None):
+    if img.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+    resized = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if dpi:
+        resized.info['dpi'] = (dpi, dpi)
+    return resized
+
+
+# Palette export: 'lossless' converts images with at most 256 colours to an
+# 8-bit palette, 'auto' also quantizes images with up to `max_colors` colours
+# when the result stays within PALETTE_MAX_RMS of the original. Images with
+# more colours, photos for instance, stay truecolour.
+PALETTE_MODES = ('off', 'lossless', 'auto')
+DEFAULT_PALETTE_COLORS = 4096
+PALETTE_MAX_RMS = 2.0
+
+
+def to_palette(img, mode='lossless', max_colors=DEFAULT_PALETTE_COLORS):
+    if mode == 'off' or img.mode in ('P', 'L', '1'):
+        return img
+    if img.mode == 'RGBA':
+        if img.getextrema()[3][0] < 255:
+            return img
+        img = img.convert('RGB')
+    elif img.mode != 'RGB':
+        return img
+
+    colors = img.getcolors(max(256, max_colors) if mode == 'auto' else 256)
+    if colors is None:
+        return img
+
+    if len(colors) <= 256:
+        flat = [value for count, color in colors for value in color]
+        palette_img = Image.new('P', (1, 1))
+        palette_img.putpalette(flat + [0] * (768 - len(flat)))
+        quantized = img.quantize(palette=palette_img, dither=Image.Dither.NONE)
+    elif mode == 'auto':
+        quantized = img.quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        rms = ImageStat.Stat(ImageChops.difference(img, quantized.convert('RGB'))).rms
+        if max(rms) > PALETTE_MAX_RMS:
+            return img
+    else:
+        return img
+
+    if 'dpi' in img.info:
+        quantized.info['dpi'] = img.info['dpi']
+    return quantized
+
+
+# Format selection: 'auto' embeds photo-like images as JPEG. An image counts
+# as photo-like when few neighbouring pixels are identical, its grey levels
+# are spread out and it has few hard edges, such as text, that JPEG would
+# smear.
+FORMAT_MODES = ('png', 'auto')
+DEFAULT_JPEG_QUALITY = 85
+JPEG_MAX_FLAT = 0.5
+JPEG_MIN_ENTROPY = 5.0
+JPEG_MAX_EDGES = 0.08
+EDGE_THRESHOLD = 48
+
+
+def image_features(img, size=256):
+    """(entropy, flat, edges) of a downsampled greyscale view of the image.
+
+    entropy is the Shannon entropy of the grey histogram in bits, flat the
+    fraction of neighbouring pixel pairs that are identical and edges the
+    fraction that differ by more than EDGE_THRESHOLD.
+    """
+    gray = img.convert('L')
+    # NEAREST keeps flat areas exactly flat and edges hard.
+    gray.thumbnail((size, size), Image.Resampling.NEAREST)
+
+    if np is None:
+        entropy = gray.entropy()
+        pairs = [ImageChops.difference(gray.crop((0, 0, gray.width - 1, gray.height)), gray.crop((1, 0, gray.width, gray.height))),
+                 ImageChops.difference(gray.crop((0, 0, gray.width, gray.height - 1)), gray.crop((0, 1, gray.width, gray.height)))]
+        flat = edges = 0.0
+        for diff in pairs:
+            hist = diff.histogram()
+            total = max(1, sum(hist))
+            flat += hist[0] / total / 2
+            edges += sum(hist[EDGE_THRESHOLD + 1:]) / total / 2
+        return entropy, flat, edges
+
+    pixels = np.asarray(gray, dtype=np.int16)
+    hist = np.bincount(pixels.ravel(), minlength=256) / pixels.size
+    hist = hist[hist > 0]
+    entropy = float(-(hist * np.log2(hist)).sum())
+    dx = np.abs(np.diff(pixels, axis=1))
+    dy = np.abs(np.diff(pixels, axis=0))
+    flat = float(((dx == 0).mean() + (dy == 0).mean()) / 2) if dx.size and dy.size else 1.0
+    edges = float(((dx > EDGE_THRESHOLD).mean() + (dy > EDGE_THRESHOLD).mean()) / 2) if dx.size and dy.size else 0.0
+    return entropy, flat, edges
+
+
+def classify_image(img):
+    """'jpeg' for photo-like images without transparency, otherwise 'png'."""
+    if img.mode in ('P', '1', 'LA') or 'transparency' in img.info:
+        return 'png'
+    if img.mode == 'RGBA' and img.getextrema()[3][0] < 255:
+        return 'png'
+    entropy, flat, edges = image_features(img)
+    if flat < JPEG_MAX_FLAT and entropy >= JPEG_MIN_ENTROPY and edges < JPEG_MAX_EDGES:
+        return 'jpeg'
+    return 'png'
+
+
+def encode_jpeg(img, quality=DEFAULT_JPEG_QUALITY):
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    stream = io.BytesIO()
+    img.save(stream, format='JPEG', quality=quality, optimize=True, dpi=img.info.get('dpi', (96, 96)))
+    return stream.getvalue()
+
+
+def encode_export(img, height_inches=None, dpi=None, palette='off', max_colors=DEFAULT_PALETTE_COLORS,
+                  image_format='png', jpeg_quality=DEFAULT_JPEG_QUALITY, png_profile=DEFAULT_PNG_PROFILE):
+    """Bytes of the image as it should be embedded.
+
+    The image is resampled to the export DPI, then encoded as JPEG if
+    `image_format` is 'jpeg' (or 'auto' and the image is photo-like), else
+    as PNG with `png_profile`, palette converted according to `palette`.
+    """
+    if dpi:
+        size = export_size(img.size, height_inches, dpi)
+        if size is not None:
+            img = downscale(img, size, max(MIN_EXPORT_DPI, dpi))
+    if image_format == 'auto':
+        image_format = classify_image(img)
+    if image_format == 'jpeg':
+        return encode_jpeg(img, jpeg_quality)
+    return encode_png(to_palette(img, palette, max_colors), png_profile)
+
+
+def media_info(data):
+    """(format, width, height, indexed) of encoded PNG or JPEG bytes."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        width, height = struct.unpack('>II', data[16:24])
+        return 'png', width, height, data[25] == 3
+    with Image.open(io.BytesIO(data)) as img:
+        return img.format.lower(), img.width, img.height, img.mode == 'P'
+
+
+def _encode_shared(name, mode, size, palette, info, encode=None):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        img = Image.frombuffer(mode, size, shm.buf, 'raw', mode, 0, 1)
+        if palette is not None:
+            img.putpalette(palette)
+        img.info.update(info)
+        data = (encode or encode_png)(img)
+        del img
+        return data
+    finally:
+        shm.close()
+
+
+class PngEncoderPool:
+    """Encodes PIL images to PNG bytes across a process pool.
+
+    Pixel buffers are handed to the workers through shared memory, only the
+    encoded PNG bytes travel back through the pool's pipe. imap() yields the
+    results in input order while keeping at most `window` images in flight.
+    An optional picklable `encode` callable replaces encode_png() in the
+    workers; an item may also be an (image, encode) pair of its own.
+    """
+
+    def __init__(self, workers=None, window=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.window = window or self.workers * 2
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(cancel=exc_type is not None)
+
+    @property
+    def parallel(self):
+        return shared_memory is not None and self.workers > 1
+
+    def shutdown(self, cancel=False):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=cancel)
+            self.executor = None
+
+    def _submit(self, img, encode=None):
+        if img.mode not in SHARED_MODES:
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        data = img.tobytes()
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        shm.buf[:len(data)] = data
+        del data
+
+        palette = img.getpalette() if img.mode == 'P' else None
+        info = {k: v for k, v in img.info.items() if k in ('transparency', 'dpi')}
+        future = self.executor.submit(_encode_shared, shm.name, img.mode, img.size, palette, info, encode)
+        return future, shm
+
+    def imap(self, images, encode=None):
+        if not self.parallel:
+            for img in images:
+                img, item_encode = img if isinstance(img, tuple) else (img, encode)
+                yield (item_encode or encode_png)(img)
+            return
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        pending = deque()
+        try:
+            for img in images:
+                img, item_encode = img if isinstance(img, tuple) else (img, encode)
+                pending.append(self._submit(img, item_encode))
+                if len(pending) >= self.window:
+                    yield self._collect(pending.popleft())
+            while pending:
+                yield self._collect(pending.popleft())
+        finally:
+            while pending:
+                future, shm = pending.popleft()
+                future.cancel()
+                shm.close()
+                shm.unlink()
+
+    def _collect(self, item):
+        future, shm = item
+        try:
+            return future.result()
+        finally:
+            shm.close()
+            shm.unlink()
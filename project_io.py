@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from PIL import Image
+
+SQLITE_HEADER = b'SQLite format 3\x00'
+ARCHIVE_VERSION = 1
+
+# Image files of JSON projects are opened through this many handles at most,
+# however many screenshots the project has.
+MAX_OPEN_FILES = 8
+_open_files = threading.BoundedSemaphore(MAX_OPEN_FILES)
+
+# Image files in the _data directory of JSON projects: content-addressed
+# blobs and the positional files of the oldest format.
+PROJECT_IMAGE_PATTERN = re.compile(r'^([0-9a-f]{64}|screenshot_\d+)\.png$')
+DIGEST_NAME_PATTERN = re.compile(r'^([0-9a-f]{64})\.png$')
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    digest TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    thumbnail BLOB,
+    png BLOB NOT NULL
+);
+"""
+
+
+def atomic_write(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def project_data_dir(file_path):
+    return file_path + "_data"
+
+
+def read_image_header(path):
+    """Size and mode of an image file; PIL reads only the header."""
+    with _open_files, Image.open(path) as img:
+        return img.size, img.mode
+
+
+def read_image_file(path):
+    with _open_files, open(path, 'rb') as f:
+        return f.read()
+
+
+def is_archive(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+class ProjectArchive:
+    """Read side of a single-file .ssp project.
+
+    The archive is an SQLite database holding a JSON manifest and one row per
+    distinct image with its size, mode, a PNG thumbnail and the PNG itself.
+    One connection is shared between threads behind a lock.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+
+    def manifest(self):
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM manifest WHERE id = 1").fetchone()
+        if row is None:
+            raise ValueError("Project file has no manifest")
+        return json.loads(row[0])
+
+    def index(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT digest, width, height, mode, thumbnail FROM images").fetchall()
+        return {row[0]: {'digest': row[0], 'width': row[1], 'height': row[2], 'mode': row[3], 'thumbnail': row[4]}
+                for row in rows}
+
+    def read_png(self, digest):
+        with self.lock:
+            row = self.connection.execute("SELECT png FROM images WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(f"Image {digest} is missing from {self.file_path}")
+        return row[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def save_project(file_path, project_data, records, progress=None):
+    """Write the project into a single-file archive, adding only new images.
+
+    An existing archive is updated in place inside one transaction, so a
+    crash leaves either the old or the new project. Images are keyed by the
+    SHA-256 of their PNG bytes; rows no longer referenced are deleted. A
+    JSON project saved over is rebuilt as an archive next to it and renamed
+    into place, then its _data directory images are removed.
+
+    Returns the number of images written and the ProjectArchive that lazily
+    loaded records were rebound to when a JSON project was converted, or
+    None; the caller closes it once those records are gone.
+    """
+    legacy = os.path.exists(file_path) and not is_archive(file_path)
+    db_path = f"{file_path}.tmp" if legacy else file_path
+    if legacy and os.path.exists(db_path):
+        os.remove(db_path)
+
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.executescript(ARCHIVE_SCHEMA)
+        existing = {row[0] for row in connection.execute("SELECT digest FROM images")}
+
+        digests = []
+        written = 0
+        with connection:
+            for i, record in enumerate(records):
+                resident = record.is_resident()
+                digest = record.encoded_digest()
+                if digest not in existing:
+                    width, height = record.size
+                    connection.execute(
+                        "INSERT INTO images (digest, width, height, mode, thumbnail, png) VALUES (?, ?, ?, ?, ?, ?)",
+                        (digest, width, height, record.mode, record.thumbnail_bytes(), record.encoded()))
+                    existing.add(digest)
+                    written += 1
+                if not resident:
+                    record.release()
+                digests.append(digest)
+                if progress:
+                    progress(i + 1, len(records))
+
+            project_data = dict(project_data)
+            project_data['images'] = digests
+            project_data['screenshot_count'] = len(digests)
+            connection.execute("INSERT OR REPLACE INTO manifest (id, version, data) VALUES (1, ?, ?)",
+                               (ARCHIVE_VERSION, json.dumps(project_data)))
+
+            unused = existing - set(digests)
+            connection.executemany("DELETE FROM images WHERE digest = ?", [(digest,) for digest in unused])
+
+        if unused:
+            # executescript steps the pragma to completion, execute() would
+            # free only the first page.
+            connection.executescript("PRAGMA incremental_vacuum;")
+    finally:
+        connection.close()
+
+    archive = None
+    if legacy:
+        os.replace(db_path, file_path)
+        # Screenshots loaded lazily from the _data directory read from the
+        # archive from now on, before their files are removed.
+        archive = ProjectArchive(file_path)
+        for record, digest in zip(records, digests):
+            record.rebind_source(functools.partial(archive.read_png, digest))
+        remove_legacy_data(file_path)
+
+    return written, archive
+
+
+def remove_legacy_data(file_path):
+    data_dir = project_data_dir(file_path)
+    if not os.path.isdir(data_dir):
+        return
+    for name in os.listdir(data_dir):
+        if PROJECT_IMAGE_PATTERN.match(name):
+            try:
+                os.remove(os.path.join(data_dir, name))
+            except OSError:
+                pass
+    try:
+        os.rmdir(data_dir)
+    except OSError:
+        pass
+
+
+def export_formats(project_data):
+    formats = list(project_data.get('export_formats', []))
+    count = max(len(project_data.get('images', [])), project_data.get('screenshot_count', 0))
+    return formats + [None] * (count - len(formats))
+
+
+def load_project(file_path):
+    """Return (project_data, entries, archive) for a .ssp project.
+
+    Each entry carries the digest (or None), width, height, mode, thumbnail
+    bytes (or None) and the pinned export format (or None) of one
+    screenshot, nothing is decoded. For
+    archives the PNGs are read later through the returned ProjectArchive.
+    JSON projects return no archive and entries with the image 'path' in
+    their _data directory, to be read with read_image_file().
+    """
+    if is_archive(file_path):
+        archive = ProjectArchive(file_path)
+        project_data = archive.manifest()
+        index = archive.index()
+        entries = []
+        for digest, export_format in zip(project_data.get('images', []), export_formats(project_data)):
+            if digest in index:
+                entries.append(dict(index[digest], export_format=export_format))
+        return project_data, entries, archive
+
+    with open(file_path, 'r') as f:
+        project_data = json.load(f)
+
+    data_dir = project_data_dir(file_path)
+    if 'images' in project_data:
+        names = [image['file'] for image in project_data['images']]
+    else:
+        names = [f"screenshot_{i}.png" for i in range(project_data.get('screenshot_count', 0))]
+
+    entries = []
+    for name, export_format in zip(names, export_formats(project_data)):
+        path = os.path.join(data_dir, name)
+        if not os.path.exists(path):
+            continue
+        (width, height), mode = read_image_header(path)
+        match = DIGEST_NAME_PATTERN.match(name)
+        entries.append({'path': path, 'digest': match.group(1) if match else None,
+                        'width': width, 'height': height, 'mode': mode, 'thumbnail': None,
+                        'export_format': export_format})
+    return project_data, entries, None
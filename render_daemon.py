@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+
+import argparse
+import hmac
+import itertools
+import json
+import os
+import queue
+import secrets
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from report_builder import (build_report, load_input, settings_options, argument_options, add_option_arguments,
+                            GenerationCancelled)
+from screenshot_store import ScreenshotStore
+
+RUNTIME_DIR_NAME = 'screenshot-docx'
+SOCKET_NAME = 'render.sock'
+TOKEN_NAME = 'render-{port}.token'
+DEFAULT_PORT = 48765
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_CACHE_MB = 512
+DEFAULT_JOB_MEMORY_MB = 512
+MAX_FINISHED_JOBS = 200
+
+# Jobs read and write files with the daemon's permissions, so only the
+# user running it may submit them.
+RUNTIME_DIR_MODE = 0o700
+SOCKET_MODE = 0o600
+
+
+def runtime_dir():
+    """Private per-user directory for the daemon socket, its token and the app's handoff project.
+
+    $XDG_RUNTIME_DIR/screenshot-docx where that is set, otherwise
+    screenshot-docx-<uid> in the temp directory. A directory that is not
+    ours or that others can enter is refused rather than used.
+    """
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base and os.path.isdir(base):
+        path = os.path.join(base, RUNTIME_DIR_NAME)
+    else:
+        # The temp directory is already per-user on Windows.
+        suffix = f"-{os.getuid()}" if hasattr(os, 'getuid') else ''
+        path = os.path.join(tempfile.gettempdir(), RUNTIME_DIR_NAME + suffix)
+    try:
+        os.mkdir(path, RUNTIME_DIR_MODE)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    if hasattr(os, 'getuid'):
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"{path} belongs to another user")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            raise PermissionError(f"{path} is accessible to other users")
+    return path
+
+
+def default_address():
+    """Unix socket in the runtime directory, or a localhost port where Unix sockets are missing."""
+    if hasattr(socket, 'AF_UNIX'):
+        return os.path.join(runtime_dir(), SOCKET_NAME)
+    return ('127.0.0.1', DEFAULT_PORT)
+
+
+def token_path(port):
+    return os.path.join(runtime_dir(), TOKEN_NAME.format(port=port))
+
+
+def peer_uid(connection):
+    """User id of the process at the other end of a Unix socket, or None where SO_PEERCRED is missing."""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', credentials)[1]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class MediaCache:
+    """Prepared export images shared between jobs, least recently used dropped beyond `max_bytes`."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+            self.entries[key] = data
+            self.nbytes += len(data)
+            while self.nbytes > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.nbytes -= len(dropped)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.nbytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class RenderJob:
+    def __init__(self, job_id, input_path, options, defaults=None, image_dir=None):
+        self.id = job_id
+        self.input = input_path
+        self.options = options
+        self.defaults = defaults or {}
+        self.image_dir = image_dir
+        self.status = 'queued'
+        self.progress = 0
+        self.text = "Queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.output = None
+        self.report = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise GenerationCancelled()
+
+    def to_dict(self):
+        return {'id': self.id, 'input': self.input, 'status': self.status, 'progress': self.progress,
+                'text': self.text, 'submitted': self.submitted, 'started': self.started,
+                'finished': self.finished, 'output': self.output, 'report': self.report, 'error': self.error}
+
+
+class RenderService:
+    """Queue of report builds run by a fixed number of worker threads.
+
+    At most `max_queue` jobs wait; further submissions are refused, so the
+    load a shared machine takes is bounded by `workers` builds using
+    `encode_workers` encoder processes each. Prepared images are kept in a
+    MediaCache across jobs, so exporting a project again with the same
+    settings, or another project with the same screenshots, skips the
+    encoding.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_MAX_QUEUE, cache_mb=DEFAULT_CACHE_MB,
+                 encode_workers=None, job_memory_mb=DEFAULT_JOB_MEMORY_MB, base_options=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.encode_workers = encode_workers or max(1, (os.cpu_count() or 1) // workers)
+        self.job_memory_mb = job_memory_mb
+        self.base_options = dict(base_options or {})
+        self.cache = MediaCache(cache_mb * 1048576)
+        self.queue = queue.Queue(max_queue)
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.job_ids = itertools.count(1)
+        self.started = time.time()
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, input_path, options=None, defaults=None, image_dir=None):
+        """Queue a build; `defaults` rank below the input's own options, `options` above them."""
+        with self.lock:
+            job = RenderJob(next(self.job_ids), input_path, dict(options or {}), dict(defaults or {}), image_dir)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"Render queue is full ({self.max_queue} jobs waiting)")
+            self.jobs[job.id] = job
+            self._prune()
+        return job
+
+    def job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job {job_id}")
+        return job
+
+    def status(self, job_id):
+        job = self.job(job_id)
+        status = job.to_dict()
+        if job.status == 'queued':
+            with self.lock:
+                status['position'] = sum(1 for other in self.jobs.values()
+                                         if other.status == 'queued' and other.id < job.id) + 1
+        return status
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        job.cancel_event.set()
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished = time.time()
+        return job.to_dict()
+
+    def stats(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        counts = {status: sum(1 for job in jobs if job.status == status)
+                  for status in ('queued', 'running', 'done', 'failed', 'cancelled')}
+        return dict(counts, workers=self.workers, encode_workers=self.encode_workers, max_queue=self.max_queue,
+                    uptime=time.time() - self.started, cache=self.cache.stats(),
+                    jobs=[{'id': job.id, 'input': job.input, 'status': job.status, 'progress': job.progress}
+                          for job in jobs if job.status in ('queued', 'running')])
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ('done', 'failed', 'cancelled')]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job.status != 'cancelled':
+                self._run(job)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started = time.time()
+        store = ScreenshotStore(self.job_memory_mb)
+        archive = None
+        try:
+            input_options, section_names, notes, archive = load_input(job.input, store, job.image_dir)
+            if not len(store):
+                raise ValueError("No screenshots to add")
+            options = dict(self.base_options, **job.defaults)
+            options.update(input_options)
+            options.update(job.options)
+            options['encode_workers'] = self.encode_workers
+
+            def progress(percent, text):
+                job.progress = percent
+                job.text = text
+
+            job.output, report = build_report(store, section_names, notes, options, progress,
+                                              job.check_cancelled, self.cache)
+            job.report = report
+            job.status = 'done'
+        except GenerationCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            if archive is not None:
+                archive.close()
+            store.close()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line, answered by one JSON line with 'ok' and the result or 'error'.
+
+    Unix socket clients must run as the daemon's user (SO_PEERCRED); TCP
+    clients must send the token the daemon wrote to its runtime directory.
+    """
+
+    def handle(self):
+        service = self.server.service
+        token = getattr(self.server, 'token', None)
+        if token is None:
+            uid = peer_uid(self.connection)
+            if uid is not None and uid != os.getuid():
+                self.reply({'ok': False, 'error': "Permission denied", 'busy': False})
+                return
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if token is not None and not hmac.compare_digest(str(request.get('token', '')), token):
+                    self.reply({'ok': False, 'error': "Permission denied", 'busy': False})
+                    return
+                command = request.get('command')
+                if command == 'ping':
+                    result = {'pid': os.getpid()}
+                elif command == 'submit':
+                    result = service.submit(request['input'], request.get('options'), request.get('defaults'),
+                                            request.get('image_dir')).to_dict()
+                elif command == 'status':
+                    result = service.status(request['job'])
+                elif command == 'cancel':
+                    result = service.cancel(request['job'])
+                elif command == 'stats':
+                    result = service.stats()
+                else:
+                    raise ValueError(f"Unknown command {command!r}")
+                response = {'ok': True, 'result': result}
+            except Exception as e:
+                response = {'ok': False, 'error': str(e), 'busy': isinstance(e, QueueFull)}
+            self.reply(response)
+
+    def reply(self, response):
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+        self.wfile.flush()
+
+
+class RenderClient:
+    """Talks to a running render daemon; OSError means none is listening at `address`."""
+
+    def __init__(self, address=None, timeout=5.0):
+        self.address = address or default_address()
+        if isinstance(self.address, list):
+            self.address = tuple(self.address)
+        self.timeout = timeout
+
+    def request(self, command, **fields):
+        family = socket.AF_INET if isinstance(self.address, tuple) else socket.AF_UNIX
+        if family == socket.AF_INET:
+            with open(token_path(self.address[1]), 'r') as f:
+                fields['token'] = f.read().strip()
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            sock.sendall(json.dumps(dict(fields, command=command)).encode() + b'\n')
+            with sock.makefile('rb') as f:
+                line = f.readline()
+        if not line:
+            raise ConnectionError("Render daemon closed the connection")
+        response = json.loads(line)
+        if not response['ok']:
+            raise (QueueFull if response.get('busy') else RuntimeError)(response['error'])
+        return response['result']
+
+    def available(self):
+        try:
+            self.request('ping')
+            return True
+        except (OSError, ValueError, RuntimeError):
+            return False
+
+    def submit(self, input_path, options=None, defaults=None, image_dir=None):
+        # The daemon resolves paths from its own working directory.
+        options = dict(options or {})
+        for name in ('output_path', 'output_dir'):
+            if options.get(name):
+                options[name] = os.path.abspath(options[name])
+        return self.request('submit', input=os.path.abspath(input_path), options=options, defaults=defaults,
+                            image_dir=os.path.abspath(image_dir) if image_dir else None)
+
+    def status(self, job_id):
+        return self.request('status', job=job_id)
+
+    def cancel(self, job_id):
+        return self.request('cancel', job=job_id)
+
+    def stats(self):
+        return self.request('stats')
+
+
+def parse_address(args):
+    if args.port:
+        return ('127.0.0.1', args.port)
+    return args.socket or default_address()
+
+
+def serve(args):
+    address = parse_address(args)
+    service = RenderService(args.workers, args.max_queue, args.cache_mb, args.encode_workers,
+                            args.job_memory_mb, settings_options(args.settings))
+
+    token_file = None
+    if isinstance(address, tuple):
+        server = socketserver.ThreadingTCPServer(address, RequestHandler)
+        server.token = secrets.token_hex(32)
+        token_file = token_path(server.server_address[1])
+        fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, SOCKET_MODE)
+        with os.fdopen(fd, 'w') as f:
+            f.write(server.token)
+    else:
+        if os.path.exists(address):
+            if RenderClient(address, timeout=1.0).available():
+                print(f"Error: a render daemon is already listening on {address}", file=sys.stderr)
+                return 1
+            os.remove(address)
+        # Created with its final mode; there is no window before a chmod.
+        previous_umask = os.umask(0o777 & ~SOCKET_MODE)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(address, RequestHandler)
+        finally:
+            os.umask(previous_umask)
+    server.daemon_threads = True
+    server.service = service
+
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Render daemon listening on {address} with {service.workers} worker(s), "
+          f"{service.encode_workers} encoder process(es) each, queue of {service.max_queue}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if not isinstance(address, tuple) and os.path.exists(address):
+            os.remove(address)
+        if token_file is not None and os.path.exists(token_file):
+            os.remove(token_file)
+    return 0
+
+
+def submit(args):
+    client = RenderClient(parse_address(args))
+    options = argument_options(args)
+    if args.output:
+        options['output_dir' if os.path.isdir(args.output) else 'output_path'] = args.output
+    job = client.submit(args.input, options, settings_options(args.settings), args.images)
+    print(f"Job {job['id']} queued")
+    if not args.wait:
+        return 0
+
+    while job['status'] in ('queued', 'running'):
+        time.sleep(0.5)
+        job = client.status(job['id'])
+        if not args.quiet:
+            where = f"position {job['position']} in queue" if job['status'] == 'queued' else job['text']
+            print(f"[{job['progress']:3.0f}%] {where}", file=sys.stderr)
+    if job['status'] != 'done':
+        print(f"Job {job['id']} {job['status']}: {job['error'] or ''}", file=sys.stderr)
+        return 1
+    print(f"Document saved as {job['output']} ({len(job['report']['images'])} screenshot(s), "
+          f"{job['report']['total'] / 1048576:.1f} MB)")
+    return 0
+
+
+def show(result):
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local report rendering daemon and its client")
+    parser.add_argument('--socket', help=f"Unix socket path (default: {SOCKET_NAME} in a private per-user directory)")
+    parser.add_argument('--port', type=int, help="listen on this localhost TCP port instead of a Unix socket")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="run the daemon")
+    serve_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="reports built at the same time")
+    serve_parser.add_argument('--encode-workers', type=int, help="encoder processes per report")
+    serve_parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE, help="jobs allowed to wait")
+    serve_parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB, help="prepared image cache size")
+    serve_parser.add_argument('--job-memory-mb', type=int, default=DEFAULT_JOB_MEMORY_MB,
+                              help="decoded screenshot memory per job")
+    serve_parser.add_argument('--settings', default='screenshot_app_settings.json',
+                              help="app settings file to take defaults from")
+    serve_parser.set_defaults(func=serve)
+
+    submit_parser = subparsers.add_parser('submit', help="queue a manifest, .ssp project or image directory")
+    submit_parser.add_argument('input')
+    submit_parser.add_argument('-o', '--output', help="output .docx file or directory")
+    submit_parser.add_argument('--images', help="directory that relative manifest image paths are resolved against")
+    submit_parser.add_argument('--wait', action='store_true', help="wait for the document and show progress")
+    submit_parser.add_argument('-q', '--quiet', action='store_true')
+    add_option_arguments(submit_parser)
+    submit_parser.set_defaults(func=submit)
+
+    status_parser = subparsers.add_parser('status', help="show a job")
+    status_parser.add_argument('job', type=int)
+    status_parser.set_defaults(func=lambda args: show(RenderClient(parse_address(args)).status(args.job)))
+
+    cancel_parser = subparsers.add_parser('cancel', help="cancel a queued or running job")
+    cancel_parser.add_argument('job', type=int)
+    cancel_parser.set_defaults(func=lambda args: show(RenderClient(parse_address(args)).cancel(args.job)))
+
+    stats_parser = subparsers.add_parser('stats', help="show queue depth, running jobs and cache use")
+    stats_parser.set_defaults(func=lambda args: show(RenderClient(parse_address(args)).stats()))
+
+    args = parser.parse_args()
+    try:
+        return args.func(args)
+    except OSError as e:
+        print(f"Error: cannot reach the render daemon: {e}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+
+import argparse
+import functools
+import json
+import os
+import sys
+import zipfile
+from datetime import datetime
+
+from PIL import Image
+
+from docx.shared import Inches, Pt
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml.ns import qn
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+import project_io
+from docx_stream import StreamingDocxWriter
+from image_pipeline import (PngEncoderPool, encode_png, export_size, encode_export, media_info,
+                            MIN_EXPORT_DPI, PALETTE_MODES, DEFAULT_PALETTE_COLORS, FORMAT_MODES,
+                            DEFAULT_JPEG_QUALITY, PNG_PROFILES, DEFAULT_PNG_PROFILE)
+from screenshot_store import ScreenshotStore
+from size_budget import BUDGET_LEVELS, level_settings, estimate_sizes, fit_budget, describe_level
+
+SETTINGS_FILE = 'screenshot_app_settings.json'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+DEFAULT_OPTIONS = {
+    'first_name': 'Your Name',
+    'last_name': 'Last Name',
+    'course_code': 'COURSE001',
+    'module': '',
+    'doc_title': 'Interactive Sections',
+    'margin': 0.25,
+    'image_height': 6.5,
+    'output_dir': '.',
+    'encode_workers': None,
+    'export_dpi': 0,
+    'palette_mode': 'off',
+    'palette_max_colors': DEFAULT_PALETTE_COLORS,
+    'image_format': 'png',
+    'jpeg_quality': DEFAULT_JPEG_QUALITY,
+    'store_media': True,
+    'png_profile': DEFAULT_PNG_PROFILE,
+    'max_output_mb': 0
+}
+
+# App settings that carry over to headless builds, by option name.
+SETTINGS_OPTIONS = {
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'course_code': 'course_code',
+    'encode_workers': 'encode_workers',
+    'export_dpi': 'export_dpi',
+    'palette_mode': 'palette_mode',
+    'palette_max_colors': 'palette_max_colors',
+    'image_format': 'image_format',
+    'jpeg_quality': 'jpeg_quality',
+    'store_media': 'store_media',
+    'export_png_profile': 'png_profile',
+    'max_output_mb': 'max_output_mb'
+}
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+def document_filename(options):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return (f"{options['first_name'].replace(' ', '.')}.{options['last_name'].replace(' ', '.')}"
+            f".Module{options['module']}_{timestamp}.docx")
+
+
+def build_report(records, section_names, notes, options, progress=None, check_cancelled=None, media_cache=None):
+    """Write the DOCX for `records` and return (path, report).
+
+    `options` are the DEFAULT_OPTIONS keys; the file goes to
+    options['output_path'] if given, else to a generated name in
+    options['output_dir']. `progress(percent, text)` is called as the build
+    goes on and `check_cancelled()` between screenshots, which may raise
+    GenerationCancelled to stop it. The report holds the export DPI, one
+    entry per screenshot, the size budget with its estimate, and the total
+    file size. A `media_cache` with get(key) and put(key, data) shares
+    prepared images between builds, keyed by the SHA-256 of the screenshot
+    PNG and the settings.
+    """
+    opts = dict(DEFAULT_OPTIONS, **options)
+    progress = progress or (lambda percent, text: None)
+    check_cancelled = check_cancelled or (lambda: None)
+    records = list(records)
+    notes = list(notes)
+
+    full_path = opts.get('output_path') or os.path.join(opts['output_dir'], document_filename(opts))
+
+    # The document is streamed to disk as it is built, only the current
+    # screenshot is held in memory.
+    media_compression = zipfile.ZIP_STORED if opts.get('store_media', True) else zipfile.ZIP_DEFLATED
+    writer = StreamingDocxWriter(full_path, media_compression)
+    doc = writer.document
+    section = doc.sections[0]
+
+    margin = opts['margin']
+    section.left_margin = Inches(margin)
+    section.right_margin = Inches(margin)
+    section.top_margin = Inches(0.5)
+    section.bottom_margin = Inches(0.5)
+
+    header = section.header
+    header_para = header.paragraphs[0]
+    header_para.text = f"{opts['first_name']} {opts['last_name']}   {opts['course_code']}   Module {opts['module']} {opts['doc_title']}"
+    header_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+    sectPr = section._sectPr
+    cols = sectPr.xpath('./w:cols')
+    if cols:
+        cols[0].set('num', '1')
+
+    total_screenshots = len(records)
+    image_height = opts['image_height']
+
+    # Each screenshot is embedded either as its cached PNG or prepared
+    # for export: resampled to the pixel size its printed height needs at
+    # the export DPI, then encoded as JPEG if it is photo-like or as a
+    # PNG, palette converted if possible. Prepared images are cached on
+    # the record under the export settings, and the format picked for a
+    # screenshot is kept on its record so later exports repeat it. Only
+    # images without cached bytes go through the encoder pool, which
+    # also does the preparation; the rest are read back one at a time.
+    dpi = opts.get('export_dpi')
+    if dpi:
+        dpi = max(MIN_EXPORT_DPI, dpi)
+    image_format = opts.get('image_format') or 'png'
+    base_settings = {
+        'height_inches': image_height,
+        'dpi': dpi,
+        'palette': opts.get('palette_mode') or 'off',
+        'max_colors': opts.get('palette_max_colors') or DEFAULT_PALETTE_COLORS,
+        'image_format': image_format,
+        'jpeg_quality': opts.get('jpeg_quality') or DEFAULT_JPEG_QUALITY,
+        'png_profile': opts.get('png_profile') or DEFAULT_PNG_PROFILE
+    }
+    record_settings = []
+    for record in records:
+        settings = dict(base_settings)
+        if image_format == 'auto' and record.export_format:
+            settings['image_format'] = record.export_format
+        record_settings.append(settings)
+
+    budget = opts.get('max_output_mb')
+    estimated_total = None
+    export_report = []
+    with writer, PngEncoderPool(opts.get('encode_workers')) as pool:
+        if budget:
+            progress(0, "Estimating image sizes...")
+            record_settings, estimated_total = fit_record_settings(pool, records, record_settings,
+                                                                   budget * 1048576, check_cancelled)
+
+        plan = []
+        for record, settings in zip(records, record_settings):
+            # Cached PNGs are reused when the export wants the plain image
+            # encoded with the profile the store caches them with.
+            key = None
+            encode = functools.partial(encode_png, profile=record.store.png_profile)
+            if (settings['palette'] != 'off' or settings['image_format'] != 'png'
+                    or settings['png_profile'] != record.store.png_profile
+                    or (settings['dpi'] and export_size(record.size, image_height, settings['dpi']) is not None)):
+                key = tuple(sorted(settings.items()))
+                encode = functools.partial(encode_export, **settings)
+            cached = record.has_png() if key is None else record.variant_png(key) is not None
+            # The media cache is keyed by the content of the screenshot, so
+            # it also matches images read from files that have no digest yet
+            # (image directories, manifests, JSON projects).
+            digest = None
+            if key is not None and not cached and media_cache is not None:
+                digest = record.encoded_digest()
+                image_data = media_cache.get((digest, key))
+                if image_data is not None:
+                    record.store_variant(key, image_data)
+                    cached = True
+            plan.append((record, key, encode, cached, record.is_resident(), digest))
+
+        def pending_images():
+            for record, key, encode, cached, resident, digest in plan:
+                if not cached:
+                    yield record.image, encode
+
+        encoded = pool.imap(pending_images())
+        for i, (record, key, encode, cached, resident, digest) in enumerate(plan):
+            if key is None:
+                if cached:
+                    image_data = record.encoded()
+                else:
+                    image_data = next(encoded)
+                    record.store_png(image_data)
+                original_bytes = len(image_data)
+            else:
+                image_data = record.variant_png(key) if cached else next(encoded)
+                if image_data is None:
+                    image_data = encode(record.image)
+                record.store_variant(key, image_data)
+                if not cached and digest is not None:
+                    media_cache.put((digest, key), image_data)
+                original_bytes = len(record.cached_png()) if record.has_png() else None
+            if not resident:
+                record.release()
+
+            data_format, width, height, indexed = media_info(image_data)
+            if record_settings[i]['image_format'] == 'auto':
+                record.export_format = data_format
+            export_report.append({
+                'name': section_names[i],
+                'original_size': record.size,
+                'size': (width, height),
+                'format': data_format,
+                'palette': indexed,
+                'settings': describe_level(record_settings[i]),
+                'original_bytes': original_bytes,
+                'bytes': len(image_data)
+            })
+
+            check_cancelled()
+            progress((i / total_screenshots) * 90, f"Adding screenshot {i + 1} of {total_screenshots}...")
+
+            p = writer.add_paragraph(section_names[i])
+            p.paragraph_format.space_after = Pt(6)
+            p.paragraph_format.space_before = Pt(6)
+            p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
+
+            pic = writer.add_picture(image_data, height=Inches(image_height))
+
+            pic_paragraph = pic._inline.xpath('ancestor::w:p')[0]
+            pic_paragraph.set(qn('w:jc'), 'center')
+
+            if i < len(notes) and notes[i].strip():
+                notes_paragraph = writer.add_paragraph()
+                notes_run = notes_paragraph.add_run(notes[i])
+                notes_run.font.size = Pt(10)
+                notes_run.font.italic = True
+                notes_paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+                notes_paragraph.paragraph_format.space_after = Pt(12)
+                notes_paragraph.paragraph_format.space_before = Pt(6)
+                notes_paragraph.paragraph_format.left_indent = Inches(0.25)
+
+            if i < total_screenshots - 1:
+                writer.add_page_break()
+
+        check_cancelled()
+        progress(95, "Saving document...")
+
+    progress(100, "Document saved")
+    return full_path, {'dpi': dpi, 'images': export_report, 'budget': budget,
+                       'estimated': estimated_total, 'total': os.path.getsize(full_path)}
+
+
+def fit_record_settings(pool, records, record_settings, budget, check_cancelled):
+    """Settings per screenshot that keep the DOCX under `budget` bytes, and the estimated size.
+
+    Every screenshot's encoded size is estimated for each of the
+    BUDGET_LEVELS from a sample, then size_budget.fit_budget() picks the
+    least lossy level per screenshot that fits the total.
+    """
+    levels = [[level_settings(settings, level) for level in BUDGET_LEVELS] for settings in record_settings]
+    residents = [record.is_resident() for record in records]
+
+    def samples():
+        for record, record_levels in zip(records, levels):
+            estimate = functools.partial(estimate_sizes, levels=record_levels,
+                                         height_inches=record_levels[0]['height_inches'])
+            yield record.image, estimate
+
+    estimates = []
+    for i, sizes in enumerate(pool.imap(samples())):
+        estimates.append(sizes)
+        if not residents[i]:
+            records[i].release()
+        check_cancelled()
+
+    chosen, estimated_total = fit_budget(estimates, budget)
+    return [record_levels[level] for record_levels, level in zip(levels, chosen)], estimated_total
+
+
+def options_from_settings(settings):
+    """Build options from the app's settings dict (screenshot_app_settings.json)."""
+    return {option: settings[name] for name, option in SETTINGS_OPTIONS.items() if name in settings}
+
+
+def add_image_file(store, path):
+    """Add an image file to `store`; PNGs are read lazily and embedded as they are."""
+    (width, height), mode = project_io.read_image_header(path)
+    if path.lower().endswith('.png'):
+        return store.add_lazy((width, height), mode, functools.partial(project_io.read_image_file, path))
+    with Image.open(path) as img:
+        img.load()
+        return store.add(img)
+
+
+def image_files(image_dir):
+    return sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def read_manifest(path):
+    with open(path, 'r') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise RuntimeError("YAML manifests need PyYAML: pip install pyyaml")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+    if not isinstance(manifest, dict):
+        raise ValueError(f"{path} is not a manifest object")
+    return manifest
+
+
+def load_manifest(path, store, image_dir=None):
+    """Return (options, section_names, notes) and add the manifest's images to `store`.
+
+    The manifest holds DEFAULT_OPTIONS keys and a 'screenshots' list whose
+    items are an image path or an object with 'image', 'section' and
+    'notes'. Relative image paths are resolved against `image_dir`, or the
+    manifest's directory. Without a 'screenshots' list every image in that
+    directory is used, in name order.
+    """
+    manifest = read_manifest(path)
+    image_dir = image_dir or os.path.dirname(os.path.abspath(path))
+    screenshots = manifest.get('screenshots')
+    if screenshots is None:
+        screenshots = image_files(image_dir)
+
+    section_names = []
+    notes = []
+    for item in screenshots:
+        if isinstance(item, str):
+            item = {'image': item}
+        image_path = os.path.join(image_dir, item['image'])
+        add_image_file(store, image_path)
+        section_names.append(item.get('section') or os.path.splitext(os.path.basename(image_path))[0])
+        notes.append(item.get('notes') or "")
+
+    options = {name: value for name, value in manifest.items() if name in DEFAULT_OPTIONS or name == 'output_path'}
+    return options, section_names, notes
+
+
+def load_project(path, store):
+    """Return (options, section_names, notes, archive) and add the project's screenshots to `store`."""
+    project_data, entries, archive = project_io.load_project(path)
+    for entry in entries:
+        if archive is not None:
+            source = functools.partial(archive.read_png, entry['digest'])
+        else:
+            source = functools.partial(project_io.read_image_file, entry['path'])
+        record = store.add_lazy((entry['width'], entry['height']), entry['mode'],
+                                source, entry['digest'], entry['thumbnail'])
+        record.export_format = entry['export_format']
+
+    section_names = list(project_data.get('section_names', []))
+    notes = list(project_data.get('notes', []))
+    section_names += [f"Section {i + 1}" for i in range(len(section_names), len(store))]
+    notes += [""] * (len(store) - len(notes))
+
+    options = {'module': project_data.get('module', ''),
+               'doc_title': project_data.get('doc_title') or DEFAULT_OPTIONS['doc_title']}
+    return options, section_names, notes, archive
+
+
+def load_directory(image_dir, store):
+    section_names = []
+    for path in image_files(image_dir):
+        add_image_file(store, path)
+        section_names.append(os.path.splitext(os.path.basename(path))[0])
+    return {}, section_names, [""] * len(section_names)
+
+
+def load_input(path, store, image_dir=None):
+    """Return (options, section_names, notes, archive) for a manifest, .ssp project or image directory."""
+    if os.path.isdir(path):
+        return load_directory(path, store) + (None,)
+    if path.lower().endswith('.ssp') or project_io.is_archive(path):
+        return load_project(path, store)
+    return load_manifest(path, store, image_dir) + (None,)
+
+
+def settings_options(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return options_from_settings(json.load(f))
+
+
+def add_option_arguments(parser):
+    parser.add_argument('--settings', default=SETTINGS_FILE, help="app settings file to take defaults from")
+    parser.add_argument('--first-name', dest='first_name')
+    parser.add_argument('--last-name', dest='last_name')
+    parser.add_argument('--course-code', dest='course_code')
+    parser.add_argument('--module')
+    parser.add_argument('--title', dest='doc_title')
+    parser.add_argument('--margin', type=float, help="page margin in inches")
+    parser.add_argument('--image-height', dest='image_height', type=float, help="printed image height in inches")
+    parser.add_argument('--dpi', dest='export_dpi', type=int, help="downscale images to this DPI (0: off)")
+    parser.add_argument('--palette', dest='palette_mode', choices=PALETTE_MODES)
+    parser.add_argument('--format', dest='image_format', choices=FORMAT_MODES)
+    parser.add_argument('--jpeg-quality', dest='jpeg_quality', type=int)
+    parser.add_argument('--png-profile', dest='png_profile', choices=list(PNG_PROFILES))
+    parser.add_argument('--max-size', dest='max_output_mb', type=float, help="keep the document under this many MB")
+    parser.add_argument('--workers', dest='encode_workers', type=int, help="encoder processes")
+
+
+def argument_options(args):
+    """Options given on the command line; they override the settings file and the input."""
+    return {name: value for name, value in vars(args).items() if name in DEFAULT_OPTIONS and value is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a screenshot DOCX report without the GUI")
+    parser.add_argument('input', help="JSON/YAML manifest, .ssp project or directory of images")
+    parser.add_argument('-o', '--output', help="output .docx file or directory (default: current directory)")
+    parser.add_argument('--images', help="directory that relative manifest image paths are resolved against")
+    add_option_arguments(parser)
+    parser.add_argument('-q', '--quiet', action='store_true')
+    args = parser.parse_args()
+
+    store = ScreenshotStore()
+    archive = None
+    try:
+        options = settings_options(args.settings)
+        input_options, section_names, notes, archive = load_input(args.input, store, args.images)
+        options.update(input_options)
+        options.update(argument_options(args))
+
+        if not len(store):
+            print("Error: no screenshots to add", file=sys.stderr)
+            return 1
+        if args.output:
+            if os.path.isdir(args.output):
+                options['output_dir'] = args.output
+                options.pop('output_path', None)
+            else:
+                options['output_path'] = args.output
+
+        def progress(percent, text):
+            if not args.quiet:
+                print(f"[{percent:3.0f}%] {text}", file=sys.stderr)
+
+        path, report = build_report(store, section_names, notes, options, progress)
+        print(f"Document saved as {path} ({len(report['images'])} screenshot(s), {report['total'] / 1048576:.1f} MB)")
+        return 0
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if archive is not None:
+            archive.close()
+        store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+import hashlib
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from duplicates import DuplicateIndex
+from image_pipeline import encode_png, make_thumbnail, DEFAULT_PNG_PROFILE
+
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+_record_ids = itertools.count(1)
+
+
+def image_nbytes(img):
+    return img.width * img.height * len(img.getbands())
+
+
+class ScreenshotRecord:
+    """One captured or imported image plus its cached PNG encoding.
+
+    The PNG bytes and their SHA-256 digest are kept so exports and project
+    saves can reuse them.
+    When the store spills a record, both the decoded image and the in-memory
+    PNG bytes are dropped and the PNG is read back from the spill file.
+    Records loaded from a project start without an image and read
+    their PNG through `source` the first time it is needed.
+    """
+
+    def __init__(self, store, image=None, png=None, size=None, mode=None,
+                 source=None, digest=None, thumbnail_png=None):
+        self.id = next(_record_ids)
+        self.store = store
+        self.lock = threading.Lock()
+        self._image = image
+        self.size = image.size if image is not None else tuple(size)
+        self.mode = image.mode if image is not None else mode
+        self.png = None
+        self.digest = digest
+        self.spill_path = None
+        self.source = source
+        self.thumbnail_png = thumbnail_png
+        self._thumbnail = None
+        self.fingerprint = None
+        self.variant = None
+        self.export_format = None
+        if png is not None:
+            self.store_png(png)
+
+    @property
+    def image(self):
+        with self.lock:
+            img = self._image
+        if img is None:
+            img = Image.open(io.BytesIO(self.cached_png()))
+            img.load()
+            with self.lock:
+                if self._image is None:
+                    self._image = img
+                img = self._image
+        self.store.touch(self)
+        return img
+
+    def store_png(self, png):
+        digest = hashlib.sha256(png).hexdigest()
+        with self.lock:
+            self.png = png
+            self.digest = digest
+
+    def variant_png(self, key):
+        """PNG prepared by an earlier export with the settings `key`, if still cached."""
+        with self.lock:
+            if self.variant is not None and self.variant[0] == key:
+                return self.variant[1]
+        return None
+
+    def store_variant(self, key, png):
+        with self.lock:
+            self.variant = (key, png)
+
+    def has_png(self):
+        with self.lock:
+            return self.png is not None or self.spill_path is not None or self.source is not None
+
+    def cached_png(self):
+        with self.lock:
+            png, spill_path, source = self.png, self.spill_path, self.source
+        if png is None and spill_path is not None:
+            with open(spill_path, 'rb') as f:
+                png = f.read()
+        elif png is None and source is not None:
+            png = source()
+        return png
+
+    def thumbnail_bytes(self):
+        with self.lock:
+            thumbnail_png = self.thumbnail_png
+        if thumbnail_png is None:
+            thumbnail_png = make_thumbnail(self.image)
+            with self.lock:
+                self.thumbnail_png = thumbnail_png
+        return thumbnail_png
+
+    def thumbnail(self):
+        """Decoded thumbnail if the record has one, without touching the full image."""
+        with self.lock:
+            thumb, thumbnail_png = self._thumbnail, self.thumbnail_png
+        if thumb is None and thumbnail_png is not None:
+            thumb = Image.open(io.BytesIO(thumbnail_png))
+            thumb.load()
+            with self.lock:
+                self._thumbnail = thumb
+        return thumb
+
+    def encoded(self):
+        png = self.cached_png()
+        if png is None:
+            png = encode_png(self.image, self.store.png_profile)
+            self.store_png(png)
+        return png
+
+    def encoded_digest(self):
+        with self.lock:
+            digest = self.digest
+        if digest is None:
+            digest = hashlib.sha256(self.encoded()).hexdigest()
+            with self.lock:
+                self.digest = digest
+        return digest
+
+    def is_resident(self):
+        with self.lock:
+            return self._image is not None
+
+    def resident_nbytes(self):
+        with self.lock:
+            total = len(self.png) if self.png is not None else 0
+            if self.variant is not None:
+                total += len(self.variant[1])
+            if self._image is not None:
+                total += image_nbytes(self._image)
+        return total
+
+    def rebind_source(self, source):
+        """Point a lazily loaded record at another copy of the same PNG."""
+        with self.lock:
+            if self.source is not None:
+                self.source = source
+
+    def release(self):
+        """Drop the decoded image if it can be read back, e.g. after an export used it."""
+        with self.lock:
+            if self.png is None and self.spill_path is None and self.source is None:
+                return
+            self._image = None
+            cached_variant = self.variant is not None
+        # A cached export variant still counts against the memory budget.
+        if not cached_variant:
+            self.store.untrack(self)
+
+    def spill(self, spill_dir):
+        png = self.encoded()
+        with self.lock:
+            if self.spill_path is None and self.source is None:
+                path = os.path.join(spill_dir, f"{self.id}.png")
+                with open(path, 'wb') as f:
+                    f.write(png)
+                self.spill_path = path
+            self._image = None
+            self.png = None
+            self.variant = None
+
+
+class ScreenshotStore:
+    """Ordered list of ScreenshotRecords kept within a memory budget.
+
+    Recently used records stay decoded in memory; once the budget is
+    exceeded the least recently used ones are spilled to PNG files in a
+    session temp directory and decoded again when next accessed. Encoding
+    and spilling run on a background thread. Records added with a
+    fingerprint are indexed for duplicate lookup. Cached PNGs, which are
+    also what project saves write, are encoded with `png_profile`.
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, png_profile=DEFAULT_PNG_PROFILE):
+        self.records = []
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.png_profile = png_profile
+        self.lock = threading.RLock()
+        self.lru = OrderedDict()
+        self.encoder = ThreadPoolExecutor(max_workers=1)
+        self.duplicates = DuplicateIndex()
+        self.spill_dir = None
+        self._finalizer = None
+        self._budget_pending = False
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __delitem__(self, index):
+        self.forget(self.records[index])
+        del self.records[index]
+
+    def index(self, record):
+        return self.records.index(record)
+
+    def add(self, image, png=None, fingerprint=None):
+        record = ScreenshotRecord(self, image, png)
+        self.records.append(record)
+        if fingerprint is not None:
+            record.fingerprint = fingerprint
+            self.duplicates.add(record, fingerprint)
+        self.touch(record)
+        if png is None:
+            self.encoder.submit(self._encode, record)
+        return record
+
+    def add_lazy(self, size, mode, source, digest=None, thumbnail_png=None):
+        record = ScreenshotRecord(self, size=size, mode=mode, source=source,
+                                  digest=digest, thumbnail_png=thumbnail_png)
+        self.records.append(record)
+        return record
+
+    def swap(self, i, j):
+        self.records[i], self.records[j] = self.records[j], self.records[i]
+
+    def clear(self):
+        for record in self.records:
+            self.forget(record)
+        self.records = []
+
+    def find_duplicate(self, fingerprint):
+        return self.duplicates.find_exact(fingerprint)
+
+    def similar(self, record):
+        """Records that look nearly the same as `record`, closest first."""
+        if record.fingerprint is None:
+            return []
+        return [other for distance, other in self.duplicates.find_similar(record.fingerprint, exclude=record)]
+
+    def set_budget(self, memory_budget_mb):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.schedule_budget()
+
+    def touch(self, record):
+        with self.lock:
+            self.lru[record.id] = record
+            self.lru.move_to_end(record.id)
+        self.schedule_budget()
+
+    def schedule_budget(self):
+        # Records are touched on every access, far more often than the O(n)
+        # budget pass needs to run, so at most one pass is queued at a time.
+        with self.lock:
+            if self._budget_pending:
+                return
+            self._budget_pending = True
+        self.encoder.submit(self.enforce_budget)
+
+    def untrack(self, record):
+        with self.lock:
+            self.lru.pop(record.id, None)
+
+    def forget(self, record):
+        # The spill file stays until the session ends, a running export may
+        # still hold the record in its snapshot.
+        self.untrack(record)
+        self.duplicates.remove(record)
+
+    def discard_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def resident_nbytes(self):
+        with self.lock:
+            records = list(self.lru.values())
+        return sum(record.resident_nbytes() for record in records)
+
+    def enforce_budget(self):
+        with self.lock:
+            self._budget_pending = False
+            candidates = list(self.lru.values())
+        total = sum(record.resident_nbytes() for record in candidates)
+
+        # Never spill the most recently used record, it is usually on screen.
+        for record in candidates[:-1]:
+            if total <= self.memory_budget:
+                break
+            nbytes = record.resident_nbytes()
+            record.spill(self._spill_dir())
+            with self.lock:
+                self.lru.pop(record.id, None)
+            total -= nbytes
+
+    def _spill_dir(self):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='screenshot_session_')
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        return self.spill_dir
+
+    def close(self):
+        self.encoder.shutdown(wait=False, cancel_futures=True)
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def _encode(self, record):
+        if record in self.records:
+            record.encoded()
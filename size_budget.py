@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import heapq
+
+from PIL import Image
+
+from image_pipeline import (encode_export, export_size, downscale, classify_image, to_palette,
+                            MIN_EXPORT_DPI, DEFAULT_JPEG_QUALITY, DEFAULT_PALETTE_COLORS)
+
+# Steps from the export settings towards smaller output, least lossy first.
+# Each step only ever lowers the DPI or JPEG quality the user chose.
+BUDGET_LEVELS = [
+    {},
+    {'palette': 'auto'},
+    {'palette': 'auto', 'dpi': 200},
+    {'palette': 'auto', 'dpi': 150},
+    {'image_format': 'jpeg', 'jpeg_quality': 85, 'dpi': 150},
+    {'image_format': 'jpeg', 'jpeg_quality': 75, 'dpi': 120},
+    {'image_format': 'jpeg', 'jpeg_quality': 60, 'dpi': 96},
+]
+
+# Fixed size of the DOCX parts besides the media, plus the XML per screenshot.
+DOCX_OVERHEAD = 40 * 1024
+DOCX_OVERHEAD_PER_IMAGE = 1024
+
+# Share of the budget kept free for estimation error.
+ESTIMATE_MARGIN = 0.05
+
+SAMPLE_STRIPS = 4
+SAMPLE_STRIP_ROWS = 64
+
+
+def level_settings(base, level):
+    """encode_export() keyword arguments for `base` export settings at one budget level."""
+    settings = dict(base)
+    for name, value in level.items():
+        if name == 'dpi':
+            settings['dpi'] = min(settings['dpi'], value) if settings.get('dpi') else value
+        elif name == 'jpeg_quality':
+            settings['jpeg_quality'] = min(settings.get('jpeg_quality') or DEFAULT_JPEG_QUALITY, value)
+        elif name == 'palette' and settings.get('palette', 'off') != 'off':
+            continue
+        else:
+            settings[name] = value
+    return settings
+
+
+def describe_level(settings):
+    parts = [settings.get('image_format', 'png').upper()]
+    if settings.get('image_format') == 'jpeg':
+        parts[0] += f" q{settings.get('jpeg_quality') or DEFAULT_JPEG_QUALITY}"
+    elif settings.get('palette', 'off') != 'off':
+        parts.append(f"palette {settings['palette']}")
+    if settings.get('dpi'):
+        parts.append(f"{settings['dpi']} DPI")
+    return ", ".join(parts)
+
+
+def sample_image(img):
+    """A few full-width strips spread over the image, stacked into one small image."""
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+    if img.height <= SAMPLE_STRIPS * SAMPLE_STRIP_ROWS * 2:
+        return img
+    sample = Image.new(img.mode, (img.width, SAMPLE_STRIPS * SAMPLE_STRIP_ROWS))
+    step = (img.height - SAMPLE_STRIP_ROWS) / (SAMPLE_STRIPS - 1)
+    for i in range(SAMPLE_STRIPS):
+        top = round(i * step)
+        sample.paste(img.crop((0, top, img.width, top + SAMPLE_STRIP_ROWS)), (0, i * SAMPLE_STRIP_ROWS))
+    return sample
+
+
+def estimate_sizes(img, levels, height_inches):
+    """Estimated encoded bytes of the image for each settings dict in `levels`.
+
+    The image is resampled once per distinct export size. Whether it is
+    embedded as JPEG and whether a palette fits is decided on that full
+    image, as encode_export() would, then only the sample strips are
+    encoded and the result is scaled up by pixel count.
+    """
+    resized = {}
+    estimates = []
+    for settings in levels:
+        settings = dict(settings)
+        dpi = settings.pop('dpi', None)
+        target = (export_size(img.size, height_inches, dpi) if dpi else None) or img.size
+        if target not in resized:
+            full = downscale(img, target, max(MIN_EXPORT_DPI, dpi)) if target != img.size else img
+            resized[target] = {'image': full, 'sample': sample_image(full)}
+        cache = resized[target]
+
+        if settings.get('image_format') == 'auto':
+            if 'format' not in cache:
+                cache['format'] = classify_image(cache['image'])
+            settings['image_format'] = cache['format']
+        palette = (settings.get('palette', 'off'), settings.get('max_colors', DEFAULT_PALETTE_COLORS))
+        if settings.get('image_format', 'png') == 'png' and palette[0] != 'off':
+            if palette not in cache:
+                cache[palette] = to_palette(cache['image'], *palette).mode == 'P'
+            if not cache[palette]:
+                settings['palette'] = 'off'
+
+        sample = cache['sample']
+        data = encode_export(sample, **settings)
+        estimates.append(round(len(data) * (target[0] * target[1]) / (sample.width * sample.height)))
+    return estimates
+
+
+def fit_budget(estimates, budget):
+    """Pick a level per image so the estimated total fits `budget` bytes, less ESTIMATE_MARGIN.
+
+    Greedy: starting from level 0 everywhere, repeatedly take the move to a
+    lossier level that saves the most bytes per level stepped, until the
+    total fits or every image is at its last level. The moves can overshoot,
+    so each image is then stepped back to the least lossy level that still
+    fits. Returns the chosen level indices and the estimated total.
+    """
+    budget *= 1 - ESTIMATE_MARGIN
+    chosen = [0] * len(estimates)
+    total = DOCX_OVERHEAD + DOCX_OVERHEAD_PER_IMAGE * len(estimates) + sum(sizes[0] for sizes in estimates)
+
+    def best_move(i):
+        current = chosen[i]
+        sizes = estimates[i]
+        best = None
+        for level in range(current + 1, len(sizes)):
+            saving = sizes[current] - sizes[level]
+            if saving > 0 and (best is None or saving / (level - current) > best[0]):
+                best = (saving / (level - current), level)
+        return best
+
+    heap = []
+    for i in range(len(estimates)):
+        move = best_move(i)
+        if move:
+            heapq.heappush(heap, (-move[0], i, move[1]))
+
+    while total > budget and heap:
+        rate, i, level = heapq.heappop(heap)
+        total -= estimates[i][chosen[i]] - estimates[i][level]
+        chosen[i] = level
+        move = best_move(i)
+        if move:
+            heapq.heappush(heap, (-move[0], i, move[1]))
+
+    for i in sorted(range(len(estimates)), key=lambda i: chosen[i], reverse=True):
+        for level in range(chosen[i]):
+            if total - estimates[i][chosen[i]] + estimates[i][level] <= budget:
+                total += estimates[i][level] - estimates[i][chosen[i]]
+                chosen[i] = level
+                break
+
+    return chosen, total
@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+import batch_builder
+from project_io import save_project
+from screenshot_store import ScreenshotStore
+
+
+@pytest.fixture
+def projects(tmp_path, monkeypatch):
+    # No app settings file in the working directory.
+    monkeypatch.chdir(tmp_path)
+    project_dir = tmp_path / 'projects'
+    project_dir.mkdir()
+    store = ScreenshotStore()
+    try:
+        store.add(Image.new('RGB', (64, 48), 'red'))
+        save_project(str(project_dir / 'lab1.ssp'), {'module': '1', 'section_names': ['Start']}, list(store))
+    finally:
+        store.close()
+    return project_dir
+
+
+def run_batch(monkeypatch, project_dir, *args):
+    monkeypatch.setattr(sys, 'argv', ['batch_builder.py', str(project_dir), '-q', '-j', '1', *args])
+    assert batch_builder.main() == 0
+    with open(project_dir / 'reports' / batch_builder.SUMMARY_FILE) as f:
+        return json.load(f)
+
+
+def test_unchanged_project_is_skipped(projects, monkeypatch):
+    summary = run_batch(monkeypatch, projects)
+    assert (summary['built'], summary['skipped']) == (1, 0)
+    output = projects / 'reports' / 'lab1.docx'
+    built_at = os.path.getmtime(output)
+
+    summary = run_batch(monkeypatch, projects)
+    assert (summary['built'], summary['skipped']) == (0, 1)
+    assert os.path.getmtime(output) == built_at
+
+    # Different build options change the input hash.
+    summary = run_batch(monkeypatch, projects, '--dpi', '96')
+    assert (summary['built'], summary['skipped']) == (1, 0)
+
+
+def test_input_hash_ignores_worker_count(projects):
+    path = str(projects / 'lab1.ssp')
+    assert batch_builder.input_hash(path, {'dpi': 0, 'encode_workers': 1}) == \
+        batch_builder.input_hash(path, {'dpi': 0, 'encode_workers': 8})
+    assert batch_builder.input_hash(path, {'dpi': 0}) != batch_builder.input_hash(path, {'dpi': 96})
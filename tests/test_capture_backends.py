@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+import capture_backends
+from capture_backends import CaptureBackend, CaptureUnavailable
+
+
+class FakeGeometry:
+    def __init__(self, window=None, active=None, monitor=(0, 0, 1920, 1080)):
+        self.window = window
+        self.active = active
+        self.monitor = monitor
+
+    def pointer_window_rect(self):
+        return self.window
+
+    def active_window_rect(self):
+        return self.active
+
+    def pointer_monitor_rect(self):
+        return self.monitor
+
+
+class FakeBackend(CaptureBackend):
+    name = 'fake'
+
+    def __init__(self, geometry):
+        self._geometry = geometry
+
+    def geometry(self):
+        return self._geometry
+
+
+def test_area_rect():
+    backend = FakeBackend(FakeGeometry(window=(10, 20, 300, 200), monitor=(1920, 0, 2560, 1440)))
+    assert backend.area_rect('window') == (10, 20, 300, 200)
+    assert backend.area_rect('monitor') == (1920, 0, 2560, 1440)
+    assert backend.area_rect('region', [5, 5, 50, 50]) == (5, 5, 50, 50)
+    assert backend.area_rect('screen') is None
+
+
+def test_area_rect_falls_back_to_the_monitor():
+    backend = FakeBackend(FakeGeometry(monitor=(0, 0, 1280, 1024)))
+    assert backend.area_rect('window') == (0, 0, 1280, 1024)
+    assert backend.area_rect('active') == (0, 0, 1280, 1024)
+
+
+def test_area_rect_fails_rather_than_grabbing_the_desktop():
+    backend = FakeBackend(FakeGeometry(monitor=None))
+    for area in ('window', 'active', 'monitor'):
+        with pytest.raises(CaptureUnavailable):
+            backend.area_rect(area)
+    with pytest.raises(CaptureUnavailable):
+        backend.area_rect('region')
+
+
+def test_screen_geometry_is_created_once(monkeypatch):
+    created = []
+    started = threading.Barrier(8)
+
+    class SlowDisplay:
+        def __init__(self):
+            # Opening the connection takes a while; other threads must wait for it.
+            time.sleep(0.05)
+            created.append(self)
+
+    monkeypatch.setattr(capture_backends, 'CURRENT_OS', 'linux')
+    monkeypatch.setattr(capture_backends, '_geometry', None)
+    monkeypatch.setattr(capture_backends, 'XDisplay', SlowDisplay)
+    monkeypatch.setenv('DISPLAY', ':99')
+
+    results = []
+
+    def worker():
+        started.wait()
+        results.append(capture_backends.screen_geometry())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(result is created[0] for result in results)
+
+
+def test_screen_geometry_without_display(monkeypatch):
+    monkeypatch.setattr(capture_backends, 'CURRENT_OS', 'linux')
+    monkeypatch.setattr(capture_backends, '_geometry', None)
+    monkeypatch.delenv('DISPLAY', raising=False)
+    with pytest.raises(CaptureUnavailable):
+        capture_backends.screen_geometry()
+
+
+def test_capture_first_reports_failures(capsys):
+    class Failing(CaptureBackend):
+        name = 'failing'
+
+        def capture(self, area='window', region=None, select=True):
+            raise CaptureUnavailable("no pixels")
+
+    class Working(CaptureBackend):
+        name = 'working'
+
+        def capture(self, area='window', region=None, select=True):
+            return (area, region)
+
+    assert capture_backends.capture_first([Failing(), Working()], 'region', (1, 2, 3, 4)) == ('region', (1, 2, 3, 4))
+    assert "failing failed: CaptureUnavailable: no pixels" in capsys.readouterr().err
+    assert capture_backends.capture_first([Failing()]) is None
@@ -0,0 +1,69 @@
+import io
+import zipfile
+
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+
+from docx_stream import StreamingDocxWriter
+
+# Holds the save time, so it can differ by a second between the two builds.
+TIMESTAMPED_PARTS = {'docProps/core.xml'}
+
+
+def png_bytes(color, size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def build(document, images):
+    document.add_paragraph('Report', 'Heading 1')
+    for i, data in enumerate(images):
+        document.add_paragraph(f'Step {i + 1}', 'Heading 2')
+        document.add_picture(io.BytesIO(data), height=Inches(2))
+        document.add_paragraph(f'Notes for step {i + 1}')
+        document.add_page_break()
+
+
+def test_streamed_package_matches_python_docx(tmp_path):
+    # The repeated image must share one media part, as python-docx does.
+    images = [png_bytes('red'), png_bytes('blue', (64, 64)), png_bytes('red')]
+
+    reference = Document()
+    build(reference, images)
+    reference.save(tmp_path / 'reference.docx')
+
+    with StreamingDocxWriter(str(tmp_path / 'streamed.docx')) as writer:
+        build(writer, images)
+
+    with zipfile.ZipFile(tmp_path / 'reference.docx') as expected, \
+            zipfile.ZipFile(tmp_path / 'streamed.docx') as actual:
+        assert sorted(actual.namelist()) == sorted(expected.namelist())
+        assert len([name for name in actual.namelist() if name.startswith('word/media/')]) == 2
+        for name in expected.namelist():
+            if name not in TIMESTAMPED_PARTS:
+                assert actual.read(name) == expected.read(name), name
+
+
+def test_media_compression(tmp_path):
+    path = tmp_path / 'streamed.docx'
+    with StreamingDocxWriter(str(path)) as writer:
+        build(writer, [png_bytes('green')])
+
+    with zipfile.ZipFile(path) as package:
+        for info in package.infolist():
+            expected = zipfile.ZIP_STORED if info.filename.startswith('word/media/') else zipfile.ZIP_DEFLATED
+            assert info.compress_type == expected, info.filename
+
+
+def test_abort_leaves_no_output(tmp_path):
+    path = tmp_path / 'streamed.docx'
+    try:
+        with StreamingDocxWriter(str(path)) as writer:
+            build(writer, [png_bytes('green')])
+            raise RuntimeError('cancelled')
+    except RuntimeError:
+        pass
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+import duplicates
+from duplicates import DuplicateIndex, Fingerprint, fingerprint, hamming, perceptual_hashes
+
+
+def screenshot(seed, size=(640, 400)):
+    rng = random.Random(seed)
+    img = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(img)
+    for _ in range(30):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle([x, y, x + rng.randrange(200), y + rng.randrange(120)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    return img
+
+
+def flip_bits(value, count):
+    for bit in range(count):
+        value ^= 1 << (bit * 7)
+    return value
+
+
+def test_identical_pixels_share_a_digest():
+    img = screenshot(1)
+    assert fingerprint(img) == fingerprint(img.copy())
+    assert fingerprint(img).digest != fingerprint(screenshot(2)).digest
+
+
+def test_small_edit_is_near_duplicate():
+    img = screenshot(1)
+    edited = img.copy()
+    ImageDraw.Draw(edited).text((10, 10), 'cursor', fill='black')
+
+    a, b = fingerprint(img), fingerprint(edited)
+    assert a.digest != b.digest
+    assert hamming(a.dhash, b.dhash) <= duplicates.NEAR_DUPLICATE_DISTANCE
+    assert hamming(a.ahash, b.ahash) <= duplicates.NEAR_DUPLICATE_DISTANCE
+
+
+def test_exact_match():
+    index = DuplicateIndex()
+    fp = fingerprint(screenshot(1))
+    index.add('first', fp)
+    index.add('second', fingerprint(screenshot(2)))
+
+    assert index.find_exact(fp) == 'first'
+    assert index.find_exact(fingerprint(screenshot(3))) is None
+
+
+def test_near_match_within_distance():
+    index = DuplicateIndex()
+    base = Fingerprint('a', 0x0123456789abcdef, 0xfedcba9876543210)
+    index.add('base', base)
+
+    near = Fingerprint('b', flip_bits(base.ahash, 6), flip_bits(base.dhash, 6))
+    far = Fingerprint('c', base.ahash, flip_bits(base.dhash, 7))
+    assert index.find_similar(near) == [(6, 'base')]
+    assert index.find_similar(far) == []
+    assert index.find_similar(base, exclude='base') == []
+
+
+def test_remove():
+    index = DuplicateIndex()
+    fp = fingerprint(screenshot(1))
+    index.add('first', fp)
+    index.add('copy', fp)
+    index.remove('first')
+
+    assert len(index) == 1
+    assert index.find_exact(fp) == 'copy'
+    assert index.find_similar(fp) == [(0, 'copy')]
+
+    index.remove('copy')
+    index.remove('missing')
+    assert index.find_exact(fp) is None
+    assert index.find_similar(fp) == []
+    assert all(not band for band in index.band_index)
+
+
+def test_pure_python_hashes_match_numpy(monkeypatch):
+    pytest.importorskip('numpy')
+    images = [screenshot(seed, size) for seed, size in enumerate([(640, 400), (97, 53), (1920, 1080), (333, 217)])]
+    images.append(Image.new('RGB', (200, 100), 'white'))
+    expected = [perceptual_hashes(img) for img in images]
+
+    monkeypatch.setattr(duplicates, 'np', None)
+    assert [perceptual_hashes(img) for img in images] == expected
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+from PIL import Image
+
+np = pytest.importorskip('numpy')
+
+from image_pipeline import encode_png, encode_png_parallel
+
+
+def sample(mode, size=(1000, 1200)):
+    # Noise plus gradients, tall enough to be split into several bands.
+    rng = np.random.default_rng(0)
+    width, height = size
+    bands = {'L': 1, 'LA': 2, 'RGB': 3, 'RGBA': 4}[mode if mode != 'P' else 'L']
+    gradient = (np.arange(width)[None, :, None] + np.arange(height)[:, None, None]) % 256
+    pixels = (gradient + rng.integers(0, 8, (height, width, bands))).astype(np.uint8)
+    img = Image.fromarray(pixels[:, :, 0] if bands == 1 else pixels, 'L' if bands == 1 else mode)
+    if mode == 'P':
+        img = img.convert('RGB').quantize(64)
+    return img
+
+
+def decode(png):
+    img = Image.open(io.BytesIO(png))
+    img.load()
+    return img
+
+
+@pytest.mark.parametrize('mode', ['L', 'LA', 'RGB', 'RGBA', 'P'])
+def test_parallel_png_round_trip(mode):
+    img = sample(mode)
+    decoded = decode(encode_png_parallel(img, threads=3))
+    assert decoded.mode == img.mode
+    assert decoded.size == img.size
+    assert decoded.tobytes() == img.tobytes()
+    if mode == 'P':
+        assert decoded.getpalette() == img.getpalette()
+
+
+def test_parallel_png_keeps_transparency_and_dpi():
+    img = sample('P', (300, 200))
+    img.info['transparency'] = 5
+    img.info['dpi'] = (144, 144)
+    decoded = decode(encode_png_parallel(img))
+    assert decoded.info['transparency'] == 5
+    assert decoded.info['dpi'] == pytest.approx((144, 144), abs=0.01)
+
+
+@pytest.mark.parametrize('profile', ['fast', 'balanced', 'smallest'])
+def test_profiles_round_trip(profile):
+    img = sample('RGB')
+    assert decode(encode_png(img, profile)).tobytes() == img.tobytes()
+
+
+def test_balanced_profile_is_pillow_default():
+    img = sample('RGB', (300, 200))
+    stream = io.BytesIO()
+    img.save(stream, format='PNG')
+    assert encode_png(img, 'balanced') == stream.getvalue()
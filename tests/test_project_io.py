@@ -0,0 +1,111 @@
+import functools
+import io
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from project_io import load_project, read_image_file, save_project
+from screenshot_store import ScreenshotStore
+
+PROJECT_DATA = {'module_name': 'Login', 'section_names': ['First', 'Second', 'Again'], 'notes': ['a', '', 'c']}
+
+
+@pytest.fixture
+def store():
+    store = ScreenshotStore()
+    yield store
+    store.close()
+
+
+def sample_images():
+    return [Image.new('RGB', (64, 48), 'red'), Image.new('RGBA', (32, 32), (0, 0, 255, 128)),
+            Image.new('RGB', (64, 48), 'red')]
+
+
+def decode(png):
+    img = Image.open(io.BytesIO(png))
+    img.load()
+    return img
+
+
+def load_records(path, store):
+    project_data, entries, archive = load_project(path)
+    records = [store.add_lazy((entry['width'], entry['height']), entry['mode'],
+                              functools.partial(archive.read_png, entry['digest']),
+                              entry['digest'], entry['thumbnail'])
+               for entry in entries]
+    return project_data, entries, archive, records
+
+
+def test_round_trip(tmp_path, store):
+    path = str(tmp_path / 'project.ssp')
+    images = sample_images()
+    for img in images:
+        store.add(img)
+
+    # The repeated image is stored once.
+    assert save_project(path, PROJECT_DATA, list(store)) == (2, None)
+
+    project_data, entries, archive, records = load_records(path, store)
+    try:
+        assert {key: project_data[key] for key in PROJECT_DATA} == PROJECT_DATA
+        assert project_data['screenshot_count'] == 3
+        assert entries[0]['digest'] == entries[2]['digest']
+        for img, entry, record in zip(images, entries, records):
+            assert (entry['width'], entry['height'], entry['mode']) == (img.width, img.height, img.mode)
+            assert entry['thumbnail'] is not None
+            assert not record.is_resident()
+            assert record.image.tobytes() == img.tobytes()
+    finally:
+        archive.close()
+
+
+def test_resave_writes_only_new_images(tmp_path, store):
+    path = str(tmp_path / 'project.ssp')
+    for img in sample_images():
+        store.add(img)
+    save_project(path, PROJECT_DATA, list(store))
+
+    second = ScreenshotStore()
+    try:
+        _, _, archive, records = load_records(path, second)
+        green = second.add(Image.new('RGB', (16, 16), 'green'))
+        # Drop the RGBA image: its row goes, the others are kept as they are.
+        assert save_project(path, PROJECT_DATA, [records[0], green]) == (1, None)
+        archive.close()
+
+        _, entries, archive = load_project(path)
+        assert [entry['digest'] for entry in entries] == [records[0].encoded_digest(), green.encoded_digest()]
+        assert len(archive.index()) == 2
+        assert decode(archive.read_png(entries[1]['digest'])).getpixel((0, 0)) == (0, 128, 0)
+        archive.close()
+    finally:
+        second.close()
+
+
+def test_json_project_is_converted(tmp_path, store):
+    path = str(tmp_path / 'project.ssp')
+    data_dir = path + '_data'
+    os.mkdir(data_dir)
+    Image.new('RGB', (20, 10), 'blue').save(os.path.join(data_dir, 'screenshot_0.png'))
+    with open(path, 'w') as f:
+        json.dump(dict(PROJECT_DATA, screenshot_count=1), f)
+
+    _, entries, archive = load_project(path)
+    assert archive is None
+    record = store.add_lazy((entries[0]['width'], entries[0]['height']), entries[0]['mode'],
+                            functools.partial(read_image_file, entries[0]['path']))
+
+    _, rebound = save_project(path, PROJECT_DATA, [record])
+
+    assert not os.path.exists(data_dir)
+    _, entries, archive = load_project(path)
+    try:
+        assert decode(archive.read_png(entries[0]['digest'])).getpixel((0, 0)) == (0, 0, 255)
+        # The record was rebound to the archive before the file was removed.
+        assert record.image.getpixel((0, 0)) == (0, 0, 255)
+    finally:
+        archive.close()
+        rebound.close()
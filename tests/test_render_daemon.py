@@ -0,0 +1,81 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+import pytest
+
+import render_daemon
+from render_daemon import RenderClient, RequestHandler, runtime_dir, token_path
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'getuid'), reason="POSIX permissions")
+
+
+@pytest.fixture
+def runtime(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    return tmp_path / render_daemon.RUNTIME_DIR_NAME
+
+
+def test_runtime_dir_is_private(runtime):
+    assert runtime_dir() == str(runtime)
+    assert stat.S_IMODE(os.stat(runtime).st_mode) == render_daemon.RUNTIME_DIR_MODE
+
+
+def test_runtime_dir_open_to_others_is_refused(runtime):
+    runtime.mkdir(mode=0o700)
+    os.chmod(runtime, 0o755)
+    with pytest.raises(PermissionError):
+        runtime_dir()
+
+
+def test_runtime_dir_must_be_a_directory(runtime):
+    runtime.write_text('')
+    with pytest.raises(PermissionError):
+        runtime_dir()
+
+
+@pytest.mark.skipif(getattr(os, 'geteuid', lambda: -1)() != 0, reason="needs root to chown")
+def test_runtime_dir_of_another_user_is_refused(runtime):
+    runtime.mkdir(mode=0o700)
+    os.chown(runtime, 65534, 65534)
+    with pytest.raises(PermissionError):
+        runtime_dir()
+
+
+@pytest.fixture
+def tcp_server(runtime):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), RequestHandler)
+    server.daemon_threads = True
+    server.service = None
+    server.token = 'secret'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_tcp_client_with_token_is_served(tcp_server):
+    port = tcp_server.server_address[1]
+    with open(token_path(port), 'w') as f:
+        f.write('secret')
+    assert RenderClient(('127.0.0.1', port)).request('ping') == {'pid': os.getpid()}
+
+
+def test_tcp_client_with_wrong_token_is_rejected(tcp_server):
+    port = tcp_server.server_address[1]
+    with open(token_path(port), 'w') as f:
+        f.write('guess')
+    with pytest.raises(RuntimeError, match="Permission denied"):
+        RenderClient(('127.0.0.1', port)).request('ping')
+
+
+def test_tcp_request_without_token_is_rejected(tcp_server):
+    with socket.create_connection(tcp_server.server_address, timeout=5) as sock:
+        sock.sendall(json.dumps({'command': 'ping'}).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            response = json.loads(f.readline())
+    assert response == {'ok': False, 'error': "Permission denied", 'busy': False}
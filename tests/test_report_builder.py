@@ -0,0 +1,71 @@
+import json
+
+import pytest
+from PIL import Image
+
+import report_builder
+from screenshot_store import ScreenshotStore
+
+
+@pytest.fixture
+def store():
+    store = ScreenshotStore()
+    yield store
+    store.close()
+
+
+def make_images(directory):
+    Image.new('RGB', (40, 30), 'red').save(directory / 'b_login.png')
+    Image.new('RGB', (20, 10), 'blue').save(directory / 'a_start.jpg')
+    (directory / 'readme.txt').write_text('not an image')
+
+
+def test_load_directory_uses_images_in_name_order(tmp_path, store):
+    make_images(tmp_path)
+    options, section_names, notes = report_builder.load_directory(str(tmp_path), store)
+
+    assert options == {}
+    assert section_names == ['a_start', 'b_login']
+    assert notes == ['', '']
+    assert [record.size for record in store] == [(20, 10), (40, 30)]
+    # PNGs are read lazily, other formats decoded on load.
+    assert store[0].is_resident()
+    assert not store[1].is_resident()
+
+
+def test_load_manifest(tmp_path, store):
+    images = tmp_path / 'images'
+    images.mkdir()
+    make_images(images)
+    manifest = tmp_path / 'report.json'
+    manifest.write_text(json.dumps({
+        'module': '3',
+        'image_height': 4.0,
+        'unknown_key': 'ignored',
+        'screenshots': ['b_login.png', {'image': 'a_start.jpg', 'section': 'Start', 'notes': 'First step'}],
+    }))
+
+    options, section_names, notes = report_builder.load_manifest(str(manifest), store, str(images))
+
+    assert options == {'module': '3', 'image_height': 4.0}
+    assert section_names == ['b_login', 'Start']
+    assert notes == ['', 'First step']
+    assert [record.size for record in store] == [(40, 30), (20, 10)]
+
+
+def test_load_manifest_without_screenshots_uses_its_directory(tmp_path, store):
+    make_images(tmp_path)
+    manifest = tmp_path / 'report.json'
+    manifest.write_text(json.dumps({'doc_title': 'Lab'}))
+
+    options, section_names, notes = report_builder.load_manifest(str(manifest), store)
+
+    assert options == {'doc_title': 'Lab'}
+    assert section_names == ['a_start', 'b_login']
+
+
+def test_load_manifest_rejects_non_objects(tmp_path, store):
+    manifest = tmp_path / 'report.json'
+    manifest.write_text('["a.png"]')
+    with pytest.raises(ValueError):
+        report_builder.load_manifest(str(manifest), store)
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+from PIL import Image
+
+from screenshot_store import ScreenshotStore
+
+FRAME = (1920, 1080)
+FRAME_BYTES = FRAME[0] * FRAME[1] * 3
+
+
+@pytest.fixture
+def store():
+    # Room for two decoded 1080p screenshots.
+    store = ScreenshotStore(memory_budget_mb=(2 * FRAME_BYTES) // (1024 * 1024) + 1)
+    yield store
+    store.close()
+
+
+def add_frames(store, count):
+    records = [store.add(Image.new('RGB', FRAME, (i * 40, 0, 0))) for i in range(count)]
+    # Let the background encodes and budget passes queued by add() finish.
+    store.encoder.submit(lambda: None).result()
+    return records
+
+
+def test_enforce_budget_spills_least_recently_used(store):
+    records = add_frames(store, 5)
+    store.enforce_budget()
+
+    assert store.resident_nbytes() <= store.memory_budget
+    assert records[-1]._image is not None
+    spilled = [record for record in records if record._image is None]
+    assert len(spilled) >= 3
+    for record in spilled:
+        assert record.png is None
+        assert os.path.exists(record.spill_path)
+
+
+def test_spilled_record_reads_back(store):
+    records = add_frames(store, 5)
+    store.enforce_budget()
+
+    for i, record in enumerate(records):
+        assert record.image.getpixel((0, 0)) == (i * 40, 0, 0)
+        assert record.image.size == FRAME
+
+
+def test_spill_keeps_png_on_disk(store):
+    record = add_frames(store, 1)[0]
+    png = record.encoded()
+    record.spill(store._spill_dir())
+
+    assert record._image is None
+    assert record.resident_nbytes() == 0
+    with open(record.spill_path, 'rb') as f:
+        assert f.read() == png
+    assert record.encoded() == png
+
+
+def test_touch_coalesces_budget_passes(store):
+    calls = []
+    enforce_budget = store.enforce_budget
+
+    def counted():
+        calls.append(1)
+        enforce_budget()
+
+    store.enforce_budget = counted
+    record = add_frames(store, 1)[0]
+    for _ in range(1000):
+        record.image
+    store.encoder.submit(lambda: None).result()
+
+    assert 1 <= len(calls) < 10
+
+
+def test_close_removes_spill_files(store):
+    add_frames(store, 5)
+    store.enforce_budget()
+    spill_dir = store.spill_dir
+    assert os.listdir(spill_dir)
+
+    store.close()
+    assert not os.path.exists(spill_dir)
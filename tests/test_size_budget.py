@@ -0,0 +1,54 @@
+import random
+
+from size_budget import DOCX_OVERHEAD, DOCX_OVERHEAD_PER_IMAGE, ESTIMATE_MARGIN, fit_budget
+
+
+def random_estimates(count, levels=7, seed=0):
+    rng = random.Random(seed)
+    estimates = []
+    for _ in range(count):
+        size = rng.randint(50_000, 2_000_000)
+        sizes = [size]
+        for _ in range(levels - 1):
+            # Lossier levels usually, but not always, come out smaller.
+            sizes.append(max(1000, int(sizes[-1] * rng.uniform(0.4, 1.05))))
+        estimates.append(sizes)
+    return estimates
+
+
+def expected_total(estimates, chosen):
+    return (DOCX_OVERHEAD + DOCX_OVERHEAD_PER_IMAGE * len(estimates)
+            + sum(sizes[level] for sizes, level in zip(estimates, chosen)))
+
+
+def test_generous_budget_keeps_settings():
+    estimates = random_estimates(20)
+    chosen, total = fit_budget(estimates, expected_total(estimates, [0] * 20) * 2)
+    assert chosen == [0] * 20
+    assert total == expected_total(estimates, chosen)
+
+
+def test_impossible_budget_goes_as_small_as_possible():
+    estimates = random_estimates(20)
+    chosen, total = fit_budget(estimates, 1)
+    assert total == expected_total(estimates, chosen)
+    for sizes, level in zip(estimates, chosen):
+        assert sizes[level] == min(sizes)
+
+
+def test_budget_converges():
+    for seed in range(20):
+        estimates = random_estimates(30, seed=seed)
+        smallest = expected_total(estimates, [len(sizes) - 1 for sizes in estimates])
+        largest = expected_total(estimates, [0] * len(estimates))
+        budget = (smallest + (largest - smallest) * random.Random(seed).uniform(0.1, 0.9)) / (1 - ESTIMATE_MARGIN)
+        limit = budget * (1 - ESTIMATE_MARGIN)
+
+        chosen, total = fit_budget(estimates, budget)
+
+        assert total == expected_total(estimates, chosen)
+        assert total <= limit
+        # No single image could be stepped back to a less lossy level.
+        for i, (sizes, level) in enumerate(zip(estimates, chosen)):
+            for lower in range(level):
+                assert total - sizes[level] + sizes[lower] > limit
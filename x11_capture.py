@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+
+import ctypes
+import ctypes.util
+import select
+import threading
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Z_PIXMAP = 2
+LSB_FIRST = 0
+ALL_PLANES = ctypes.c_ulong(-1).value
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+KEY_PRESS = 2
+GRAB_MODE_ASYNC = 1
+# Modifier masks by name, and the lock modifiers a grab has to ignore.
+MODIFIER_MASKS = {'shift': 1, 'ctrl': 4, 'control': 4, 'alt': 8, 'mod1': 8, 'super': 64, 'mod4': 64}
+LOCK_MASKS = (0, 2, 16, 2 | 16)
+
+
+class XUnavailable(Exception):
+    pass
+
+
+class XShmUnavailable(XUnavailable):
+    pass
+
+
+class XImage(ctypes.Structure):
+    # Leading fields of Xlib's XImage; the struct is only ever allocated by Xlib.
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+        ('red_mask', ctypes.c_ulong),
+        ('green_mask', ctypes.c_ulong),
+        ('blue_mask', ctypes.c_ulong),
+    ]
+
+
+class XRRMonitorInfo(ctypes.Structure):
+    _fields_ = [
+        ('name', ctypes.c_ulong),
+        ('primary', ctypes.c_int),
+        ('automatic', ctypes.c_int),
+        ('noutput', ctypes.c_int),
+        ('x', ctypes.c_int),
+        ('y', ctypes.c_int),
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('mwidth', ctypes.c_int),
+        ('mheight', ctypes.c_int),
+        ('outputs', ctypes.c_void_p),
+    ]
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+_libs = None
+_xrandr = False
+_libs_lock = threading.Lock()
+_error_handler_lock = threading.Lock()
+_x_errors = []
+
+
+@X_ERROR_HANDLER
+def _record_x_error(display, event):
+    _x_errors.append(event)
+    return 0
+
+
+_record_x_error_pointer = ctypes.cast(_record_x_error, ctypes.c_void_p)
+
+
+def _checked(x11, display, function, *args):
+    """Call an Xlib function and sync, raising XUnavailable on an X error.
+
+    Xlib's default handler would exit the process. The handler is
+    process-wide and shared with Tk, so ours is only installed for the
+    duration of the call, under a lock so that concurrent calls (a capture
+    and the hotkey listener) cannot restore each other's handler or pick
+    up each other's errors.
+    """
+    with _error_handler_lock:
+        previous = x11.XSetErrorHandler(_record_x_error_pointer)
+        del _x_errors[:]
+        try:
+            result = function(*args)
+            x11.XSync(display, 0)
+        finally:
+            x11.XSetErrorHandler(previous)
+        failed = bool(_x_errors)
+        del _x_errors[:]
+    if failed:
+        raise XUnavailable(f"X error in {function.__name__}")
+    return result
+
+
+def _load_libraries():
+    global _libs
+    with _libs_lock:
+        if _libs is not None:
+            return _libs
+        names = [ctypes.util.find_library(name) for name in ('X11', 'Xext', 'c')]
+        if not all(names):
+            raise XUnavailable("libX11, libXext or libc not found")
+        x11, xext, libc = (ctypes.CDLL(name) for name in names)
+
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(XImage)]
+        x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        x11.XQueryPointer.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                      ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+                                      ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                      ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                      ctypes.POINTER(ctypes.c_uint)]
+        x11.XTranslateCoordinates.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_int,
+                                              ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+                                              ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_ulong)]
+        x11.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        x11.XInternAtom.restype = ctypes.c_ulong
+        x11.XGetWindowProperty.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_long,
+                                           ctypes.c_long, ctypes.c_int, ctypes.c_ulong,
+                                           ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_int),
+                                           ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+                                           ctypes.POINTER(ctypes.c_void_p)]
+        x11.XFree.argtypes = [ctypes.c_void_p]
+        x11.XStringToKeysym.argtypes = [ctypes.c_char_p]
+        x11.XStringToKeysym.restype = ctypes.c_ulong
+        x11.XKeysymToKeycode.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        x11.XKeysymToKeycode.restype = ctypes.c_ubyte
+        x11.XGrabKey.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_uint, ctypes.c_ulong,
+                                 ctypes.c_int, ctypes.c_int, ctypes.c_int]
+        x11.XUngrabKey.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_uint, ctypes.c_ulong]
+        x11.XSelectInput.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_long]
+        x11.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        x11.XPending.argtypes = [ctypes.c_void_p]
+        x11.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        x11.XGetGeometry.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong),
+                                     ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                     ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint),
+                                     ctypes.POINTER(ctypes.c_uint), ctypes.POINTER(ctypes.c_uint)]
+
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                         ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo),
+                                         ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+        _libs = (x11, xext, libc)
+        return _libs
+
+
+def _load_xrandr():
+    """libXrandr with the 1.5 monitor API, or None; without it the screen counts as one monitor."""
+    global _xrandr
+    with _libs_lock:
+        if _xrandr is False:
+            _xrandr = None
+            name = ctypes.util.find_library('Xrandr')
+            if name:
+                xrandr = ctypes.CDLL(name)
+                if hasattr(xrandr, 'XRRGetMonitors'):
+                    xrandr.XRRGetMonitors.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.c_int,
+                                                      ctypes.POINTER(ctypes.c_int)]
+                    xrandr.XRRGetMonitors.restype = ctypes.POINTER(XRRMonitorInfo)
+                    xrandr.XRRFreeMonitors.argtypes = [ctypes.POINTER(XRRMonitorInfo)]
+                    _xrandr = xrandr
+        return _xrandr
+
+
+class XDisplay:
+    """A plain Xlib connection answering window and monitor geometry queries.
+
+    It needs no X extension, so it also works on remote displays where
+    XShmCapture does not. One connection is opened per instance; calls are
+    serialized by a lock.
+    """
+
+    def __init__(self, display=None):
+        self.x11, self.xext, self.libc = _load_libraries()
+        self.lock = threading.Lock()
+        self.display = self.x11.XOpenDisplay(display.encode() if display else None)
+        if not self.display:
+            raise XUnavailable("Cannot open the X display")
+        self.screen = self.x11.XDefaultScreen(self.display)
+        self.root = self.x11.XRootWindow(self.display, self.screen)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def screen_size(self):
+        return (self.x11.XDisplayWidth(self.display, self.screen),
+                self.x11.XDisplayHeight(self.display, self.screen))
+
+    def _query_pointer(self):
+        """Pointer position on the root window and the top-level window under it (0 over the desktop)."""
+        root, child = ctypes.c_ulong(), ctypes.c_ulong()
+        root_x, root_y, win_x, win_y = (ctypes.c_int() for _ in range(4))
+        mask = ctypes.c_uint()
+        self.x11.XQueryPointer(self.display, self.root, ctypes.byref(root), ctypes.byref(child),
+                               ctypes.byref(root_x), ctypes.byref(root_y),
+                               ctypes.byref(win_x), ctypes.byref(win_y), ctypes.byref(mask))
+        return root_x.value, root_y.value, child.value
+
+    def _window_rect(self, window):
+        """Root-relative (x, y, width, height) of `window` including its border, or None if it is gone."""
+        root, child = ctypes.c_ulong(), ctypes.c_ulong()
+        x, y = ctypes.c_int(), ctypes.c_int()
+        width, height, border, depth = (ctypes.c_uint() for _ in range(4))
+        try:
+            if not self._checked(self.x11.XGetGeometry, self.display, window, ctypes.byref(root),
+                                 ctypes.byref(x), ctypes.byref(y), ctypes.byref(width), ctypes.byref(height),
+                                 ctypes.byref(border), ctypes.byref(depth)):
+                return None
+            # Client windows are positioned relative to the window manager's frame.
+            if not self._checked(self.x11.XTranslateCoordinates, self.display, window, self.root, 0, 0,
+                                 ctypes.byref(x), ctypes.byref(y), ctypes.byref(child)):
+                return None
+        except XUnavailable:
+            # The window went away between the requests.
+            return None
+        return (x.value - border.value, y.value - border.value,
+                width.value + 2 * border.value, height.value + 2 * border.value)
+
+    def pointer_window_rect(self):
+        """(x, y, width, height) of the top-level window under the pointer, or None over the desktop."""
+        with self.lock:
+            _, _, child = self._query_pointer()
+            rect = self._window_rect(child) if child else None
+        return self.clip(rect) if rect else None
+
+    def _window_property(self, window, name, length=1024):
+        """(format, bytes) of a window property, or None if it is not set."""
+        atom = self.x11.XInternAtom(self.display, name, 1)
+        if not atom:
+            return None
+        actual_type, actual_format = ctypes.c_ulong(), ctypes.c_int()
+        count, remaining, data = ctypes.c_ulong(), ctypes.c_ulong(), ctypes.c_void_p()
+        try:
+            status = self._checked(self.x11.XGetWindowProperty, self.display, window, atom, 0, length, 0, 0,
+                                   ctypes.byref(actual_type), ctypes.byref(actual_format),
+                                   ctypes.byref(count), ctypes.byref(remaining), ctypes.byref(data))
+        except XUnavailable:
+            return None
+        if status != 0 or not data.value:
+            return None
+        try:
+            if not count.value:
+                return None
+            item_size = {8: 1, 16: ctypes.sizeof(ctypes.c_short), 32: ctypes.sizeof(ctypes.c_long)}[actual_format.value]
+            return actual_format.value, ctypes.string_at(data, count.value * item_size)
+        finally:
+            self.x11.XFree(data)
+
+    def _active_window(self):
+        value = self._window_property(self.root, b'_NET_ACTIVE_WINDOW', 1)
+        if value is None or value[0] != 32:
+            return 0
+        return ctypes.c_ulong.from_buffer_copy(value[1]).value
+
+    def active_window_rect(self):
+        """Rectangle of the window the window manager reports as active (_NET_ACTIVE_WINDOW), or None."""
+        with self.lock:
+            window = self._active_window()
+            rect = self._window_rect(window) if window else None
+        return self.clip(rect) if rect else None
+
+    def active_window_title(self):
+        """Title of the active window (_NET_WM_NAME, else WM_NAME), or an empty string."""
+        with self.lock:
+            window = self._active_window()
+            if not window:
+                return ''
+            for name in (b'_NET_WM_NAME', b'WM_NAME'):
+                value = self._window_property(window, name)
+                if value is not None and value[0] == 8:
+                    return value[1].decode('utf-8', errors='replace')
+        return ''
+
+    def monitor_rects(self):
+        """Rectangles of the active monitors from XRandR, the whole screen if XRandR is unavailable."""
+        xrandr = _load_xrandr()
+        if xrandr is not None:
+            with self.lock:
+                count = ctypes.c_int()
+                monitors = xrandr.XRRGetMonitors(self.display, self.root, 1, ctypes.byref(count))
+                if monitors:
+                    try:
+                        rects = [(monitors[i].x, monitors[i].y, monitors[i].width, monitors[i].height)
+                                 for i in range(count.value)]
+                    finally:
+                        xrandr.XRRFreeMonitors(monitors)
+                    rects = [rect for rect in (self.clip(rect) for rect in rects) if rect]
+                    if rects:
+                        return rects
+        return [(0, 0) + self.screen_size]
+
+    def pointer_monitor_rect(self):
+        """Rectangle of the monitor under the pointer."""
+        with self.lock:
+            x, y, _ = self._query_pointer()
+        monitors = self.monitor_rects()
+        for left, top, width, height in monitors:
+            if left <= x < left + width and top <= y < top + height:
+                return left, top, width, height
+        return monitors[0]
+
+    def clip(self, region):
+        screen_width, screen_height = self.screen_size
+        x, y, width, height = region
+        left, top = max(0, x), max(0, y)
+        right, bottom = min(screen_width, x + width), min(screen_height, y + height)
+        if right <= left or bottom <= top:
+            return None
+        return left, top, right - left, bottom - top
+
+    def _checked(self, function, *args):
+        return _checked(self.x11, self.display, function, *args)
+
+    def close(self):
+        with self.lock:
+            if self.display:
+                self.x11.XCloseDisplay(self.display)
+                self.display = None
+
+
+class XShmCapture(XDisplay):
+    """Grabs screen pixels from the X server through MIT-SHM.
+
+    The server copies the requested rectangle straight into a System V
+    shared memory segment mapped in this process, so a grab involves no
+    encoding, no temp file and no socket transfer of the pixels.
+    grab_array() returns a NumPy view of that segment (BGRX, valid until
+    the next grab); grab() converts it to an RGB PIL image in one pass.
+    The segment is kept and reused while the grab size stays the same.
+    """
+
+    def __init__(self, display=None):
+        try:
+            super().__init__(display)
+        except XUnavailable as e:
+            raise XShmUnavailable(str(e))
+        if not self.xext.XShmQueryExtension(self.display):
+            self.x11.XCloseDisplay(self.display)
+            self.display = None
+            raise XShmUnavailable("The X server has no MIT-SHM extension")
+        self.visual = self.x11.XDefaultVisual(self.display, self.screen)
+        self.depth = self.x11.XDefaultDepth(self.display, self.screen)
+        self.segment = None
+
+    def _segment_for(self, width, height):
+        if self.segment is not None and self.segment[0] == (width, height):
+            return self.segment
+        self._free_segment()
+
+        shminfo = XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(self.display, self.visual, self.depth, Z_PIXMAP, None,
+                                          ctypes.byref(shminfo), width, height)
+        if not image:
+            raise XShmUnavailable("XShmCreateImage failed")
+        ximage = image.contents
+        if ximage.bits_per_pixel != 32 or ximage.red_mask != 0xff0000 or ximage.blue_mask != 0xff:
+            self.x11.XDestroyImage(image)
+            raise XShmUnavailable(f"Unsupported {ximage.bits_per_pixel}-bit visual")
+
+        size = ximage.bytes_per_line * height
+        shminfo.shmid = self.libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            self.x11.XDestroyImage(image)
+            raise XShmUnavailable("shmget failed")
+        address = self.libc.shmat(shminfo.shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            self.libc.shmctl(shminfo.shmid, IPC_RMID, None)
+            self.x11.XDestroyImage(image)
+            raise XShmUnavailable("shmat failed")
+        shminfo.shmaddr = address
+        shminfo.readOnly = 0
+        ximage.data = address
+
+        try:
+            attached = self._checked(self.xext.XShmAttach, self.display, ctypes.byref(shminfo))
+        except XUnavailable:
+            attached = False
+        # Marked for removal now, the segment goes away with the last detach
+        # even if this process dies.
+        self.libc.shmctl(shminfo.shmid, IPC_RMID, None)
+        if not attached:
+            ximage.data = None
+            self.x11.XDestroyImage(image)
+            self.libc.shmdt(address)
+            raise XShmUnavailable("The X server cannot attach shared memory (remote display?)")
+
+        buffer = (ctypes.c_ubyte * size).from_address(address)
+        self.segment = ((width, height), image, shminfo, buffer)
+        return self.segment
+
+    def _free_segment(self):
+        if self.segment is None:
+            return
+        _, image, shminfo, _ = self.segment
+        self.segment = None
+        self.xext.XShmDetach(self.display, ctypes.byref(shminfo))
+        self.x11.XSync(self.display, 0)
+        # Xlib would free() the data pointer; it belongs to the segment.
+        image.contents.data = None
+        self.x11.XDestroyImage(image)
+        self.libc.shmdt(shminfo.shmaddr)
+
+    def _grab(self, region):
+        if region is None:
+            region = (0, 0) + self.screen_size
+        x, y, width, height = region
+        (size, image, shminfo, buffer) = self._segment_for(width, height)
+        if not self._checked(self.xext.XShmGetImage, self.display, self.root, image, x, y, ALL_PLANES):
+            raise XShmUnavailable(f"XShmGetImage failed for {region}")
+        return image.contents, buffer
+
+    def grab_array(self, region=None):
+        """(height, width, 4) BGRX NumPy view of the grab; it is overwritten by the next grab."""
+        if np is None:
+            raise XShmUnavailable("NumPy is not installed")
+        with self.lock:
+            ximage, buffer = self._grab(region)
+            rows = np.frombuffer(buffer, dtype=np.uint8).reshape(ximage.height, ximage.bytes_per_line)
+            return rows[:, :ximage.width * 4].reshape(ximage.height, ximage.width, 4)
+
+    def grab(self, region=None):
+        """RGB PIL image of `region` (x, y, width, height), the whole screen by default.
+
+        Only the region is transferred, so the cost follows its area rather
+        than the size of the desktop.
+        """
+        with self.lock:
+            ximage, buffer = self._grab(region)
+            raw_mode = 'BGRX' if ximage.byte_order == LSB_FIRST else 'XRGB'
+            return Image.frombuffer('RGB', (ximage.width, ximage.height), buffer, 'raw',
+                                    raw_mode, ximage.bytes_per_line, 1)
+
+    def close(self):
+        with self.lock:
+            if self.display:
+                self._free_segment()
+                self.x11.XCloseDisplay(self.display)
+                self.display = None
+
+
+class XHotkey:
+    """A global key grab on the X root window, calling `callback` on every press.
+
+    `hotkey` is a '+'-separated combination such as 'ctrl+shift+F9'; the
+    last part is an X keysym name. The grab ignores Caps Lock and Num Lock
+    and is held until stop(). The callback runs on the listener thread,
+    which has its own X connection, so a slow callback delays the next
+    press but never the UI.
+    """
+
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, hotkey, callback, display=None):
+        self.x11 = _load_libraries()[0]
+        self.callback = callback
+        *modifiers, key = [part.strip() for part in hotkey.split('+')]
+        try:
+            self.modifiers = sum(MODIFIER_MASKS[modifier.lower()] for modifier in modifiers)
+        except KeyError as e:
+            raise ValueError(f"Unknown modifier {e} in {hotkey!r}")
+        keysym = self.x11.XStringToKeysym(key.encode())
+        if not keysym:
+            raise ValueError(f"Unknown key {key!r} in {hotkey!r}")
+
+        self.display = self.x11.XOpenDisplay(display.encode() if display else None)
+        if not self.display:
+            raise XUnavailable("Cannot open the X display")
+        self.root = self.x11.XRootWindow(self.display, self.x11.XDefaultScreen(self.display))
+        self.keycode = self.x11.XKeysymToKeycode(self.display, keysym)
+        try:
+            if not self.keycode:
+                raise ValueError(f"No key on this keyboard produces {key!r}")
+            for lock in LOCK_MASKS:
+                _checked(self.x11, self.display, self.x11.XGrabKey, self.display, self.keycode,
+                         self.modifiers | lock, self.root, 1, GRAB_MODE_ASYNC, GRAB_MODE_ASYNC)
+        except XUnavailable:
+            self._release()
+            raise XUnavailable(f"{hotkey} is already taken by another application")
+        except Exception:
+            self._release()
+            raise
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._listen, daemon=True)
+        self.thread.start()
+
+    def _listen(self):
+        event = (ctypes.c_long * 24)()
+        fd = self.x11.XConnectionNumber(self.display)
+        try:
+            while not self.stop_event.is_set():
+                while self.x11.XPending(self.display):
+                    self.x11.XNextEvent(self.display, event)
+                    if ctypes.c_int.from_buffer(event).value == KEY_PRESS:
+                        try:
+                            self.callback()
+                        except Exception:
+                            pass
+                select.select([fd], [], [], self.POLL_INTERVAL)
+        finally:
+            self._release()
+
+    def _release(self):
+        if self.display:
+            for lock in LOCK_MASKS:
+                self.x11.XUngrabKey(self.display, self.keycode, self.modifiers | lock, self.root)
+            self.x11.XCloseDisplay(self.display)
+            self.display = None
+
+    def stop(self):
+        """Ask the listener to release the grab; it does so within POLL_INTERVAL."""
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        """Wait for the grab to be released. Blocks, so not for the UI thread."""
+        self.thread.join(timeout)
+
+
+def available(display=None):
+    try:
+        with XShmCapture(display):
+            return True
+    except XShmUnavailable:
+        return False